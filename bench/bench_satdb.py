@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+
+import argparse
+from datetime import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from satdb import DBConfig, Dbase, BatchWriter, TLE, fetch_latest, iter_tles, rebuild_latest, write_tles
+from satdb.ingest import parse_file
+from satdb.tools import ttprint
+from synthetic import SyntheticCatalog, epoch_grid, write_3le, write_omm
+
+# Benchmark scales as (number of objects, days of history, days between the
+# element sets of an object):
+#   small:   quick check
+#   catalog: one element set per object, about the size of the current
+#            public catalog
+#   history: multi-year history of a part of the catalog
+SCALES = {
+    "small": (1000, 10, 1.),
+    "catalog": (30000, 1, 1.),
+    "history": (2000, 3 * 365, 7.),
+    }
+
+# Start of the synthetic history
+START_EPOCH = datetime(2021, 1, 1)
+
+# NORAD IDs of the objects in the 3LE file start here, so that the OMM and
+# the 3LE import insert different objects
+TLE_FIRST_NORAD = 60000
+
+# Number of objects exported one by one with TLE.fromdb()
+N_FROMDB = 200
+
+# Run function runs times and record the median time and the number of rows
+# returned by the function in stages[name]
+def run_stage(stages, name, function, runs=1):
+    times = []
+    for i in range(runs):
+        t_start = time.perf_counter()
+        n_rows = function()
+        times.append(time.perf_counter() - t_start)
+    dt = statistics.median(times)
+    stages[name] = {"seconds": round(dt, 4), "rows": n_rows,
+            "rows_per_sec": round(n_rows / dt, 1) if dt > 0 else None}
+    ttprint(name.ljust(16) + str(round(dt, 4)).rjust(10) + " sec"
+            + str(n_rows).rjust(10) + " rows")
+
+# Parse a file completely. Returns the list of (metadata, batch) chunks
+def parse_all(filename, chunk_size):
+    return list(parse_file(filename, chunk_size))
+
+# Compute the derived parameters of the batches of parsed chunks
+def derive_all(chunks):
+    n = 0
+    for mds, batch in chunks:
+        batch.derive()
+        n += batch.n
+    return n
+
+# Write parsed chunks to the database. Returns the number of queued rows
+def insert_all(dbc, chunks, batch_size):
+    writer = BatchWriter(dbc, batch_size=batch_size)
+    for mds, batch in chunks:
+        writer.add_chunk(mds, batch)
+    writer.flush()
+    return writer.n_queued
+
+# Short hash of the checked out commit, if in a git repository
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Compare the stages with a baseline. Returns the names of the stages slower
+# than threshold times the baseline
+def compare(stages, baseline, threshold):
+    ttprint("Comparison with baseline " + str(baseline.get("commit")) + " ("
+            + str(baseline.get("created")) + ")")
+    regressions = []
+    for name, res in stages.items():
+        base = baseline["stages"].get(name)
+        if base is None or base["seconds"] <= 0:
+            continue
+        ratio = res["seconds"] / base["seconds"]
+        line = (name.ljust(16) + str(round(base["seconds"], 4)).rjust(10)
+                + " -> " + str(round(res["seconds"], 4)).rjust(8) + " sec"
+                + ("x" + str(round(ratio, 2))).rjust(8))
+        if ratio > threshold:
+            line += "  REGRESSION"
+            regressions.append(name)
+        ttprint(line)
+    return regressions
+
+#------------------------------------------------------------------------------
+# Main routine
+def main(args):
+
+    ttprint("Executing " + os.path.basename(__file__))
+
+    n_objects, days, step = SCALES[args.scale]
+    if args.objects is not None:
+        n_objects = args.objects
+    if args.days is not None:
+        days = args.days
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="satdb_bench_")
+    os.makedirs(workdir, exist_ok=True)
+
+    # By default, the database is a new SQLite file in the working directory
+    config_file = args.config
+    if config_file is None:
+        config_file = os.path.join(workdir, "bench.yaml")
+        with open(config_file, "w") as fh:
+            fh.write("satdb:\n    backend: \"" + args.backend + "\"\n"
+                    + "    path: \"" + os.path.join(workdir, "bench." + args.backend)
+                    + "\"\n")
+        for suffix in ("", ".wal"):
+            db_file = os.path.join(workdir, "bench." + args.backend + suffix)
+            if os.path.exists(db_file):
+                os.remove(db_file)
+
+    ttprint("Reading config file " + config_file)
+    config = DBConfig(config_file)
+    dbc = Dbase(config)
+    dbc.connect()
+
+    # The benchmark writes to the database. A database given in the config
+    # file must be empty, e.g. a local MySQL database for the benchmark
+    if dbc.fetchone("select count(*) from orbelem")[0] > 0:
+        ttprint("Table orbelem of the database is not empty. Exiting")
+        dbc.disconnect()
+        exit(1)
+
+    stages = {}
+    epochs = epoch_grid(START_EPOCH, days, step)
+    ttprint("Scale " + args.scale + ": " + str(n_objects) + " objects, "
+            + str(len(epochs)) + " element sets per object, backend "
+            + dbc.dialect)
+
+    # Synthetic input files
+    omm_file = os.path.join(workdir, "synthetic.xml.gz")
+    tle_file = os.path.join(workdir, "synthetic.tle")
+    omm_catalog = SyntheticCatalog(n_objects, seed=args.seed)
+    tle_catalog = SyntheticCatalog(n_objects, seed=args.seed + 1,
+            first_norad=TLE_FIRST_NORAD)
+    run_stage(stages, "generate_omm",
+            lambda: write_omm(omm_file, omm_catalog, epochs))
+    run_stage(stages, "generate_3le",
+            lambda: write_3le(tle_file, tle_catalog, epochs))
+
+    # Parsing and derived parameters
+    chunks = {}
+    def parse(kind, filename):
+        chunks[kind] = parse_all(filename, args.batch_size)
+        return sum(batch.n for mds, batch in chunks[kind])
+    run_stage(stages, "parse_omm", lambda: parse("omm", omm_file))
+    run_stage(stages, "derive_omm", lambda: derive_all(chunks["omm"]))
+    run_stage(stages, "parse_3le", lambda: parse("tle", tle_file))
+
+    # Database inserts, including the updates of the latest-state tables
+    run_stage(stages, "insert_omm",
+            lambda: insert_all(dbc, chunks["omm"], args.batch_size))
+    run_stage(stages, "insert_3le",
+            lambda: insert_all(dbc, chunks["tle"], args.batch_size))
+    chunks = None
+
+    # Latest-state queries
+    run_stage(stages, "latest_all",
+            lambda: len(fetch_latest(dbc, "o.norad, o.epoch, o.semimajor_axis, m.obj_type")),
+            args.runs)
+    run_stage(stages, "latest_geo",
+            lambda: len(fetch_latest(dbc, "o.norad, o.semimajor_axis, m.name",
+                "o.period between %s and %s and o.eccentricity < %s",
+                (1400., 1500., 0.01))),
+            args.runs)
+    run_stage(stages, "rebuild_latest",
+            lambda: rebuild_latest(dbc) or dbc.fetchone(
+                "select count(*) from orbelem_latest")[0])
+
+    # TLE export of the latest element sets, of the element sets nearest to
+    # an epoch in the history and one by one with TLE.fromdb()
+    export_file = os.path.join(workdir, "export.tle")
+    run_stage(stages, "export_latest",
+            lambda: write_tles(export_file, iter_tles(dbc)))
+    mid_epoch = epochs[len(epochs) // 2]
+    run_stage(stages, "export_nearest",
+            lambda: write_tles(export_file, iter_tles(dbc, mid_epoch)))
+    norads = omm_catalog.norad[:N_FROMDB].tolist()
+    def fromdb():
+        n = 0
+        for norad in norads:
+            tle = TLE()
+            tle.fromdb(dbc, norad, mid_epoch)
+            n += tle.line1 is not None
+        return n
+    run_stage(stages, "tle_fromdb", fromdb)
+
+    dbc.disconnect()
+
+    result = {
+        "commit": git_commit(),
+        "created": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": config.backend,
+        "scale": {"name": args.scale, "objects": n_objects,
+            "element_sets_per_object": len(epochs), "seed": args.seed},
+        "stages": stages,
+        }
+
+    if args.json:
+        ttprint("Writing results to " + args.json)
+        with open(args.json, "w") as fh:
+            json.dump(result, fh, indent=2)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        if baseline.get("scale") != result["scale"]:
+            ttprint("Warning: baseline was measured with scale "
+                    + str(baseline.get("scale")))
+        if baseline.get("backend") != result["backend"]:
+            ttprint("Warning: baseline was measured with backend "
+                    + str(baseline.get("backend")))
+        regressions = compare(stages, baseline, args.threshold)
+
+    if args.workdir is None and not args.keep:
+        shutil.rmtree(workdir)
+
+    if len(regressions) > 0:
+        ttprint(str(len(regressions)) + " stages slower than the baseline: "
+                + ", ".join(regressions))
+        sys.exit(1)
+
+    ttprint("Finished")
+
+###############################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=sorted(SCALES.keys()), default="small",
+            help="size of the synthetic catalog (default: small)")
+    parser.add_argument("--objects", type=int,
+            help="number of objects (overrides the scale)")
+    parser.add_argument("--days", type=float,
+            help="days of history (overrides the scale)")
+    parser.add_argument("--seed", type=int, default=1,
+            help="seed of the synthetic catalog (default: 1)")
+    parser.add_argument("--config",
+            help="config file of an empty benchmark database (default: new database file in the working directory)")
+    parser.add_argument("--backend", choices=["sqlite", "duckdb"], default="sqlite",
+            help="backend of the new database file (default: sqlite)")
+    parser.add_argument("--workdir",
+            help="directory for the synthetic files (default: temporary directory)")
+    parser.add_argument("--keep", action="store_true",
+            help="keep the temporary directory")
+    parser.add_argument("--batch-size", dest="batch_size", type=int, default=1000,
+            help="number of rows written per transaction (default: 1000)")
+    parser.add_argument("--runs", type=int, default=5,
+            help="runs of the query stages, the median is reported (default: 5)")
+    parser.add_argument("--json", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare with the results of this JSON file")
+    parser.add_argument("--threshold", type=float, default=1.25,
+            help="report stages slower than threshold times the baseline as regression (default: 1.25)")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,219 @@
+import gzip
+from datetime import datetime, timedelta
+import numpy as np
+from satdb.tle import format_tles
+
+# Synthetic catalogs of space objects for the benchmarks. The objects and
+# their element sets are generated from a seeded random generator, so the
+# same parameters always give the same files. The elements are plausible
+# (orbit classes, drift of RAAN and mean anomaly between epochs), but are
+# not meant for orbit analysis.
+
+# Orbit classes as (name, share of the objects, mean motion range [rev/day],
+# eccentricity range, typical inclinations [deg])
+ORBIT_CLASSES = (
+    ("LEO", 0.80, (13.5, 15.9), (0.0001, 0.02), (51.6, 53.0, 70.0, 86.4, 97.6)),
+    ("MEO", 0.05, (1.9, 2.3), (0.0001, 0.02), (55.0, 56.0, 64.8)),
+    ("GEO", 0.08, (0.99, 1.01), (0.0001, 0.001), (0.05, 5.0, 15.0)),
+    ("HEO", 0.07, (2.0, 2.1), (0.6, 0.74), (63.4,)),
+    )
+
+OBJ_TYPES = ("PAYLOAD", "ROCKET BODY", "DEBRIS")
+RCS_SIZES = ("SMALL", "MEDIUM", "LARGE")
+COUNTRY_CODES = ("US", "PRC", "CIS", "FR", "JPN", "IND", "ESA")
+SITES = ("AFETR", "AFWTR", "TYMSC", "PKMTR", "JSC", "FRGUI", "TANSC")
+NAME_PREFIXES = ("STARLINK", "ONEWEB", "COSMOS", "IRIDIUM", "GPS", "SL-4 R/B",
+        "FENGYUN 1C DEB", "OBJECT")
+
+# Template of an OMM of Space-Track, one per element set
+OMM_TEMPLATE = ('<omm id="CCSDS_OMM_VERS" version="2.0"><header>'
+    + '<CREATION_DATE>{created}</CREATION_DATE><ORIGINATOR>18 SPCS</ORIGINATOR>'
+    + '</header><body><segment><metadata><OBJECT_NAME>{name}</OBJECT_NAME>'
+    + '<OBJECT_ID>{obj_id}</OBJECT_ID><CENTER_NAME>EARTH</CENTER_NAME>'
+    + '<REF_FRAME>TEME</REF_FRAME><TIME_SYSTEM>UTC</TIME_SYSTEM>'
+    + '<MEAN_ELEMENT_THEORY>SGP4</MEAN_ELEMENT_THEORY></metadata><data>'
+    + '<meanElements><EPOCH>{epoch}</EPOCH><MEAN_MOTION>{mean_motion:.8f}</MEAN_MOTION>'
+    + '<ECCENTRICITY>{eccentricity:.7f}</ECCENTRICITY>'
+    + '<INCLINATION>{inclination:.4f}</INCLINATION>'
+    + '<RA_OF_ASC_NODE>{raan:.4f}</RA_OF_ASC_NODE>'
+    + '<ARG_OF_PERICENTER>{arg_of_pericenter:.4f}</ARG_OF_PERICENTER>'
+    + '<MEAN_ANOMALY>{mean_anomaly:.4f}</MEAN_ANOMALY></meanElements>'
+    + '<tleParameters><EPHEMERIS_TYPE>0</EPHEMERIS_TYPE>'
+    + '<CLASSIFICATION_TYPE>U</CLASSIFICATION_TYPE>'
+    + '<NORAD_CAT_ID>{norad}</NORAD_CAT_ID>'
+    + '<ELEMENT_SET_NO>{element_set_no}</ELEMENT_SET_NO>'
+    + '<REV_AT_EPOCH>{rev_at_epoch}</REV_AT_EPOCH><BSTAR>{bstar:.9f}</BSTAR>'
+    + '<MEAN_MOTION_DOT>{mean_motion_dot:.8f}</MEAN_MOTION_DOT>'
+    + '<MEAN_MOTION_DDOT>0</MEAN_MOTION_DDOT></tleParameters>'
+    + '<userDefinedParameters>{derived}'
+    + '<USER_DEFINED parameter="OBJECT_TYPE">{obj_type}</USER_DEFINED>'
+    + '<USER_DEFINED parameter="RCS_SIZE">{rcs_size}</USER_DEFINED>'
+    + '<USER_DEFINED parameter="COUNTRY_CODE">{country_code}</USER_DEFINED>'
+    + '<USER_DEFINED parameter="LAUNCH_DATE">{launch_date}</USER_DEFINED>'
+    + '<USER_DEFINED parameter="SITE">{site}</USER_DEFINED>'
+    + '<USER_DEFINED parameter="DECAY_DATE"/>'
+    + '</userDefinedParameters></data></segment></body></omm>')
+
+# The parameters of Space-Track derived from the elements
+OMM_DERIVED_TEMPLATE = ('<USER_DEFINED parameter="SEMIMAJOR_AXIS">{semimajor_axis:.3f}</USER_DEFINED>'
+    + '<USER_DEFINED parameter="PERIOD">{period:.3f}</USER_DEFINED>'
+    + '<USER_DEFINED parameter="APOAPSIS">{apoapsis:.3f}</USER_DEFINED>'
+    + '<USER_DEFINED parameter="PERIAPSIS">{periapsis:.3f}</USER_DEFINED>')
+
+OMM_HEAD = ('<?xml version="1.0" encoding="UTF-8"?>\n<ndm xmlns:xsi='
+    + '"http://www.w3.org/2001/XMLSchema-instance" xsi:noNamespaceSchemaLocation='
+    + '"http://sanaregistry.org/r/ndmxml/ndmxml-1.0-master.xsd">')
+OMM_TAIL = '</ndm>\n'
+
+# Earth gravitational parameter [km^3/s^2] and radius [km]
+_GM = 398600.4418
+_RE = 6378.135
+
+# Epochs from start (datetime) for days days, one every step days
+def epoch_grid(start, days, step=1.):
+    n = max(int(days / step), 1)
+    return [start + timedelta(days=i * step) for i in range(n)]
+
+#------------------------------------------------------------------------------
+# Class holding a synthetic catalog of n_objects space objects with NORAD IDs
+# from first_norad on. elements() returns the element sets of all objects
+# around an epoch as numpy columns.
+class SyntheticCatalog:
+    def __init__(self, n_objects, seed=1, first_norad=10000):
+        self.n = n_objects
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+
+        self.norad = np.arange(first_norad, first_norad + n_objects)
+
+        shares = np.array([c[1] for c in ORBIT_CLASSES])
+        self.orbit_class = rng.choice(len(ORBIT_CLASSES), n_objects,
+                p=shares / shares.sum())
+        self.mean_motion = np.zeros(n_objects)
+        self.eccentricity = np.zeros(n_objects)
+        self.inclination = np.zeros(n_objects)
+        for k, (name, share, mm, ecc, incl) in enumerate(ORBIT_CLASSES):
+            idx = np.flatnonzero(self.orbit_class == k)
+            self.mean_motion[idx] = rng.uniform(mm[0], mm[1], len(idx))
+            self.eccentricity[idx] = rng.uniform(ecc[0], ecc[1], len(idx))
+            self.inclination[idx] = (rng.choice(incl, len(idx))
+                    + rng.normal(0., 0.05, len(idx))).clip(0., 180.)
+        self.raan = rng.uniform(0., 360., n_objects)
+        self.arg_of_pericenter = rng.uniform(0., 360., n_objects)
+        self.mean_anomaly = rng.uniform(0., 360., n_objects)
+        self.bstar = rng.uniform(1e-5, 5e-4, n_objects)
+        self.mean_motion_dot = rng.uniform(0., 5e-5, n_objects)
+
+        # Metadata. Objects of the same launch share the launch date and the
+        # launch number of the international designator
+        launch = np.arange(n_objects) // 20
+        launch_year = 1960 + launch * 60 // max(launch[-1] + 1, 1)
+        self.launch_date = [datetime(int(y), 1, 1) + timedelta(days=int(d))
+                for y, d in zip(launch_year, rng.integers(0, 365, n_objects))]
+        self.obj_id = [str(y) + "-" + "%03d" % (l % 1000 + 1) + chr(ord("A") + i % 20)
+                for i, (y, l) in enumerate(zip(launch_year, launch))]
+        self.id_short = [o[2:4] + o[5:] for o in self.obj_id]
+        prefix = rng.integers(0, len(NAME_PREFIXES), n_objects)
+        self.name = [NAME_PREFIXES[p] + " " + str(norad)
+                for p, norad in zip(prefix, self.norad)]
+        self.obj_type = [OBJ_TYPES[i] for i in rng.integers(0, 3, n_objects)]
+        self.rcs_size = [RCS_SIZES[i] for i in rng.integers(0, 3, n_objects)]
+        self.country_code = [COUNTRY_CODES[i]
+                for i in rng.integers(0, len(COUNTRY_CODES), n_objects)]
+        self.site = [SITES[i] for i in rng.integers(0, len(SITES), n_objects)]
+
+    # Element sets of all objects with epochs within +-12 hours of epoch
+    # (datetime). k numbers the element sets of an object. Returns a dict of
+    # numpy columns named like the orbelem columns
+    def elements(self, epoch, k=0):
+        rng = np.random.default_rng((self.seed, k))
+        dt = rng.uniform(-0.5, 0.5, self.n)
+        epochs = (np.datetime64(epoch, 'us')
+                + (dt * 86400e6).astype('timedelta64[us]'))
+        days = ((epochs - np.datetime64('2000-01-01T00:00:00', 'us'))
+                / np.timedelta64(86400, 's'))
+
+        # Slow decay, nodal drift and the mean anomaly after the revolutions
+        # since 2000
+        mean_motion = self.mean_motion + self.mean_motion_dot * 2. * (days % 3650.)
+        revs = self.mean_motion * days
+        sma = (_GM * (86400. / (2. * np.pi * mean_motion)) ** 2) ** (1. / 3.)
+        return {
+            "norad": self.norad,
+            "epoch": epochs,
+            "mean_motion": mean_motion,
+            "eccentricity": self.eccentricity,
+            "inclination": self.inclination,
+            "raan": (self.raan - 0.1 * days) % 360.,
+            "arg_of_pericenter": (self.arg_of_pericenter + 0.05 * days) % 360.,
+            "mean_anomaly": (self.mean_anomaly + 360. * revs) % 360.,
+            "bstar": self.bstar,
+            "mean_motion_dot": self.mean_motion_dot,
+            "element_set_no": np.full(self.n, k % 999 + 1),
+            "rev_at_epoch": (revs % 100000).astype(np.int64),
+            "semimajor_axis": sma,
+            "period": 1440. / mean_motion,
+            "apoapsis": sma * (1. + self.eccentricity) - _RE,
+            "periapsis": sma * (1. - self.eccentricity) - _RE,
+            }
+
+# Open a file for writing text, gzipped if the name ends with .gz
+def _open_text(filename):
+    if filename.endswith(".gz"):
+        return gzip.open(filename, "wt")
+    return open(filename, "w")
+
+# Write the element sets of the catalog at the given epochs to an OMM/XML
+# file in the format of Space-Track. The parameters derived from the
+# elements (SEMIMAJOR_AXIS etc.) are only written, if derived is True, so
+# by default the import computes them. Returns the number of element sets
+def write_omm(filename, catalog, epochs, created=None, derived=False):
+    if created is None:
+        created = max(epochs) + timedelta(days=1)
+    created = created.strftime("%Y-%m-%dT%H:%M:%S")
+
+    n = 0
+    with _open_text(filename) as fh:
+        fh.write(OMM_HEAD)
+        for k, epoch in enumerate(epochs):
+            el = catalog.elements(epoch, k)
+            el["epoch"] = np.datetime_as_string(el["epoch"], unit='us')
+            cols = dict((col, values.tolist()) for col, values in el.items())
+            parts = []
+            for i in range(catalog.n):
+                values = dict((col, cols[col][i]) for col in cols)
+                parts.append(OMM_TEMPLATE.format(
+                    created=created, name=catalog.name[i],
+                    obj_id=catalog.obj_id[i],
+                    derived=OMM_DERIVED_TEMPLATE.format(**values) if derived else "",
+                    obj_type=catalog.obj_type[i], rcs_size=catalog.rcs_size[i],
+                    country_code=catalog.country_code[i],
+                    launch_date=catalog.launch_date[i].strftime("%Y-%m-%d"),
+                    site=catalog.site[i], **values))
+            fh.write("".join(parts))
+            n += catalog.n
+        fh.write(OMM_TAIL)
+    return n
+
+# Write the element sets of the catalog at the given epochs to a 3LE file.
+# The lines are formatted like the TLE export (see tle.format_tles()).
+# Returns the number of element sets
+def write_3le(filename, catalog, epochs):
+    n = 0
+    with _open_text(filename) as fh:
+        for k, epoch in enumerate(epochs):
+            el = catalog.elements(epoch, k)
+            epoch_list = el["epoch"].astype('datetime64[us]').tolist()
+            results = []
+            for i in range(catalog.n):
+                results.append((catalog.name[i], int(el["norad"][i]),
+                    catalog.id_short[i], "U", epoch_list[i],
+                    el["mean_motion_dot"][i], 0., el["bstar"][i],
+                    int(el["element_set_no"][i]), el["inclination"][i],
+                    el["raan"][i], el["eccentricity"][i],
+                    el["arg_of_pericenter"][i], el["mean_anomaly"][i],
+                    el["mean_motion"][i], int(el["rev_at_epoch"][i])))
+            tles = format_tles(results)
+            fh.write("".join("\n".join(tle) + "\n" for tle in tles))
+            n += len(tles)
+    return n
@@ -1,8 +1,24 @@
 from .baseconfig import *
 from .dbconfig import *
 from .stconfig import *
+from .schema import *
+from .backend import *
 from .dbase import *
 from .tools import *
+from .record import *
 from .ommmetadata import *
 from .ommorbelem import *
+from .orbelembatch import *
 from .tle import *
+from .epochcache import *
+from .omm import *
+from .tlecodec import *
+from .mdindex import *
+from .latest import *
+from .localcache import *
+from .jobstate import *
+from .cleaning import *
+from .keyfilter import *
+from .manifest import *
+from .stats import *
+from .ingest import *
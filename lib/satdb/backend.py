@@ -0,0 +1,310 @@
+import re
+import sqlite3
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+import mysql.connector
+import numpy as np
+from satdb.schema import create_schema
+
+# The SQL statements of satdb are written for MySQL. The backends for the
+# embedded databases translate them and convert the arguments and results,
+# so that Dbase offers the same interface for all of them.
+
+# Strings in the formats of datetime values: YYYY-MM-DD, optionally followed
+# by the time with "T" or " " as separator, fractional seconds and "Z"
+_DATETIME_RE = re.compile(
+        r"^\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?Z?)?$")
+
+# Datetime values as stored by the embedded backends
+_STORED_DATETIME_RE = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+
+# MySQL datetime columns store whole seconds, fractional seconds are rounded
+def _round_seconds(dt):
+    if dt.microsecond >= 500000:
+        dt += timedelta(seconds=1)
+    return dt.replace(microsecond=0)
+
+def _parse_datetime(s):
+    s = s.rstrip("Z").replace("T", " ")
+    if "." in s:
+        head, frac = s.split(".")
+        s = head + "." + (frac + "000000")[:6]
+    return datetime.fromisoformat(s)
+
+# Types of arguments passed unchanged to the embedded backends
+_PLAIN_TYPES = frozenset((int, float, bool, bytes, type(None)))
+
+# Convert an argument of a statement for an embedded backend. Datetimes,
+# dates and strings in a datetime format are rounded to seconds like in a
+# MySQL datetime column and returned as datetime, or as string if as_text,
+# numpy scalars as python values
+def _convert_value(value, as_text):
+    if isinstance(value, str):
+        if len(value) < 10 or value[4] != "-":
+            return value
+        return _convert_text(value, as_text)
+    elif isinstance(value, datetime):
+        value = _round_seconds(value)
+    elif isinstance(value, date):
+        value = datetime(value.year, value.month, value.day)
+    elif isinstance(value, np.integer):
+        return int(value)
+    elif isinstance(value, np.floating):
+        return float(value)
+    elif isinstance(value, np.datetime64):
+        if np.isnat(value):
+            return None
+        value = _round_seconds(value.astype('datetime64[us]').item())
+    else:
+        return value
+
+    if as_text:
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+# Convert a string argument. The same strings (e.g. the timestamp of the
+# column created) are repeated in many rows
+@lru_cache(maxsize=4096)
+def _convert_text(value, as_text):
+    if not _DATETIME_RE.match(value):
+        return value
+    value = _round_seconds(_parse_datetime(value))
+    if as_text:
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+# Translate the placeholders and "insert ignore" of a MySQL statement for
+# SQLite and DuckDB. Literal % are written as %% in statements with
+# arguments
+@lru_cache(maxsize=1024)
+def _translate(sql):
+    sql = re.sub(r"%[s%]", lambda m: "?" if m.group(0) == "%s" else "%", sql)
+    return re.sub(r"^(\s*)insert\s+ignore\b", r"\1insert or ignore", sql,
+            flags=re.IGNORECASE)
+
+#------------------------------------------------------------------------------
+# Backend for MySQL (mysql.connector). Statements and values are passed as
+# they are.
+class MySQLBackend:
+    dialect = "mysql"
+    Error = mysql.connector.Error
+
+    def connect(self, config):
+        try:
+            connection = mysql.connector.connect(host=config.host, port=config.port, user=config.user, password=config.password, database=config.database)
+        except mysql.connector.Error as err:
+            print(err)
+            print("Error Code:", err.errno)
+            print("SQLSTATE", err.sqlstate)
+            print("Message", err.msg)
+            exit()
+
+        return connection
+
+    def cursor(self, connection):
+        return connection.cursor()
+
+    # Called after connecting
+    def init(self, dbc):
+        pass
+
+    # Cursor for streamed results. Returns (connection, cursor), the query
+    # runs on its own connection with an unbuffered cursor
+    def stream_cursor(self, dbc):
+        connection = dbc._connect()
+        return connection, connection.cursor(buffered=False)
+
+    def sql(self, sql):
+        return sql
+
+    def arguments(self, arguments):
+        return arguments
+
+    def row(self, row):
+        return row
+
+    def rows(self, rows):
+        return rows
+
+    # For insert statements mysql.connector combines the rows to a multi-row
+    # VALUES statement. Returns the number of affected rows
+    def executemany(self, cursor, sql, arguments):
+        cursor.executemany(sql, arguments)
+        return cursor.rowcount
+
+    def commit(self, connection):
+        connection.commit()
+
+    def rollback(self, connection):
+        connection.rollback()
+
+#------------------------------------------------------------------------------
+# Backend for SQLite. The database is the file config.path, the tables are
+# created when connecting. Datetimes are stored as "YYYY-MM-DD HH:MM:SS"
+# text, which sorts and compares like the datetime values, and returned as
+# datetime. The connection may be used from other threads (e.g. the commits
+# of download.download_history()), as long as they do not use it at the
+# same time.
+class SQLiteBackend(MySQLBackend):
+    dialect = "sqlite"
+    Error = sqlite3.Error
+
+    def connect(self, config):
+        try:
+            connection = sqlite3.connect(config.path, check_same_thread=False)
+        except sqlite3.Error as err:
+            print(err)
+            print("Cannot open database file", config.path)
+            exit()
+
+        return connection
+
+    def init(self, dbc):
+        create_schema(dbc)
+
+    # Streamed results use a second cursor of the connection, so that the
+    # uncommitted data and in-memory databases are visible
+    def stream_cursor(self, dbc):
+        return None, dbc.connection.cursor()
+
+    def sql(self, sql):
+        return _translate(sql)
+
+    def arguments(self, arguments):
+        if arguments is None:
+            return ()
+        return tuple(v if v.__class__ in _PLAIN_TYPES else _convert_value(v, True)
+                for v in arguments)
+
+    def row(self, row):
+        if row is None:
+            return None
+        return tuple(
+            datetime.fromisoformat(v) if isinstance(v, str) and len(v) == 19
+                and _STORED_DATETIME_RE.match(v) else v
+            for v in row)
+
+    def rows(self, rows):
+        return [self.row(row) for row in rows]
+
+    def executemany(self, cursor, sql, arguments):
+        cursor.executemany(self.sql(sql),
+                (self.arguments(row) for row in arguments))
+        return cursor.rowcount
+
+#------------------------------------------------------------------------------
+# Backend for DuckDB (optional, imported when connecting). The database is
+# the file config.path, the tables are created when connecting. DuckDB has a
+# native datetime type and commits every statement by default, so a
+# transaction is opened after connecting and after every commit.
+class DuckDBBackend(SQLiteBackend):
+    dialect = "duckdb"
+    Error = Exception
+
+    # Max. number of rows per multi-row insert statement
+    ROWS_PER_INSERT = 1000
+
+    def connect(self, config):
+        import duckdb
+        self.Error = duckdb.Error
+        try:
+            connection = duckdb.connect(config.path)
+        except duckdb.Error as err:
+            print(err)
+            print("Cannot open database file", config.path)
+            exit()
+
+        return connection
+
+    # The connection executes the statements. The cursor of a DuckDB
+    # connection is a separate connection with its own transactions
+    def cursor(self, connection):
+        return connection
+
+    def init(self, dbc):
+        dbc.connection.begin()
+        create_schema(dbc)
+
+    def stream_cursor(self, dbc):
+        return None, dbc.connection.cursor()
+
+    def arguments(self, arguments):
+        if arguments is None:
+            return ()
+        return [v if v.__class__ in _PLAIN_TYPES else _convert_value(v, False)
+                for v in arguments]
+
+    def row(self, row):
+        return row
+
+    def rows(self, rows):
+        return rows
+
+    # DuckDB executes executemany() row by row. Insert statements are
+    # therefore executed as one "insert ... select" from a pandas DataFrame
+    # with the rows, or without pandas, combined to multi-row VALUES
+    # statements like with mysql.connector. The rows of an upsert ("on
+    # conflict do update") must not contain the same key twice. Returns the
+    # number of inserted rows
+    def executemany(self, cursor, sql, arguments):
+        sql = self.sql(sql)
+        match = re.search(r"\bvalues\s*(\([^()]*\))", sql, re.IGNORECASE)
+        if match is None or not sql.lstrip().lower().startswith("insert"):
+            for row in arguments:
+                cursor.execute(sql, self.arguments(row))
+            return -1
+
+        rows = [self.arguments(row) for row in arguments]
+        if len(rows) == 0:
+            return 0
+
+        try:
+            import pandas
+        except ImportError:
+            pandas = None
+
+        if pandas is not None:
+            frame = pandas.DataFrame.from_records(rows,
+                    columns=["c" + str(i) for i in range(len(rows[0]))])
+            cursor.register("satdb_rows", frame)
+            try:
+                cursor.execute(sql[:match.start()] + "select * from satdb_rows"
+                        + sql[match.end():])
+                return cursor.fetchone()[0]
+            finally:
+                cursor.unregister("satdb_rows")
+
+        n = 0
+        for i in range(0, len(rows), self.ROWS_PER_INSERT):
+            chunk = rows[i:i + self.ROWS_PER_INSERT]
+            values = []
+            for row in chunk:
+                values += row
+            cursor.execute(sql[:match.start(1)]
+                    + ", ".join([match.group(1)] * len(chunk))
+                    + sql[match.end(1):], values)
+            n += cursor.fetchone()[0]
+        return n
+
+    def commit(self, connection):
+        connection.commit()
+        connection.begin()
+
+    def rollback(self, connection):
+        connection.rollback()
+        connection.begin()
+
+# Backends by the name used in the config file
+BACKENDS = {
+    "mysql": MySQLBackend,
+    "sqlite": SQLiteBackend,
+    "duckdb": DuckDBBackend,
+    }
+
+# Return the backend for the config (attribute backend, default mysql)
+def get_backend(config):
+    name = getattr(config, "backend", "mysql") or "mysql"
+    try:
+        return BACKENDS[name.lower()]()
+    except KeyError:
+        raise ValueError("Unknown database backend: " + str(name))
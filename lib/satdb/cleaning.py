@@ -0,0 +1,227 @@
+from bisect import bisect_left
+from datetime import datetime
+import numpy as np
+from satdb import tools
+from satdb.jobstate import get_watermark, set_watermark
+
+# Columns of orbelem which are cleaned. The table orbelem_clean holds the
+# cleaned values (outliers replaced by the moving median) and the bit mask
+# flags of the columns with an outlier
+CLEAN_COLUMNS = ("semimajor_axis", "mean_motion", "eccentricity", "inclination")
+CLEAN_FLAGS = dict((col, 1 << i) for i, col in enumerate(CLEAN_COLUMNS))
+
+# Name of the job in the table jobstate
+CLEAN_JOB = "clean_orbelem"
+
+# Scale factor of the median absolute deviation to the standard deviation of
+# normally distributed data
+MAD_SCALE = 1.4826
+
+# Hampel filter for several series at once. A sample is an outlier, if it
+# deviates more than nsigma (scaled) median absolute deviations from the
+# moving median of the window of 2*boxhw+1 samples. The median absolute
+# deviation is approximated by the moving median of the deviations. Returns
+# a list of (cleaned series, outlier mask) tuples, outliers are replaced by
+# the moving median
+def hampel_batch(series, boxhw=5, nsigma=3.0):
+    series = [np.asarray(s, dtype=np.float64) for s in series]
+    medians = tools.movmedian_batch(series, boxhw)
+    devs = [np.abs(s - m) for s, m in zip(series, medians)]
+    mads = tools.movmedian_batch(devs, boxhw)
+
+    result = []
+    for s, m, d, mad in zip(series, medians, devs, mads):
+        # The small relative tolerance keeps constant series with rounding
+        # noise from being flagged
+        outlier = d > nsigma * MAD_SCALE * mad + 1e-9 * np.abs(m)
+        result.append((np.where(outlier, m, s), outlier))
+    return result
+
+#------------------------------------------------------------------------------
+# Class holding the element history of one object to clean. Rows from index
+# first on are (re-)written to orbelem_clean, the rows before are context for
+# the filter windows only
+class _Series:
+    def __init__(self, norad, epochs, values, first=0):
+        self.norad = norad
+        self.epochs = epochs
+        self.values = values
+        self.first = first
+
+    def __len__(self):
+        return len(self.epochs)
+
+# Split query rows (norad, epoch, CLEAN_COLUMNS...) sorted by norad and epoch
+# into _Series objects
+def _split_rows(rows):
+    if len(rows) == 0:
+        return []
+
+    columns = [list(col) for col in zip(*rows)]
+    norads = np.asarray(columns[0], dtype=np.int64)
+    epochs = columns[1]
+    values = dict((col, np.array(vals, dtype=np.float64))
+            for col, vals in zip(CLEAN_COLUMNS, columns[2:]))
+
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(norads)) + 1,
+        [len(norads)]))
+    series = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        series.append(_Series(int(norads[lo]), epochs[lo:hi],
+            dict((col, v[lo:hi]) for col, v in values.items())))
+    return series
+
+# Filter the series and replace their rows from index first on in
+# orbelem_clean. Commits once for all series. Returns the number of written
+# rows and outliers
+def _clean_series(dbc, series, boxhw, nsigma):
+    if len(series) == 0:
+        return 0, 0
+
+    flags = [np.zeros(len(s), dtype=np.int64) for s in series]
+    cleaned = dict()
+    for col in CLEAN_COLUMNS:
+        res = hampel_batch([s.values[col] for s in series], boxhw, nsigma)
+        cleaned[col] = [r[0] for r in res]
+        for k, r in enumerate(res):
+            flags[k][r[1]] |= CLEAN_FLAGS[col]
+
+    created = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+    deletes = []
+    rows = []
+    n_outliers = 0
+    for k, s in enumerate(series):
+        f = s.first
+        if f >= len(s):
+            continue
+        deletes.append((s.norad, s.epochs[f]))
+        cols = [np.where(np.isnan(cleaned[col][k][f:]), None,
+            cleaned[col][k][f:]).tolist() for col in CLEAN_COLUMNS]
+        for i, vals in enumerate(zip(*cols)):
+            rows.append((s.norad, s.epochs[f + i]) + vals
+                    + (int(flags[k][f + i]), created))
+        n_outliers += int(np.count_nonzero(flags[k][f:]))
+
+    sql = ("insert into orbelem_clean (norad, epoch, "
+            + ", ".join(CLEAN_COLUMNS) + ", flags, created) values ("
+            + ", ".join(["%s"] * (len(CLEAN_COLUMNS) + 4)) + ")")
+    try:
+        dbc.writemany("delete from orbelem_clean where norad = %s and epoch >= %s",
+                deletes, commit=False)
+        dbc.writemany(sql, rows, commit=False)
+        dbc.commit()
+    except:
+        dbc.rollback()
+        raise
+    return len(rows), n_outliers
+
+# Fetch the series of the given objects starting 4*boxhw samples before the
+# earliest new epoch (first_new: norad -> epoch). The filter results of the
+# samples from 2*boxhw before the new epoch on depend on the new samples
+def _fetch_windows(dbc, first_new, boxhw):
+    norads = list(first_new)
+
+    # Epochs of the context samples before the first new epoch
+    sql = " union all ".join(
+            "select * from (select norad, epoch from orbelem"
+            + " where norad = %s and epoch < %s order by epoch desc limit %s)"
+            + " as t" + str(i) for i in range(0, len(norads)))
+    arguments = []
+    for norad in norads:
+        arguments += [norad, first_new[norad], 4 * boxhw]
+    start = dict(first_new)
+    for norad, epoch in dbc.fetchall(sql, tuple(arguments)):
+        if epoch < start[norad]:
+            start[norad] = epoch
+
+    sql = ("select norad, epoch, " + ", ".join(CLEAN_COLUMNS)
+            + " from orbelem where "
+            + " or ".join(["(norad = %s and epoch >= %s)"] * len(norads))
+            + " order by norad, epoch")
+    arguments = []
+    for norad in norads:
+        arguments += [norad, start[norad]]
+    series = _split_rows(dbc.fetchall(sql, tuple(arguments)))
+
+    for s in series:
+        i = bisect_left(s.epochs, first_new[s.norad])
+        s.first = max(0, i - 2 * boxhw)
+    return series
+
+# Clean the series of all objects in orbelem and write them to
+# orbelem_clean. Incremental runs (full=False) only reprocess the windows
+# around the element sets created since the last run, recorded in the table
+# jobstate. Returns the number of processed objects, written rows and
+# outliers
+def clean_orbelem(dbc, full=False, boxhw=5, nsigma=3.0, batch_size=200):
+    watermark = None if full else get_watermark(dbc, CLEAN_JOB)
+    new_watermark = dbc.fetchone("select max(created) from orbelem")[0]
+    n_objects = 0
+    n_rows = 0
+    n_outliers = 0
+
+    if watermark is None:
+        # Full run: stream the whole table sorted by object. The rows of the
+        # last object of a chunk are kept until the object is complete. The
+        # old rows are deleted in the transaction of the first batch, so a
+        # failing first batch leaves orbelem_clean as it was
+        dbc.execute("delete from orbelem_clean")
+        sql = ("select norad, epoch, " + ", ".join(CLEAN_COLUMNS)
+                + " from orbelem order by norad, epoch")
+        pending = []
+        try:
+            for rows in dbc.iter_query(sql, size=10000, chunks=True):
+                pending += rows
+                series = _split_rows(pending)
+                if len(series) <= batch_size:
+                    continue
+                last = series.pop()
+                pending = pending[len(pending) - len(last):]
+                n, m = _clean_series(dbc, series, boxhw, nsigma)
+                n_objects += len(series)
+                n_rows += n
+                n_outliers += m
+            series = _split_rows(pending)
+            n, m = _clean_series(dbc, series, boxhw, nsigma)
+            n_objects += len(series)
+            n_rows += n
+            n_outliers += m
+            # Without any series, the delete is not committed by a batch
+            dbc.commit()
+        except:
+            dbc.rollback()
+            raise
+    else:
+        # Incremental run: the earliest new epoch per changed object
+        first_new = dict(dbc.fetchall(
+            "select norad, min(epoch) from orbelem where created >= %s group by norad",
+            (watermark,)))
+        norads = sorted(first_new)
+        for i in range(0, len(norads), batch_size):
+            chunk = dict((norad, first_new[norad])
+                    for norad in norads[i:i + batch_size])
+            series = _fetch_windows(dbc, chunk, boxhw)
+            n, m = _clean_series(dbc, series, boxhw, nsigma)
+            n_objects += len(series)
+            n_rows += n
+            n_outliers += m
+
+    # Rows created at the same second as the watermark are processed again
+    # in the next run (created >= watermark), so no row is missed
+    if new_watermark is not None:
+        set_watermark(dbc, CLEAN_JOB, new_watermark)
+
+    return n_objects, n_rows, n_outliers
+
+# Cleaned series of an object from orbelem_clean as dictionary of numpy
+# arrays (see Dbase.fetchcolumns())
+def fetch_clean(dbc, norad, start=None, end=None):
+    sql = "select * from orbelem_clean where norad = %s"
+    arguments = [norad]
+    if start is not None:
+        sql += " and epoch >= %s"
+        arguments.append(start)
+    if end is not None:
+        sql += " and epoch <= %s"
+        arguments.append(end)
+    return dbc.fetchcolumns(sql + " order by epoch", tuple(arguments))
@@ -1,42 +1,194 @@
-import mysql.connector
-from datetime import datetime
+from mysql.connector import FieldType
+from datetime import date, datetime
+from decimal import Decimal
+import numpy as np
+from satdb.backend import get_backend
 
 NULL = "NULL"
 
+# numpy dtypes of the MySQL column types for columnar query results. Columns
+# of other types are returned as object arrays
+_FLOAT_TYPES = (FieldType.FLOAT, FieldType.DOUBLE, FieldType.DECIMAL,
+        FieldType.NEWDECIMAL)
+_INT_TYPES = (FieldType.TINY, FieldType.SHORT, FieldType.LONG,
+        FieldType.LONGLONG, FieldType.INT24, FieldType.YEAR)
+_DATETIME_TYPES = (FieldType.DATE, FieldType.DATETIME, FieldType.TIMESTAMP,
+        FieldType.NEWDATE)
+
+# Guess the column type from the first value which is not None, if the type
+# code of the column is unknown
+def _type_of_values(values):
+    for v in values:
+        if v is None:
+            continue
+        if isinstance(v, bool):
+            return None
+        if isinstance(v, int):
+            return FieldType.LONGLONG
+        if isinstance(v, (float, Decimal)):
+            return FieldType.DOUBLE
+        if isinstance(v, (datetime, date)):
+            return FieldType.DATETIME
+        return None
+    return None
+
+# Convert the values of a result column to a numpy array. Floats are stored
+# as float64, datetimes as datetime64[us] and integers as int64. NULL
+# values are stored as NaN and NaT, integer columns containing NULL values
+# are therefore returned as float64
+def column_array(values, type_code=None):
+    if type_code not in _FLOAT_TYPES + _INT_TYPES + _DATETIME_TYPES:
+        type_code = _type_of_values(values)
+
+    if type_code in _FLOAT_TYPES:
+        return np.array(values, dtype=np.float64)
+    if type_code in _INT_TYPES:
+        if None in values:
+            return np.array(values, dtype=np.float64)
+        return np.array(values, dtype=np.int64)
+    if type_code in _DATETIME_TYPES:
+        return np.array(values, dtype='datetime64[us]')
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+# Unique column names of a cursor description. Repeated names (e.g. norad
+# of two joined tables) get the suffix _1, _2, ...
+def _column_names(description):
+    names = []
+    for d in description:
+        name = d[0]
+        k = 1
+        while name in names:
+            name = d[0] + "_" + str(k)
+            k += 1
+        names.append(name)
+    return names
+
 #------------------------------------------------------------------------------
-# Class for database connection instance and functions
+# Class for database connection instance and functions. The database engine
+# is selected with backend in the config (mysql, sqlite or duckdb, see
+# backend.py). The statements are written for MySQL and translated for the
+# embedded backends.
 class Dbase:
     def __init__(self, configdata):
         self.config = configdata
+        self.backend = get_backend(configdata)
+        self.dialect = self.backend.dialect
+
+    # Open and return a new connection to the database
+    def _connect(self):
+        return self.backend.connect(self.config)
 
     def connect(self):
-        try:
-            self.connection = mysql.connector.connect(host=self.config.host, port=self.config.port, user=self.config.user, password=self.config.password, database=self.config.database)
-        except mysql.connector.Error as err:
-            print(err)
-            print("Error Code:", err.errno)
-            print("SQLSTATE", err.sqlstate)
-            print("Message", err.msg)
-            exit()
+        self.connection = self._connect()
+        self.cursor = self.backend.cursor(self.connection)
+        self.backend.init(self)
 
-        self.cursor = self.connection.cursor()
+    def _execute(self, cursor, sql, arguments):
+        cursor.execute(self.backend.sql(sql), self.backend.arguments(arguments))
 
     def fetchone(self, sql, arguments=None):
-        self.cursor.execute(sql, arguments)
-        data = self.cursor.fetchone()
-        self.connection.commit()
+        self._execute(self.cursor, sql, arguments)
+        data = self.backend.row(self.cursor.fetchone())
+        self.commit()
         return data
 
     def fetchall(self, sql, arguments=None):
-        self.cursor.execute(sql, arguments)
-        data = self.cursor.fetchall()
-        self.connection.commit()
+        self._execute(self.cursor, sql, arguments)
+        data = self.backend.rows(self.cursor.fetchall())
+        self.commit()
         return data
 
+    # Query returning the result as dictionary of numpy arrays, one entry per
+    # column (see column_array() for the dtypes), e.g.
+    #   res = dbc.fetchcolumns("select norad, epoch, eccentricity from ...")
+    #   res["eccentricity"].mean()
+    def fetchcolumns(self, sql, arguments=None):
+        self._execute(self.cursor, sql, arguments)
+        rows = self.backend.rows(self.cursor.fetchall())
+        description = self.cursor.description
+        self.commit()
+
+        names = _column_names(description)
+        if len(rows) > 0:
+            values = [list(col) for col in zip(*rows)]
+        else:
+            values = [[] for name in names]
+
+        return dict(
+            (name, column_array(vals, d[1]))
+            for name, vals, d in zip(names, values, description)
+            )
+
+    # Query returning the result as numpy structured array with the column
+    # names as fields. String columns are stored as objects
+    def fetcharray(self, sql, arguments=None):
+        columns = self.fetchcolumns(sql, arguments)
+        n = len(next(iter(columns.values()))) if len(columns) > 0 else 0
+        array = np.empty(n, dtype=[(name, col.dtype)
+            for name, col in columns.items()])
+        for name, col in columns.items():
+            array[name] = col
+        return array
+
+    # Query returning the result as pandas DataFrame. pandas is optional and
+    # only imported here
+    def fetchframe(self, sql, arguments=None):
+        import pandas
+        return pandas.DataFrame(self.fetchcolumns(sql, arguments))
+
+    # Generator yielding the rows of a query one after another, or lists of
+    # up to size rows, if chunks is True. With MySQL the query runs on its
+    # own connection with an unbuffered cursor, so the rows are streamed from
+    # the server in chunks of size rows and the shared cursor can be used
+    # in the meantime.
+    def iter_query(self, sql, arguments=None, size=1000, chunks=False):
+        connection, cursor = self.backend.stream_cursor(self)
+        try:
+            self._execute(cursor, sql, arguments)
+            while True:
+                rows = self.backend.rows(cursor.fetchmany(size))
+                if not rows:
+                    break
+                if chunks:
+                    yield rows
+                else:
+                    for row in rows:
+                        yield row
+        finally:
+            # Closing the connection discards unread rows, if the generator
+            # was not exhausted
+            try:
+                cursor.close()
+            except Exception:
+                pass
+            if connection is not None:
+                connection.close()
+
     def write(self, sql, arguments=None):
-        self.cursor.execute(sql, arguments)
-        self.connection.commit()
+        self._execute(self.cursor, sql, arguments)
+        self.commit()
+
+    # Execute the sql statement for a sequence of argument tuples. Insert
+    # statements are combined to multi-row VALUES statements (except for
+    # SQLite, where executing row by row is fast). Returns the number of
+    # affected rows
+    def writemany(self, sql, arguments, commit=True):
+        n = self.backend.executemany(self.cursor, sql, arguments)
+        if commit:
+            self.commit()
+        return n
+
+    # Execute the sql statement without commit, e.g. as part of a transaction
+    def execute(self, sql, arguments=None):
+        self._execute(self.cursor, sql, arguments)
+
+    def commit(self):
+        self.backend.commit(self.connection)
+
+    def rollback(self):
+        self.backend.rollback(self.connection)
 
     def disconnect(self):
         self.connection.close()
-
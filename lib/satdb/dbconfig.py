@@ -10,7 +10,12 @@ class DBConfig(BaseConfig):
                 'port': 3306,
                 'database': 'spaceobjects',
                 'user': 'mysqluser',
-                'password': 'secret'
+                'password': 'secret',
+                # Database engine: mysql, sqlite or duckdb. The embedded
+                # engines sqlite and duckdb store the database in the file
+                # path
+                'backend': 'mysql',
+                'path': 'satdb.sqlite'
                 }
         super().__init__(configfilename)
 
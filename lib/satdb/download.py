@@ -0,0 +1,199 @@
+import asyncio
+from collections import deque
+from datetime import timedelta
+import gzip
+import os
+import threading
+import time
+
+import spacetrack.operators as op
+from spacetrack.aio import AsyncSpaceTrackClient
+
+from satdb.ingest import OMMStreamImporter
+from satdb.tools import ttprint
+
+# Split the epoch range [epoch_from, epoch_to] into chunks of days days. The
+# chunks share their boundaries, so no epoch is lost independent of whether
+# the upper boundary of a range is inclusive. Returns a list of (from, to)
+def split_epoch_range(epoch_from, epoch_to, days):
+    chunks = []
+    start = epoch_from
+    while start < epoch_to:
+        stop = min(start + timedelta(days=days), epoch_to)
+        chunks.append((start, stop))
+        start = stop
+    return chunks
+
+#------------------------------------------------------------------------------
+# Class to limit the rate of requests. Each limit (max_calls, period) allows
+# at most max_calls calls of wait() within period seconds, e.g. the
+# Space-Track limits of 30 requests per minute and 300 per hour:
+#   limiter = RateLimiter((30, 60), (300, 3600))
+#   await limiter.wait()
+class RateLimiter:
+    def __init__(self, *limits):
+        self.limits = limits
+        self.calls = [deque() for limit in limits]
+        self.lock = None
+
+    async def wait(self):
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                delay = 0.
+                for (max_calls, period), calls in zip(self.limits, self.calls):
+                    while len(calls) > 0 and calls[0] <= now - period:
+                        calls.popleft()
+                    if len(calls) >= max_calls:
+                        delay = max(delay, calls[0] + period - now)
+                if delay <= 0.:
+                    break
+                await asyncio.sleep(delay)
+            for calls in self.calls:
+                calls.append(now)
+
+#------------------------------------------------------------------------------
+# Class for the journal of finished downloads. Each finished task is
+# appended as one line "key<TAB>filename" to the journal file, so an
+# interrupted run can be resumed by skipping the tasks in the journal.
+class DownloadJournal:
+    def __init__(self, filename):
+        self.filename = filename
+        self.finished = {}
+        if os.path.exists(filename):
+            with open(filename, "r") as fh:
+                for line in fh:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) == 2:
+                        self.finished[parts[0]] = parts[1]
+
+    def done(self, key):
+        return key in self.finished
+
+    def add(self, key, filename):
+        with open(self.filename, "a") as fh:
+            fh.write(key + "\t" + filename + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        self.finished[key] = filename
+
+#------------------------------------------------------------------------------
+# Class describing the download of the history of a group of objects in one
+# epoch range
+class HistoryTask:
+    def __init__(self, norads, epoch_from, epoch_to):
+        self.norads = list(norads)
+        self.epoch_from = epoch_from
+        self.epoch_to = epoch_to
+
+    # Key of the task in the journal
+    def key(self):
+        return (",".join(str(n) for n in self.norads) + " "
+                + self.epoch_from.isoformat() + " " + self.epoch_to.isoformat())
+
+    # Name of the output file, e.g. 20210301120000_25544_20200101_20201231.xml.gz
+    def filename(self, outdir, prefix):
+        norads = str(self.norads[0])
+        if len(self.norads) > 1:
+            norads += "-" + str(self.norads[-1])
+        return os.path.join(outdir, prefix + "_" + norads + "_"
+                + self.epoch_from.strftime("%Y%m%d") + "_"
+                + self.epoch_to.strftime("%Y%m%d") + ".xml.gz")
+
+# Create the download tasks for the objects and the epoch range. The range
+# is split into chunks of chunk_days days, group_size objects are requested
+# at once
+def history_tasks(norads, epoch_from, epoch_to, chunk_days=365, group_size=1):
+    tasks = []
+    for i in range(0, len(norads), group_size):
+        for start, stop in split_epoch_range(epoch_from, epoch_to, chunk_days):
+            tasks.append(HistoryTask(norads[i:i + group_size], start, stop))
+    return tasks
+
+# Download the history of one task with the AsyncSpaceTrackClient st. The
+# data is written to a temporary file first and renamed when complete. If a
+# BatchWriter is given, the downloaded data is parsed and imported into the
+# database at the same time (pipeline mode), the file is kept as archive.
+# Parsing and writing run in the default executor of the loop, lock
+# serializes the access of concurrent tasks to the writer. Returns the
+# number of imported segments (None without writer)
+async def _download_task(st, task, filename, verbose=False, writer=None,
+        lock=None):
+    data = await st.gp_history(
+        iter_content=True,
+        norad_cat_id=task.norads if len(task.norads) > 1 else task.norads[0],
+        epoch=op.inclusive_range(task.epoch_from, task.epoch_to),
+        orderby='epoch',
+        format='xml',
+        )
+
+    loop = asyncio.get_event_loop()
+    importer = None
+    if writer is not None:
+        importer = OMMStreamImporter(writer, lock=lock)
+
+    tmp = filename + ".part"
+    with gzip.open(tmp, 'wt') as fp:
+        nchunks = 1
+        async for chunk in data:
+            fp.write(chunk)
+            if importer is not None:
+                await loop.run_in_executor(None, importer.feed, chunk)
+            if verbose:
+                ttprint("  Write chunk " + str(nchunks) + " of " + filename)
+            nchunks += 1
+
+    # The records are committed before the archive file is complete. If the
+    # download fails, the task is not recorded in the journal and repeated
+    # by the next run. The records inserted again are ignored by the
+    # database, the latest-state tables keep the newest epoch
+    n = None
+    if importer is not None:
+        n = await loop.run_in_executor(None, importer.close)
+    os.replace(tmp, filename)
+    return n
+
+# Run the download tasks concurrently with at most concurrency requests at a
+# time. Finished tasks are recorded in the journal, tasks already in the
+# journal are skipped. Failed tasks are reported and left for the next run.
+# With a BatchWriter, the data is imported into the database while it is
+# downloaded (see _download_task()). The data is parsed and written outside
+# of the event loop, so the other downloads continue meanwhile. Returns the
+# numbers of downloaded, skipped and failed tasks
+async def download_history(config, tasks, outdir, prefix, journal,
+        concurrency=4, limiter=None, verbose=False, writer=None):
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"downloaded": 0, "skipped": 0, "failed": 0}
+    lock = threading.Lock()
+
+    async def run(st, task):
+        if journal.done(task.key()):
+            counts["skipped"] += 1
+            return
+        filename = task.filename(outdir, prefix)
+        async with semaphore:
+            if limiter is not None:
+                await limiter.wait()
+            try:
+                n = await _download_task(st, task, filename, verbose, writer,
+                        lock)
+            except Exception as err:
+                counts["failed"] += 1
+                ttprint("Error downloading " + task.key() + ": " + repr(err))
+                return
+        journal.add(task.key(), filename)
+        counts["downloaded"] += 1
+        if n is None:
+            ttprint("Downloaded file: " + filename)
+        else:
+            ttprint("Downloaded file: " + filename + ", " + str(n)
+                    + " segments imported")
+
+    st = AsyncSpaceTrackClient(config.user, config.password,
+            base_url=config.base_url)
+    async with st:
+        await asyncio.gather(*(run(st, task) for task in tasks))
+
+    return counts["downloaded"], counts["skipped"], counts["failed"]
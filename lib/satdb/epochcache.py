@@ -0,0 +1,202 @@
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+from satdb import TLE
+from satdb.tle import TLE_ORBELEM_COLUMNS, fetch_names
+
+# Columns of TLE_ORBELEM_COLUMNS holding integers
+_INT_COLUMNS = ("element_set_no", "rev_at_epoch")
+
+# Convert an epoch (datetime, ISO string or numpy datetime64) to datetime64[us]
+def _dt64(epoch):
+    if isinstance(epoch, str):
+        epoch = datetime.fromisoformat(epoch)
+    return np.datetime64(epoch, 'us')
+
+#------------------------------------------------------------------------------
+# Class holding the sorted epochs and element sets of one object
+class _Entry:
+    def __init__(self, norad):
+        self.norad = norad
+        self.epochs = np.array([], dtype='datetime64[us]')
+        # Elements in the order of TLE_ORBELEM_COLUMNS without norad and epoch
+        self.elements = np.zeros((0, len(TLE_ORBELEM_COLUMNS) - 2))
+        self.created = None
+        self.names = None
+
+    # Merge rows (epoch, elements..., created) into the entry. Rows with an
+    # epoch already in the entry replace the cached element set
+    def merge(self, rows):
+        if len(rows) == 0:
+            return
+
+        epochs = np.array([row[0] for row in rows], dtype='datetime64[us]')
+        elements = np.array([row[1:-1] for row in rows], dtype=np.float64)
+        created = max(row[-1] for row in rows if row[-1] is not None) \
+                if any(row[-1] is not None for row in rows) else None
+
+        keep = ~np.isin(self.epochs, epochs)
+        epochs = np.concatenate((self.epochs[keep], epochs))
+        elements = np.concatenate((self.elements[keep], elements))
+        order = np.argsort(epochs, kind='stable')
+        self.epochs = epochs[order]
+        self.elements = elements[order]
+
+        if created is not None and (self.created is None or created > self.created):
+            self.created = created
+
+    def nbytes(self):
+        return self.epochs.nbytes + self.elements.nbytes
+
+    # Return the element set with index i as tuple in the order of
+    # TLE_ORBELEM_COLUMNS
+    def row(self, i):
+        values = self.elements[i].tolist()
+        for k, col in enumerate(TLE_ORBELEM_COLUMNS[2:]):
+            if col in _INT_COLUMNS and values[k] == values[k]:
+                values[k] = int(values[k])
+        return (self.norad, self.epochs[i].item()) + tuple(values)
+
+#------------------------------------------------------------------------------
+# Cache for nearest-, before- and after-epoch lookups of element sets. The
+# sorted epochs and the elements of an object are loaded once from the
+# database, lookups are binary searches. Objects are evicted in least
+# recently used order, if more than max_objects are cached or the cached
+# arrays need more than max_bytes. refresh() fetches element sets ingested
+# since the object was loaded, detected from the column created.
+class EpochCache:
+    def __init__(self, dbc, max_objects=1000, max_bytes=None):
+        self.dbc = dbc
+        self.max_objects = max_objects
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+
+    def _select(self):
+        return ("select epoch, "
+                + ", ".join(TLE_ORBELEM_COLUMNS[2:])
+                + ", created from orbelem where norad = %s")
+
+    def _load(self, norad):
+        entry = _Entry(norad)
+        entry.merge(self.dbc.fetchall(self._select() + " order by epoch",
+            (norad,)))
+        return entry
+
+    def _evict(self):
+        while len(self.entries) > 0 and (
+                (self.max_objects is not None
+                    and len(self.entries) > self.max_objects)
+                or (self.max_bytes is not None
+                    and self.nbytes > self.max_bytes)):
+            norad, entry = self.entries.popitem(last=False)
+            self.nbytes -= entry.nbytes()
+
+    # Entry of an object. NORAD ids are normalized to int, so that "25544"
+    # and 25544 share one entry
+    def _get(self, norad):
+        norad = int(norad)
+        entry = self.entries.get(norad)
+        if entry is not None:
+            self.entries.move_to_end(norad)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        entry = self._load(norad)
+        self.entries[norad] = entry
+        self.nbytes += entry.nbytes()
+        self._evict()
+        return entry
+
+    # Fetch the element sets created since the last load/refresh for the
+    # given objects (default: all cached objects). created has a precision
+    # of seconds and the BatchWriter stamps one created per batch, so rows
+    # committed in the same second as the newest cached row are fetched
+    # again (>=); merge() replaces them by epoch
+    def refresh(self, norads=None):
+        if norads is None:
+            norads = list(self.entries)
+        for norad in norads:
+            norad = int(norad)
+            entry = self.entries.get(norad)
+            if entry is None:
+                continue
+            self.nbytes -= entry.nbytes()
+            if entry.created is None:
+                rows = self.dbc.fetchall(self._select(), (norad,))
+            else:
+                rows = self.dbc.fetchall(self._select() + " and created >= %s",
+                        (norad, entry.created))
+            entry.merge(rows)
+            self.nbytes += entry.nbytes()
+        self._evict()
+
+    # Drop the given object (or all objects) from the cache
+    def invalidate(self, norad=None):
+        if norad is None:
+            self.entries = OrderedDict()
+            self.nbytes = 0
+            return
+        norad = int(norad)
+        if norad in self.entries:
+            self.nbytes -= self.entries.pop(norad).nbytes()
+
+    # Sorted epochs of an object as numpy datetime64[us] array
+    def epochs(self, norad):
+        return self._get(norad).epochs
+
+    # Latest element set with epoch less or equal the given epoch
+    def before(self, norad, epoch):
+        entry = self._get(norad)
+        i = np.searchsorted(entry.epochs, _dt64(epoch), side='right') - 1
+        return entry.row(i) if i >= 0 else None
+
+    # Earliest element set with epoch greater or equal the given epoch
+    def after(self, norad, epoch):
+        entry = self._get(norad)
+        i = np.searchsorted(entry.epochs, _dt64(epoch), side='left')
+        return entry.row(i) if i < len(entry.epochs) else None
+
+    # Element set with the epoch nearest to the given epoch
+    def nearest(self, norad, epoch):
+        entry = self._get(norad)
+        if len(entry.epochs) == 0:
+            return None
+
+        e = _dt64(epoch)
+        i = np.searchsorted(entry.epochs, e, side='right')
+        if i == 0:
+            return entry.row(0)
+        if i == len(entry.epochs):
+            return entry.row(i - 1)
+        if e - entry.epochs[i - 1] <= entry.epochs[i] - e:
+            return entry.row(i - 1)
+        return entry.row(i)
+
+    # Same as TLE.fromdb(), but served from the cache. mode is "nearest",
+    # "before" or "after". Raises ValueError, if the object has no element
+    # set, objects without metadata are named by their NORAD id
+    def tle(self, norad, epoch, mode="nearest"):
+        norad = int(norad)
+        row = getattr(self, mode)(norad, epoch)
+        if row is None:
+            raise ValueError("No element set of object " + str(norad))
+
+        entry = self._get(norad)
+        if entry.names is None:
+            entry.names = fetch_names(self.dbc, [norad]).get(norad,
+                    (str(norad), "", "U"))
+
+        name, id_short, classification = entry.names
+        tle = TLE()
+        tle.from_result((name or str(norad), norad, id_short or "",
+            classification or "U") + tuple(row[1:]))
+        return tle
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,448 @@
+from contextlib import nullcontext
+from datetime import datetime
+import multiprocessing
+import queue
+import time
+from satdb import MetadataIndex, OMMMetadata, OrbelemBatch, OMMParser, OMMReader, tools
+from satdb.keyfilter import orbelem_keys
+from satdb.latest import has_latest_tables, newest_rows, upsert_latest_sql
+from satdb.manifest import add_to_manifest, file_digest, has_manifest, in_manifest
+from satdb.record import created_now, insert_sql
+from satdb.stats import StageTimer
+from satdb.tlecodec import iter_tle_blocks
+
+# File name endings of the supported input files
+OMM_SUFFIXES = (".xml", ".xml.gz")
+TLE_SUFFIXES = (".tle", ".tle.gz", ".txt", ".txt.gz")
+
+#------------------------------------------------------------------------------
+# Class to collect metadata and orbital element records and write them to the
+# database in batches. Each batch is written with one executemany per table
+# and column set and committed as one transaction. Rows without the column
+# created get the same timestamp per batch. With a KeyFilter, element
+# sets already stored in the database are skipped by add_chunk(). The time
+# of the stages is recorded in the StageTimer timer (see stats.py).
+class BatchWriter:
+    def __init__(self, dbc, batch_size=1000, md_index=None, latest=None,
+            keyfilter=None, timer=None):
+        self.dbc = dbc
+        self.batch_size = batch_size
+        self.keyfilter = keyfilter
+        self.timer = timer if timer is not None else StageTimer()
+
+        # Update the latest-state tables orbelem_latest and metadata_latest.
+        # By default, if they exist in the database
+        if latest is None:
+            latest = has_latest_tables(dbc)
+        self.latest = latest
+
+        # Index of the latest metadata per object. Loaded from the database,
+        # if not given
+        if md_index is None:
+            with self.timer.stage("dedup"):
+                md_index = MetadataIndex()
+                md_index.load(dbc)
+        self.md_index = md_index
+
+        # Fingerprints of the queued metadata, added to md_index after commit:
+        # norad -> fingerprint
+        self.md_pending = {}
+
+        # Pending rows, grouped by table and column set:
+        # (table, (col1, col2, ...)) -> [(val1, val2, ...), ...]
+        self.pending = {}
+        self.n_pending = 0
+
+        # Statistics
+        self.n_queued = 0
+        self.n_skipped = 0
+        self.n_written = 0
+        self.n_batches = 0
+        self.n_discarded = 0
+        self.t_start = datetime.now()
+
+        # Newest CREATION_DATE (column data_created) of the queued element
+        # sets as string, see jobstate.GP_WATERMARK_JOB
+        self.max_data_created = None
+
+    def _data_created(self, values):
+        values = [v for v in values if v is not None]
+        if len(values) == 0:
+            return
+        newest = max(values)
+        if self.max_data_created is None or newest > self.max_data_created:
+            self.max_data_created = newest
+
+    def _queue(self, table, db_cols, db_vals):
+        key = (table, tuple(db_cols))
+        rows = self.pending.get(key)
+        if rows is None:
+            rows = self.pending[key] = []
+        rows.append(tuple(db_vals))
+        self.n_pending += 1
+        self.n_queued += 1
+
+        if self.n_pending >= self.batch_size:
+            self.flush()
+
+    # Queue a OMMMetadata object. The metadata is only inserted, if it
+    # differs from the metadata stored last for this object
+    def add_metadata(self, md):
+        t_start = time.perf_counter()
+        changed = self.md_index.changed(md, self.md_pending)
+        self.timer.add("dedup", time.perf_counter() - t_start, 1)
+        if not changed:
+            return
+
+        db_cols, db_vals = md.db_row()
+        self._queue("metadata", db_cols, db_vals)
+
+    # Queue a OMMOrbelem object
+    def add_orbelem(self, od):
+        db_cols, db_vals = od.db_row()
+        self._data_created([od.data_created])
+        self._queue("orbelem", db_cols, db_vals)
+
+    # Queue all element sets of a OrbelemBatch
+    def add_orbelem_batch(self, batch):
+        self._data_created(batch.columns["data_created"])
+        with self.timer.stage("build"):
+            rows = list(batch.rows())
+        for db_cols, db_vals in rows:
+            self._queue("orbelem", db_cols, db_vals)
+
+    # Queue a list of OMMMetadata objects and a OrbelemBatch with the element
+    # sets of the same records (as yielded by parse_file()). Records already
+    # in the database are skipped, if the writer has a KeyFilter
+    def add_chunk(self, mds, batch):
+        if self.keyfilter is not None and batch.n > 0:
+            with self.timer.stage("keyfilter", batch.n):
+                batch.to_arrays()
+                keys = orbelem_keys(batch.columns["norad"], batch.columns["epoch"])
+                new = ~self.keyfilter.known_keys(keys)
+                self.n_skipped += batch.n - int(new.sum())
+                if not new.all():
+                    mds = [md for md, m in zip(mds, new) if m]
+                    batch.take(new)
+                self.keyfilter.add(keys[new])
+
+        for md in mds:
+            self.add_metadata(md)
+        self.add_orbelem_batch(batch)
+
+    def add(self, md=None, od=None):
+        if md is not None:
+            self.add_metadata(md)
+        if od is not None:
+            self.add_orbelem(od)
+
+    # Write all pending rows to the database within one transaction
+    def flush(self):
+        if self.n_pending == 0:
+            return
+
+        created = created_now()
+        timer = self.timer
+        try:
+            for (table, db_cols), rows in self.pending.items():
+                if "created" not in db_cols:
+                    db_cols = db_cols + ("created",)
+                    rows = [row + (created,) for row in rows]
+                with timer.stage("insert", len(rows)):
+                    n = self.dbc.writemany(insert_sql(table, db_cols), rows,
+                            commit=False)
+                if n is not None and n > 0:
+                    self.n_written += n
+                if self.latest:
+                    with timer.stage("latest", len(rows)):
+                        self.dbc.writemany(
+                                upsert_latest_sql(table, db_cols, self.dbc.dialect),
+                                newest_rows(db_cols, rows), commit=False)
+            with timer.stage("commit", 1):
+                self.dbc.commit()
+        except:
+            self.dbc.rollback()
+            raise
+
+        self.md_index.update(self.md_pending)
+        self.md_pending = {}
+        self.pending = {}
+        self.n_pending = 0
+        self.n_batches += 1
+
+    # Drop the pending rows without writing them, e.g. after a failed flush
+    def discard(self):
+        self.md_pending = {}
+        self.pending = {}
+        self.n_pending = 0
+        self.n_discarded += 1
+
+    # Number of rows per second queued since the writer was created
+    def rate(self):
+        dt = (datetime.now() - self.t_start).total_seconds()
+        return self.n_queued / dt if dt > 0 else 0.
+
+    # Newest CREATION_DATE of the queued element sets as datetime
+    def watermark(self):
+        if self.max_data_created is None:
+            return None
+        return datetime.fromisoformat(self.max_data_created[:19])
+
+    # Numbers of rows for the summary of a run (see StageTimer.summary())
+    def counters(self):
+        return {
+            "rows_queued": self.n_queued,
+            "rows_inserted": self.n_written,
+            "rows_skipped": self.n_skipped,
+            "batches": self.n_batches,
+            }
+
+    def summary(self):
+        dt = (datetime.now() - self.t_start).total_seconds()
+        return (str(self.n_queued) + " rows queued, "
+                + str(self.n_skipped) + " known element sets skipped, "
+                + str(self.n_written) + " rows inserted in "
+                + str(self.n_batches) + " batches, "
+                + str(round(dt, 1)) + " sec ("
+                + str(round(self.rate(), 1)) + " rows/sec)")
+
+#------------------------------------------------------------------------------
+# Class to import an OMM/XML document fed in pieces (e.g. while it is
+# downloaded) with a BatchWriter. The records are queued in chunks of
+# chunk_size element sets, the writer commits whenever its batch is full.
+# Several importers may share one writer from different threads, if they
+# get the same lock (e.g. a threading.Lock). Only queueing and committing
+# hold the lock, the parsing runs in parallel.
+class OMMStreamImporter:
+    def __init__(self, writer, chunk_size=1000, lock=None):
+        self.writer = writer
+        self.chunk_size = chunk_size
+        self.lock = lock if lock is not None else nullcontext()
+        self.parser = OMMParser()
+        self.mds = []
+        self.batch = OrbelemBatch()
+        self.n_discarded = writer.n_discarded
+
+    # Hand the current chunk to the writer. If the writer fails, its pending
+    # rows are dropped, so that they do not fail the other importers
+    def _queue(self, flush=False):
+        with self.lock:
+            try:
+                if self.batch.n > 0:
+                    self.writer.add_chunk(self.mds, self.batch)
+                if flush:
+                    self.writer.flush()
+            except:
+                self.writer.discard()
+                raise
+        self.mds = []
+        self.batch = OrbelemBatch()
+
+    def _add(self, segments):
+        timer = self.writer.timer
+        for segment in segments:
+            t_start = time.perf_counter()
+            md = OMMMetadata()
+            md.from_omm(segment)
+            self.mds.append(md)
+            self.batch.append_omm(segment, self.parser.header)
+            timer.add("build", time.perf_counter() - t_start, 1)
+            if self.batch.n >= self.chunk_size:
+                self._queue()
+
+    # Parse the next piece of the document (bytes or str)
+    def feed(self, data):
+        with self.writer.timer.stage("parse"):
+            segments = self.parser.feed(data)
+        self._add(segments)
+
+    # Finish the document and commit all its records. Returns the number of
+    # segments. Raises an exception, if the writer dropped pending rows since
+    # the importer was created, as they may include records of the document
+    def close(self):
+        with self.writer.timer.stage("parse"):
+            segments = self.parser.close()
+        self._add(segments)
+        self._queue(flush=True)
+        if self.writer.n_discarded != self.n_discarded:
+            raise RuntimeError("Records dropped after a failed commit")
+        return self.parser.n_segment
+
+# Parse an OMM or TLE file and yield (metadata, batch) tuples with a list of
+# OMMMetadata objects and a OrbelemBatch with up to chunk_size elements.
+# Invalid TLE records are skipped and appended to the list rejected as
+# (lines, reason) tuples, if given
+def parse_file(filename, chunk_size=1000, rejected=None):
+    mds = []
+    batch = OrbelemBatch()
+
+    if filename.endswith(OMM_SUFFIXES):
+        reader = OMMReader(filename)
+        for segment in reader.segments():
+            md = OMMMetadata()
+            md.from_omm(segment)
+            mds.append(md)
+            batch.append_omm(segment, reader.header)
+            if batch.n >= chunk_size:
+                yield mds, batch
+                mds = []
+                batch = OrbelemBatch()
+        reader.close()
+    elif filename.endswith(TLE_SUFFIXES):
+        fh = tools.open_file(filename)
+        for block in iter_tle_blocks(fh, chunk_size):
+            if rejected is not None:
+                rejected += block.rejected
+            if block.n == 0:
+                continue
+            for rec in block.records():
+                md = OMMMetadata()
+                md.set(**rec)
+                mds.append(md)
+            batch.from_tleblock(block)
+            yield mds, batch
+            mds = []
+            batch = OrbelemBatch()
+        fh.close()
+    else:
+        raise ValueError("Unknown file type: " + filename)
+
+    if batch.n > 0:
+        yield mds, batch
+
+# Append rejected TLE records ((lines, reason) tuples, see TLEBlock) to the
+# quarantine file filename. Each record is preceded by a comment line with
+# the reason and the file it was read from (source)
+def write_quarantine(filename, rejected, source=None):
+    with open(filename, 'a') as qf:
+        for lines, reason in rejected:
+            qf.write("# " + reason
+                    + ("" if source is None else " (" + source + ")") + "\n")
+            qf.write("\n".join(lines) + "\n")
+
+# Seconds to wait for a message of the parser processes before checking,
+# if they are still alive (see import_files())
+WORKER_POLL = 5.
+
+# Worker process: parse the files from the task queue and put the parsed
+# records to the result queue as (worker, filename, kind, data) messages. A
+# file starts with a "start" message, followed by one "chunk" message per
+# chunk of records and finishes with a "done" message with the rejected TLE
+# records as data, or with an "error" message with the error as data, if it
+# could not be parsed.
+def _parse_worker(worker, tasks, results, chunk_size):
+    for filename in iter(tasks.get, None):
+        results.put((worker, filename, "start", None))
+        rejected = []
+        try:
+            for chunk in parse_file(filename, chunk_size, rejected):
+                results.put((worker, filename, "chunk", chunk))
+        except Exception as err:
+            results.put((worker, filename, "error", str(err)))
+        else:
+            results.put((worker, filename, "done", rejected))
+
+# Parse the given files in a pool of worker processes and write the records
+# with the given BatchWriter. The records of a file are kept apart until the
+# file is parsed completely and only then handed to the writer, so a file
+# failing part-way leaves nothing in the database. The callback
+# done(filename, error) is called after all records of a file were committed
+# to the database (error is None) or if the file could not be parsed. If a
+# worker process dies (e.g. killed when out of memory), the file it was
+# parsing fails, and if no worker is left, all files not finished fail.
+# The invalid TLE records of an imported file are passed to the callback
+# rejects(filename, rejected) as (lines, reason) tuples, before done() is
+# called. Files in the manifest (table imported_files) are not imported again, but
+# reported as done. By default the manifest is used, if the table exists.
+# Returns the number of files skipped
+def import_files(writer, filenames, workers=None, chunk_size=1000, done=None,
+        manifest=None, rejects=None):
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if manifest is None:
+        manifest = has_manifest(writer.dbc)
+
+    # Skip the files imported before
+    digests = {}
+    if manifest:
+        todo = []
+        for filename in filenames:
+            digest = file_digest(filename)
+            if in_manifest(writer.dbc, digest):
+                if done is not None:
+                    done(filename, None)
+            else:
+                digests[filename] = digest
+                todo.append(filename)
+        n_skipped = len(filenames) - len(todo)
+        filenames = todo
+    else:
+        n_skipped = 0
+
+    # The size of the result queue is limited, so the workers cannot parse
+    # far ahead of the database writer
+    tasks = multiprocessing.Queue()
+    results = multiprocessing.Queue(maxsize=4 * workers)
+
+    for filename in filenames:
+        tasks.put(filename)
+    for i in range(0, workers):
+        tasks.put(None)
+
+    procs = [multiprocessing.Process(target=_parse_worker,
+        args=(i, tasks, results, chunk_size)) for i in range(0, workers)]
+    for proc in procs:
+        proc.start()
+
+    # Files not finished yet, the file each worker is parsing and the
+    # chunks of the files being parsed
+    remaining = set(filenames)
+    parsing = {}
+    chunks = {}
+
+    def finish(filename, error):
+        chunks.pop(filename, None)
+        remaining.discard(filename)
+        if done is not None:
+            done(filename, error)
+
+    try:
+        while remaining:
+            try:
+                with writer.timer.stage("wait"):
+                    worker, filename, kind, data = results.get(timeout=WORKER_POLL)
+            except queue.Empty:
+                for i, proc in enumerate(procs):
+                    if not proc.is_alive() and i in parsing:
+                        finish(parsing.pop(i), "worker process died (exit code "
+                                + str(proc.exitcode) + ")")
+                if not any(proc.is_alive() for proc in procs):
+                    for filename in sorted(remaining):
+                        finish(filename, "no worker process left")
+                continue
+
+            if kind == "start":
+                parsing[worker] = filename
+                chunks[filename] = []
+            elif kind == "chunk":
+                chunks[filename].append(data)
+            else:
+                # File finished. Commit all its records before reporting
+                parsing.pop(worker, None)
+                if kind == "done":
+                    for mds, batch in chunks.pop(filename, []):
+                        writer.add_chunk(mds, batch)
+                    writer.flush()
+                    if manifest:
+                        add_to_manifest(writer.dbc, digests[filename], filename)
+                    if rejects is not None and len(data) > 0:
+                        rejects(filename, data)
+                    data = None
+                finish(filename, data)
+    finally:
+        for proc in procs:
+            proc.join(timeout=1)
+            if proc.is_alive():
+                proc.terminate()
+
+    return n_skipped
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+# The table jobstate holds the watermark of incremental jobs (e.g. the
+# created timestamp of the last processed row), one row per job name
+
+# Watermark of the job as datetime, None if the job never ran
+def get_watermark(dbc, job):
+    res = dbc.fetchone("select watermark from jobstate where job = %s", (job,))
+    if res is None:
+        return None
+    return res[0]
+
+# Store the watermark of the job. The change is committed, unless commit is
+# False (e.g. to store it in the same transaction as the job's results)
+def set_watermark(dbc, job, watermark, commit=True):
+    updated = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+    # No select here, since Dbase.fetchone() commits
+    dbc.execute("insert ignore into jobstate (job) values (%s)", (job,))
+    dbc.execute("update jobstate set watermark = %s, updated = %s where job = %s",
+            (watermark, updated, job))
+    if commit:
+        dbc.commit()
+
+# Job name of the watermark of the GP data imported from Space-Track: the
+# newest CREATION_DATE of the imported element sets of the latest catalog
+# (see st_dl_latest.py --delta)
+GP_WATERMARK_JOB = "gp_creation_date"
+
+# Store the watermark of the job, if it is newer than the stored one
+def advance_watermark(dbc, job, watermark, commit=True):
+    if watermark is None:
+        return
+    current = get_watermark(dbc, job)
+    if current is None or watermark > current:
+        set_watermark(dbc, job, watermark, commit)
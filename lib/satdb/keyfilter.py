@@ -0,0 +1,141 @@
+import gzip
+import re
+import numpy as np
+
+# The primary key (norad, epoch) of an element set is packed into one int64:
+# norad << 36 | seconds since KEY_EPOCH0. 36 bits of seconds cover more than
+# 2000 years, 27 bits of NORAD IDs cover all catalog numbers
+KEY_EPOCH0 = np.datetime64('1950-01-01T00:00:00', 'us')
+KEY_SHIFT = 36
+
+# Number of keys looked up in the database per query
+KEY_CHUNK = 1000
+
+# Pack NORAD IDs and epochs (datetimes, ISO strings or datetime64) to keys.
+# MySQL stores the epochs with a precision of seconds and rounds fractional
+# seconds, so do the keys. Element sets without epoch get the key -1
+def orbelem_keys(norads, epochs):
+    norads = np.asarray(norads, dtype=np.int64)
+    epochs = np.asarray(epochs, dtype='datetime64[us]')
+    us = (epochs - KEY_EPOCH0).astype(np.int64)
+    seconds = (us + 500000) // 1000000
+    keys = (norads << KEY_SHIFT) | seconds
+    keys[np.isnat(epochs)] = -1
+    return keys
+
+# Unpack keys to lists of NORAD IDs and epochs (datetime)
+def split_keys(keys):
+    keys = np.asarray(keys, dtype=np.int64)
+    norads = keys >> KEY_SHIFT
+    seconds = keys & ((1 << KEY_SHIFT) - 1)
+    epochs = KEY_EPOCH0 + seconds.astype('timedelta64[s]')
+    return norads.tolist(), epochs.astype('datetime64[s]').tolist()
+
+#------------------------------------------------------------------------------
+# Class to check, if element sets are already stored in the table orbelem.
+# The keys are looked up in the database in chunks and the found keys are
+# kept as sorted int64 arrays, together with the keys added during the
+# import (see add()). Arrays are merged, when there are too many of them.
+class KeyFilter:
+    def __init__(self, dbc):
+        self.dbc = dbc
+        self.arrays = []
+
+        # Statistics
+        self.n_checked = 0
+        self.n_known = 0
+
+    def _contains(self, keys):
+        found = np.zeros(len(keys), dtype=bool)
+        for array in self.arrays:
+            i = np.searchsorted(array, keys)
+            i[i == len(array)] = 0
+            found |= array[i] == keys
+        return found
+
+    # Add keys, e.g. of element sets queued for insertion
+    def add(self, keys):
+        keys = np.unique(np.asarray(keys, dtype=np.int64))
+        if len(keys) == 0:
+            return
+        self.arrays.append(keys)
+        if len(self.arrays) > 16:
+            self.arrays = [np.unique(np.concatenate(self.arrays))]
+
+    # Look up keys in the database, return the found ones
+    def _lookup(self, keys):
+        found = []
+        for i in range(0, len(keys), KEY_CHUNK):
+            norads, epochs = split_keys(keys[i:i + KEY_CHUNK])
+            sql = ("select norad, epoch from orbelem where (norad, epoch) in ("
+                    + ", ".join(["(%s, %s)"] * len(norads)) + ")")
+            arguments = []
+            for norad, epoch in zip(norads, epochs):
+                arguments += [norad, epoch]
+            rows = self.dbc.fetchall(sql, tuple(arguments))
+            if len(rows) > 0:
+                found.append(orbelem_keys([r[0] for r in rows],
+                    [r[1] for r in rows]))
+        if len(found) == 0:
+            return np.array([], dtype=np.int64)
+        return np.concatenate(found)
+
+    # Boolean array, True for the keys already stored in the database or
+    # added before
+    def known_keys(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        known = self._contains(keys)
+        missing = np.unique(keys[~known & (keys >= 0)])
+        if len(missing) > 0:
+            found = self._lookup(missing)
+            if len(found) > 0:
+                self.add(found)
+                known |= np.isin(keys, found)
+        self.n_checked += len(keys)
+        self.n_known += int(known.sum())
+        return known
+
+    def known(self, norads, epochs):
+        return self.known_keys(orbelem_keys(norads, epochs))
+
+# Tags searched by scan_omm_keys()
+_EPOCH_RE = re.compile(rb"<EPOCH>\s*([^<]*?)\s*</EPOCH>")
+_NORAD_RE = re.compile(rb"<NORAD_CAT_ID>\s*(\d+)\s*</NORAD_CAT_ID>")
+_SEGMENT_END = b"</segment>"
+
+# Scan an OMM/XML file for the keys of its segments without parsing the XML.
+# Returns the keys in the order of the segments, or None, if the segments
+# cannot be matched to the epochs and NORAD IDs found
+def scan_omm_keys(filename, block_size=1 << 20):
+    if filename.endswith('.gz'):
+        fh = gzip.open(filename, 'rb')
+    else:
+        fh = open(filename, 'rb')
+
+    norads = []
+    epochs = []
+    n_segment = 0
+    rest = b""
+    with fh:
+        while True:
+            block = fh.read(block_size)
+            data = rest + block
+            # Only scan complete segments, keep the rest for the next block
+            end = data.rfind(_SEGMENT_END) if block else len(data)
+            if end < 0:
+                rest = data
+                continue
+            if block:
+                end += len(_SEGMENT_END)
+            head = data[:end]
+            rest = data[end:]
+
+            epochs += [e.decode() for e in _EPOCH_RE.findall(head)]
+            norads += [int(n) for n in _NORAD_RE.findall(head)]
+            n_segment += head.count(_SEGMENT_END)
+            if len(epochs) != len(norads) or len(epochs) != n_segment:
+                return None
+            if not block:
+                break
+
+    return orbelem_keys(norads, epochs)
@@ -0,0 +1,124 @@
+from datetime import datetime
+from functools import lru_cache
+from satdb.schema import TABLES
+
+# The tables orbelem_latest and metadata_latest hold one row per object with
+# the latest orbital elements and metadata. They have the same columns as
+# orbelem and metadata (see setup/latest.sql) and are updated by the import
+# whenever an element set or metadata with a newer epoch arrives.
+LATEST_TABLES = {
+    "orbelem": "orbelem_latest",
+    "metadata": "metadata_latest",
+    }
+
+# Check, if the latest-state tables exist in the database
+def has_latest_tables(dbc):
+    try:
+        for table in LATEST_TABLES.values():
+            dbc.fetchall("select norad from " + table + " where 1=0")
+    except Exception:
+        return False
+    return True
+
+# Columns of the latest-state table latest
+def _latest_columns(latest):
+    for name, columns, key in TABLES:
+        if name == latest:
+            return tuple(col for col, definition in columns)
+    raise ValueError("Unknown table " + latest)
+
+# Create the sql statement to upsert rows with the given columns into the
+# latest-state table of table. Existing rows are only overwritten, if the
+# epoch of the new row is newer. The columns of the table not in db_cols are
+# then set to NULL, so that no values of an older row remain (e.g. the OMM
+# columns originator and data_created after a TLE row). MySQL evaluates the
+# assignments from left to right, therefore epoch has to be updated last.
+# SQLite and DuckDB (dialect, see Dbase.dialect) use "on conflict do
+# update", where all assignments see the existing row. The statement is
+# built once per table and column set.
+@lru_cache(maxsize=None)
+def upsert_latest_sql(table, db_cols, dialect="mysql"):
+    latest = LATEST_TABLES[table]
+    columns = [col for col in db_cols if col != "norad" and col != "epoch"]
+    missing = [col for col in _latest_columns(latest)
+            if col not in db_cols and col != "norad" and col != "epoch"]
+    ps = ["%s"] * len(db_cols)
+    sql = "insert into " + latest + " ("
+    sql += ", ".join(db_cols)
+    sql += ") values ("
+    sql += ", ".join(ps)
+    if dialect == "mysql":
+        sql += ") on duplicate key update "
+        sql += ", ".join(
+            [col + " = if(values(epoch) > epoch, values(" + col + "), " + col + ")"
+                for col in columns]
+            + [col + " = if(values(epoch) > epoch, null, " + col + ")"
+                for col in missing])
+        sql += ", epoch = greatest(epoch, values(epoch))"
+        return sql
+
+    newer = "excluded.epoch > " + latest + ".epoch"
+    sql += ") on conflict (norad) do update set "
+    sql += ", ".join(
+        [col + " = case when " + newer + " then excluded." + col + " else "
+            + latest + "." + col + " end" for col in columns]
+        + [col + " = case when " + newer + " then null else "
+            + latest + "." + col + " end" for col in missing])
+    sql += (", epoch = " + ("max" if dialect == "sqlite" else "greatest")
+            + "(" + latest + ".epoch, excluded.epoch)")
+    return sql
+
+# Epoch as datetime for comparisons. Epochs of OMM files are strings
+def _epoch_value(epoch):
+    if isinstance(epoch, str):
+        return datetime.fromisoformat(epoch.replace("T", " ")[:26])
+    return epoch
+
+# Reduce rows with the columns db_cols to the row with the newest epoch per
+# object (the first one, if several have the same epoch). Upserting these
+# rows into the latest-state table gives the same result as upserting all,
+# but each object is updated once per batch
+def newest_rows(db_cols, rows):
+    if "norad" not in db_cols or "epoch" not in db_cols:
+        return rows
+    i_norad = db_cols.index("norad")
+    i_epoch = db_cols.index("epoch")
+    newest = {}
+    for row in rows:
+        norad = row[i_norad]
+        epoch = _epoch_value(row[i_epoch])
+        if norad not in newest or epoch > newest[norad][0]:
+            newest[norad] = (epoch, row)
+    return [row for epoch, row in newest.values()]
+
+# Rebuild the latest-state tables from the tables orbelem and metadata
+def rebuild_latest(dbc):
+    try:
+        for table, latest in LATEST_TABLES.items():
+            dbc.execute("delete from " + latest)
+            sql = (
+                "insert into " + latest + " select t.* from " + table
+                + " as t inner join"
+                + " (select norad, max(epoch) as epoch from " + table
+                + " group by norad) as l"
+                + " on t.norad = l.norad and t.epoch = l.epoch"
+                )
+            dbc.execute(sql)
+        dbc.commit()
+    except:
+        dbc.rollback()
+        raise
+
+# Query the latest orbital elements joined with the latest metadata per
+# object. Use the aliases o (orbelem_latest) and m (metadata_latest) in
+# columns and where, e.g.:
+#   fetch_latest(dbc, "o.norad, o.semimajor_axis, m.obj_type",
+#       "o.period < %s and o.eccentricity < %s", (128.0, 0.25))
+def fetch_latest(dbc, columns="o.*, m.*", where=None, arguments=None):
+    sql = (
+        "select " + columns + " from orbelem_latest as o"
+        + " left join metadata_latest as m on o.norad = m.norad"
+        )
+    if where is not None:
+        sql += " where " + where
+    return dbc.fetchall(sql, arguments)
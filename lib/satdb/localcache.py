@@ -0,0 +1,340 @@
+from datetime import datetime
+import json
+import os
+import numpy as np
+from satdb.dbase import column_array
+
+# Columns of the table orbelem kept in the local cache and their numpy
+# dtypes. Missing values are stored as NaN/NaT, -1 (integers) and ""
+# (strings)
+ORBELEM_CACHE_DTYPE = np.dtype([
+    ("norad", "i8"),
+    ("epoch", "M8[us]"),
+    ("mean_motion", "f8"),
+    ("eccentricity", "f8"),
+    ("inclination", "f8"),
+    ("raan", "f8"),
+    ("arg_of_pericenter", "f8"),
+    ("mean_anomaly", "f8"),
+    ("ephemeris_type", "i8"),
+    ("classification_type", "U1"),
+    ("element_set_no", "i8"),
+    ("rev_at_epoch", "f8"),
+    ("bstar", "f8"),
+    ("mean_motion_dot", "f8"),
+    ("mean_motion_ddot", "f8"),
+    ("semimajor_axis", "f8"),
+    ("period", "f8"),
+    ("apoapsis", "f8"),
+    ("periapsis", "f8"),
+    ("created", "M8[us]"),
+    ])
+
+# Columns of the table metadata kept in the local cache. Only the latest
+# metadata per object is cached
+METADATA_CACHE_DTYPE = np.dtype([
+    ("norad", "i8"),
+    ("epoch", "M8[us]"),
+    ("obj_id", "U20"),
+    ("id_short", "U20"),
+    ("name", "U100"),
+    ("classification_type", "U1"),
+    ("obj_type", "U20"),
+    ("rcs_size", "U20"),
+    ("country_code", "U4"),
+    ("launch_date", "M8[us]"),
+    ("site", "U20"),
+    ("decay_date", "M8[us]"),
+    ("created", "M8[us]"),
+    ])
+
+# Convert rows of a query result to a structured array of the given dtype
+def _to_records(rows, dtype):
+    array = np.empty(len(rows), dtype=dtype)
+    if len(rows) == 0:
+        return array
+
+    for name, values in zip(dtype.names, zip(*rows)):
+        kind = dtype[name].kind
+        values = list(values)
+        if kind == 'U':
+            values = column_array(values)
+            array[name] = np.where(values == None, "", values)
+        elif kind == 'i':
+            values = column_array(values).astype(np.float64)
+            array[name] = np.where(np.isnan(values), -1, values)
+        else:
+            array[name] = column_array(values)
+    return array
+
+# Write the array to the npy file filename. The file is replaced at once,
+# readers never see a partially written file
+def _save(filename, array):
+    tmp = filename + ".tmp"
+    with open(tmp, "wb") as fh:
+        np.save(fh, array)
+    os.replace(tmp, filename)
+
+# Indices of the last row of each group of equal keys in an array sorted by
+# the keys
+def _last_of_group(*keys):
+    last = np.ones(len(keys[0]), dtype=bool)
+    if len(last) > 1:
+        diff = np.zeros(len(last) - 1, dtype=bool)
+        for key in keys:
+            diff |= key[1:] != key[:-1]
+        last[:-1] = diff
+    return last
+
+#------------------------------------------------------------------------------
+# Local on-disk copy of the tables orbelem and metadata. The element sets are
+# stored as numpy structured arrays, one npy file per year of the epoch,
+# sorted by norad and epoch. The files are opened memory-mapped, so queries
+# only read the pages they need. sync() fetches the rows created since the
+# last sync from the database. The query methods fetchcolumns(),
+# fetcharray() and fetchframe() return the same types as the methods of
+# Dbase with the same names, but select the rows by object and epoch range
+# instead of sql, e.g.:
+#   cache = LocalCache("~/satdb-cache")
+#   cache.sync(dbc)
+#   res = cache.fetchcolumns(norads=[25544], start="2020-01-01",
+#       columns=("epoch", "semimajor_axis"))
+class LocalCache:
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.join(self.path, "orbelem"), exist_ok=True)
+
+    def _state_file(self):
+        return os.path.join(self.path, "state.json")
+
+    def _partition(self, year):
+        return os.path.join(self.path, "orbelem", str(year) + ".npy")
+
+    # File collecting the new element sets of year during sync()
+    def _spill(self, year):
+        return os.path.join(self.path, "orbelem", str(year) + ".spill")
+
+    def _metadata_file(self):
+        return os.path.join(self.path, "metadata.npy")
+
+    # State of the cache: the watermarks (latest created timestamp synced) of
+    # the tables orbelem and metadata
+    def state(self):
+        if not os.path.exists(self._state_file()):
+            return {"orbelem": None, "metadata": None, "synced": None}
+        with open(self._state_file(), "r") as fh:
+            return json.load(fh)
+
+    def _save_state(self, state):
+        tmp = self._state_file() + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump(state, fh, indent=2)
+        os.replace(tmp, self._state_file())
+
+    # Years with a partition in the cache
+    def years(self):
+        years = []
+        for f in os.listdir(os.path.join(self.path, "orbelem")):
+            if f.endswith(".npy") and f[:-4].isdigit():
+                years.append(int(f[:-4]))
+        return sorted(years)
+
+    # Open a partition memory-mapped (None, if it doesn't exist)
+    def _load(self, filename, mmap_mode='r'):
+        if not os.path.exists(filename):
+            return None
+        return np.load(filename, mmap_mode=mmap_mode)
+
+    # Merge new element sets into the partition of year. Rows with the same
+    # norad and epoch are replaced by the most recently created one
+    def _merge_orbelem(self, year, new):
+        old = self._load(self._partition(year), mmap_mode=None)
+        data = new if old is None else np.concatenate((old, new))
+        order = np.lexsort((data["created"], data["epoch"], data["norad"]))
+        data = data[order]
+        data = data[_last_of_group(data["norad"], data["epoch"])]
+        _save(self._partition(year), data)
+
+    # Merge new metadata into the cached metadata, keep the latest per object
+    def _merge_metadata(self, new):
+        old = self._load(self._metadata_file(), mmap_mode=None)
+        data = new if old is None else np.concatenate((old, new))
+        order = np.lexsort((data["created"], data["epoch"], data["norad"]))
+        data = data[order]
+        data = data[_last_of_group(data["norad"])]
+        _save(self._metadata_file(), data)
+
+    # Select the rows of table with created greater-equal the watermark. Rows
+    # with the same created timestamp as the watermark are fetched again,
+    # since more rows may have been created within the same second
+    def _sync_sql(self, table, dtype, watermark):
+        sql = "select " + ", ".join(dtype.names) + " from " + table
+        if watermark is not None:
+            return sql + " where created >= %s", (watermark,)
+        return sql, None
+
+    # Fetch the rows created since the last sync from the database and
+    # merge them into the cache. The rows are streamed from the database and
+    # buffered per year. Every flush_rows rows, the buffers are appended to
+    # spill files, so that each partition is merged only once at the end.
+    # Returns the number of fetched element sets
+    def sync(self, dbc, chunk_size=10000, flush_rows=1000000):
+        state = self.state()
+
+        # Metadata
+        sql, arguments = self._sync_sql("metadata", METADATA_CACHE_DTYPE,
+                state["metadata"])
+        rows = dbc.fetchall(sql, arguments)
+        if len(rows) > 0:
+            new = _to_records(rows, METADATA_CACHE_DTYPE)
+            self._merge_metadata(new)
+            created = new["created"][~np.isnat(new["created"])]
+            if len(created) > 0:
+                state["metadata"] = str(created.max().astype(datetime))
+
+        # Spill files of an interrupted sync. Their rows are fetched again,
+        # since the watermark was not moved
+        directory = os.path.join(self.path, "orbelem")
+        for f in os.listdir(directory):
+            if f.endswith(".spill"):
+                os.remove(os.path.join(directory, f))
+
+        # Orbital elements, buffered per year
+        sql, arguments = self._sync_sql("orbelem", ORBELEM_CACHE_DTYPE,
+                state["orbelem"])
+        watermark = None
+        n = 0
+        buffer = {}
+        n_buffer = 0
+        spilled = set()
+        for rows in dbc.iter_query(sql, arguments, size=chunk_size,
+                chunks=True):
+            new = _to_records(rows, ORBELEM_CACHE_DTYPE)
+            n += len(new)
+            created = new["created"][~np.isnat(new["created"])]
+            if len(created) > 0 and (watermark is None
+                    or created.max() > watermark):
+                watermark = created.max()
+
+            years = new["epoch"].astype('datetime64[Y]').astype(int) + 1970
+            for year in np.unique(years):
+                buffer.setdefault(int(year), []).append(new[years == year])
+            n_buffer += len(new)
+
+            if n_buffer >= flush_rows:
+                for year, arrays in buffer.items():
+                    with open(self._spill(year), "ab") as fh:
+                        for array in arrays:
+                            fh.write(array.tobytes())
+                    spilled.add(year)
+                buffer = {}
+                n_buffer = 0
+
+        for year in sorted(spilled | set(buffer)):
+            arrays = buffer.pop(year, [])
+            if year in spilled:
+                arrays.insert(0, np.fromfile(self._spill(year),
+                    dtype=ORBELEM_CACHE_DTYPE))
+            self._merge_orbelem(year, np.concatenate(arrays))
+            if year in spilled:
+                os.remove(self._spill(year))
+
+        # The watermark is only moved after all rows are merged. If the sync
+        # is interrupted, the next sync fetches the rows again
+        if watermark is not None:
+            state["orbelem"] = str(watermark.astype(datetime))
+        state["synced"] = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+        self._save_state(state)
+
+        return n
+
+    # Latest metadata of the given objects (default: all) as structured array
+    def metadata(self, norads=None):
+        data = self._load(self._metadata_file())
+        if data is None:
+            return np.empty(0, dtype=METADATA_CACHE_DTYPE)
+        if norads is None:
+            return np.array(data)
+        i = np.searchsorted(data["norad"], np.asarray(norads))
+        i = i[(i < len(data))]
+        i = i[np.isin(data["norad"][i], norads)]
+        return np.array(data[i])
+
+    # Element sets of the given objects with start <= epoch <= end as
+    # structured array sorted by norad and epoch. columns selects the
+    # columns of ORBELEM_CACHE_DTYPE (default: all)
+    def fetcharray(self, norads=None, start=None, end=None, columns=None):
+        if columns is None:
+            columns = ORBELEM_CACHE_DTYPE.names
+        columns = list(columns)
+        for col in ("norad", "epoch"):
+            if col not in columns:
+                columns.append(col)
+        if start is not None:
+            start = np.datetime64(start, 'us')
+        if end is not None:
+            end = np.datetime64(end, 'us')
+        if norads is not None:
+            norads = np.unique(np.asarray(norads, dtype=np.int64))
+
+        parts = []
+        for year in self.years():
+            if start is not None and year < start.astype('datetime64[Y]').astype(int) + 1970:
+                continue
+            if end is not None and year > end.astype('datetime64[Y]').astype(int) + 1970:
+                continue
+            data = self._load(self._partition(year))
+
+            # The partitions are sorted by norad, the rows of an object are
+            # found by binary search
+            if norads is not None:
+                lo = np.searchsorted(data["norad"], norads, side='left')
+                hi = np.searchsorted(data["norad"], norads, side='right')
+                idx = [np.arange(l, h) for l, h in zip(lo, hi) if h > l]
+                if len(idx) == 0:
+                    continue
+                data = data[np.concatenate(idx)]
+
+            mask = np.ones(len(data), dtype=bool)
+            if start is not None:
+                mask &= data["epoch"] >= start
+            if end is not None:
+                mask &= data["epoch"] <= end
+            parts.append(np.array(data[columns][mask]))
+
+        dtype = np.dtype([(col, ORBELEM_CACHE_DTYPE[col]) for col in columns])
+        if len(parts) == 0:
+            return np.empty(0, dtype=dtype)
+        result = np.concatenate(parts).astype(dtype)
+        return result[np.lexsort((result["epoch"], result["norad"]))]
+
+    # Same as fetcharray(), but returns a dictionary of numpy arrays like
+    # Dbase.fetchcolumns(). Columns of the cached metadata (e.g. obj_type)
+    # are joined by norad, if given in metadata
+    def fetchcolumns(self, norads=None, start=None, end=None, columns=None,
+            metadata=None):
+        array = self.fetcharray(norads, start, end, columns)
+        result = dict((name, array[name]) for name in array.dtype.names)
+
+        if metadata is not None:
+            md = self._load(self._metadata_file())
+            if md is None:
+                md = np.empty(0, dtype=METADATA_CACHE_DTYPE)
+            i = np.searchsorted(md["norad"], array["norad"])
+            found = i < len(md)
+            found[found] = md["norad"][i[found]] == array["norad"][found]
+            for col in metadata:
+                values = np.zeros(len(array), dtype=md.dtype[col])
+                if md.dtype[col].kind == 'M':
+                    values[:] = np.datetime64('NaT')
+                values[found] = md[col][i[found]]
+                result["md_" + col if col in result else col] = values
+        return result
+
+    # Same as fetchcolumns(), but returns a pandas DataFrame. pandas is
+    # optional and only imported here
+    def fetchframe(self, norads=None, start=None, end=None, columns=None,
+            metadata=None):
+        import pandas
+        return pandas.DataFrame(self.fetchcolumns(norads, start, end,
+            columns, metadata))
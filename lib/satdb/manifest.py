@@ -0,0 +1,34 @@
+from datetime import datetime
+import hashlib
+
+# The table imported_files holds the content hash of every imported file, so
+# a file downloaded or copied again is not imported twice
+
+# Check, if the manifest table exists in the database
+def has_manifest(dbc):
+    try:
+        dbc.fetchall("select digest from imported_files where 1=0")
+    except Exception:
+        return False
+    return True
+
+# SHA-256 hash of the file content as hex string
+def file_digest(filename, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(filename, 'rb') as fh:
+        for block in iter(lambda: fh.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+# Check, if a file with the digest was imported before
+def in_manifest(dbc, digest):
+    return dbc.fetchone("select digest from imported_files where digest = %s",
+            (digest,)) is not None
+
+# Record an imported file. n_records is the number of records in the file
+def add_to_manifest(dbc, digest, filename, n_records=None, commit=True):
+    imported = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+    dbc.execute("insert ignore into imported_files (digest, filename, n_records, imported)"
+            + " values (%s, %s, %s, %s)", (digest, filename[-255:], n_records, imported))
+    if commit:
+        dbc.commit()
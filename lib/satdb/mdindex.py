@@ -0,0 +1,88 @@
+import hashlib
+from datetime import datetime
+from satdb import OMMMetadata
+
+# Metadata columns compared to decide, if a metadata record adds new data to
+# the database. These are all columns but epoch and created
+MD_COLUMNS = OMMMetadata.COMPARE_COLUMNS
+
+# Columns holding date/time values. These are stored as datetime in the
+# database but come as (differently formatted) strings from the OMM files
+MD_DATE_COLUMNS = ("launch_date", "decay_date")
+
+# Normalize a metadata value, so that values read from the database and values
+# read from OMM/TLE files can be compared
+def _normalize(col, val):
+    if isinstance(val, datetime):
+        return val.strftime("%Y-%m-%dT%H:%M:%S")
+    if col in MD_DATE_COLUMNS:
+        try:
+            return datetime.fromisoformat(str(val)).strftime("%Y-%m-%dT%H:%M:%S")
+        except ValueError:
+            pass
+    if col == "norad":
+        return str(int(val))
+    return str(val).strip()
+
+# Compute the fingerprint of a metadata record from the columns and values
+# which are not None
+def md_fingerprint(db_cols, db_vals):
+    h = hashlib.blake2b(digest_size=8)
+    for col, val in zip(db_cols, db_vals):
+        if val is None:
+            continue
+        h.update(col.encode())
+        h.update(b"=")
+        h.update(_normalize(col, val).encode())
+        h.update(b"\x00")
+    return h.digest()
+
+#------------------------------------------------------------------------------
+# Class holding the fingerprint of the most recent metadata per object. Used
+# to check in memory whether a metadata record differs from the one stored
+# last, instead of querying the database for every object.
+class MetadataIndex:
+    def __init__(self):
+        # norad (int) -> fingerprint
+        self.index = {}
+
+    # Load the fingerprints of the latest metadata per object with a single
+    # query
+    def load(self, dbc):
+        sql = (
+            "select " + ", ".join("m." + col for col in MD_COLUMNS)
+            + " from metadata as m inner join"
+            + " (select norad, max(epoch) as epoch from metadata group by norad)"
+            + " as l on m.norad = l.norad and m.epoch = l.epoch"
+            )
+        for row in dbc.fetchall(sql):
+            self.index[int(row[0])] = md_fingerprint(MD_COLUMNS, row)
+
+    # Return True, if the given OMMMetadata object differs from the metadata
+    # seen last for this object. The fingerprint of the given object is
+    # recorded in the dictionary pending (norad -> fingerprint), if given,
+    # else in the index. Pending fingerprints are compared first and added to
+    # the index with update(), once their records are committed
+    def changed(self, md, pending=None):
+        fp = md_fingerprint(MD_COLUMNS, md.compare_values())
+        norad = int(md.norad)
+
+        if pending is not None and norad in pending:
+            last = pending[norad]
+        else:
+            last = self.index.get(norad)
+        if last == fp:
+            return False
+
+        if pending is None:
+            self.index[norad] = fp
+        else:
+            pending[norad] = fp
+        return True
+
+    # Add the pending fingerprints (see changed()) to the index
+    def update(self, pending):
+        self.index.update(pending)
+
+    def __len__(self):
+        return len(self.index)
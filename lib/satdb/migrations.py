@@ -0,0 +1,151 @@
+from datetime import datetime
+
+# Versioned changes of the database schema. The table schema_version holds
+# one row per applied migration. migrate() applies the missing migrations in
+# the order of their version to an existing database, in place. The
+# statements are written for all backends (see backend.py), dialect specific
+# steps check dbc.dialect.
+
+SCHEMA_VERSION_SQL = ("create table if not exists schema_version"
+        + " (version integer not null, description varchar(100),"
+        + " applied datetime, primary key (version))")
+
+# Secondary indexes for the common queries as (table, name, columns). InnoDB
+# appends the primary key (norad, epoch) to every secondary index, so the
+# indexes cover the queries selecting norad and epoch by these columns
+INDEXES = (
+    # Epoch windows over all objects and the rows created since a watermark
+    # (LocalCache.sync(), clean_orbelem())
+    ("orbelem", "idx_orbelem_epoch", ("epoch",)),
+    ("orbelem", "idx_orbelem_created", ("created",)),
+    ("metadata", "idx_metadata_created", ("created",)),
+
+    # Orbit band filters, e.g. GEO and LEO objects
+    ("orbelem", "idx_orbelem_band", ("semimajor_axis", "inclination", "period")),
+    ("orbelem_latest", "idx_orbelem_latest_band",
+        ("semimajor_axis", "inclination", "period")),
+
+    # Lookups by international designator, name prefix and launch date
+    ("metadata", "idx_metadata_obj_id", ("obj_id",)),
+    ("metadata", "idx_metadata_name", ("name",)),
+    ("metadata", "idx_metadata_launch_date", ("launch_date",)),
+    ("metadata_latest", "idx_metadata_latest_obj_id", ("obj_id",)),
+    ("metadata_latest", "idx_metadata_latest_launch_date", ("launch_date",)),
+    )
+
+# First year of the partitions of orbelem (the first TLEs are from 1957)
+PARTITION_FIRST_YEAR = 1957
+
+# Check, if the table has the index
+def has_index(dbc, table, name):
+    if dbc.dialect == "mysql":
+        sql = ("select count(*) from information_schema.statistics"
+                + " where table_schema = database() and table_name = %s"
+                + " and index_name = %s")
+        args = (table, name)
+    elif dbc.dialect == "sqlite":
+        sql = ("select count(*) from sqlite_master where type = 'index'"
+                + " and tbl_name = %s and name = %s")
+        args = (table, name)
+    else:
+        sql = ("select count(*) from duckdb_indexes()"
+                + " where table_name = %s and index_name = %s")
+        args = (table, name)
+    return dbc.fetchone(sql, args)[0] > 0
+
+# Check, if the table exists
+def has_table(dbc, table):
+    try:
+        dbc.fetchall("select * from " + table + " where 1=0")
+    except Exception:
+        dbc.rollback()
+        return False
+    return True
+
+# Migration 1: secondary indexes. Indexes of missing tables are skipped;
+# setup/latest.sql creates the tables orbelem_latest and metadata_latest
+# with their indexes, so they need not be added later. DuckDB scans ranges with the min/max statistics of its row groups and
+# cannot update indexed columns in upserts, so no indexes are created there
+def _add_indexes(dbc):
+    if dbc.dialect == "duckdb":
+        return
+    for table, name, columns in INDEXES:
+        if not has_table(dbc, table) or has_index(dbc, table, name):
+            continue
+        dbc.execute("create index " + name + " on " + table
+                + " (" + ", ".join(columns) + ")")
+        dbc.commit()
+
+# Check, if the table orbelem is partitioned (MySQL only)
+def is_partitioned(dbc, table="orbelem"):
+    if dbc.dialect != "mysql":
+        return False
+    sql = ("select count(*) from information_schema.partitions"
+            + " where table_schema = database() and table_name = %s"
+            + " and partition_name is not null")
+    return dbc.fetchone(sql, (table,))[0] > 0
+
+# Create the clause to partition a table by RANGE of the epoch year, one
+# partition per year up to last_year and one for all later years
+def partition_clause(first_year=PARTITION_FIRST_YEAR, last_year=None):
+    if last_year is None:
+        last_year = datetime.utcnow().year + 1
+    parts = ["partition p" + str(year) + " values less than (" + str(year + 1)
+            + ")" for year in range(first_year, last_year + 1)]
+    parts.append("partition pmax values less than maxvalue")
+    return "partition by range (year(epoch)) (" + ", ".join(parts) + ")"
+
+# Migration 2 (optional): RANGE partitioning of orbelem by the epoch year.
+# Queries of epoch windows only read the partitions of these years. MySQL
+# only, the table is copied, which takes a while for large tables
+def _partition_orbelem(dbc):
+    if dbc.dialect != "mysql" or is_partitioned(dbc):
+        return
+    dbc.execute("alter table orbelem " + partition_clause())
+    dbc.commit()
+
+# Version of the optional partitioning of orbelem
+PARTITION_MIGRATION = 2
+
+# Migrations as (version, description, function, optional). Optional
+# migrations are only applied on request (see migrate())
+MIGRATIONS = (
+    (1, "secondary indexes", _add_indexes, False),
+    (PARTITION_MIGRATION, "partition orbelem by epoch year", _partition_orbelem, True),
+    )
+
+# Versions of the applied migrations
+def applied_versions(dbc):
+    dbc.execute(SCHEMA_VERSION_SQL)
+    dbc.commit()
+    return set(row[0] for row in dbc.fetchall("select version from schema_version"))
+
+# Current schema version: the highest applied version, 0 for a new database
+def schema_version(dbc):
+    return max(applied_versions(dbc), default=0)
+
+# Migrations not applied yet. Optional migrations are only included, if
+# their version is in optional
+def pending_migrations(dbc, target=None, optional=()):
+    applied = applied_versions(dbc)
+    return [m for m in MIGRATIONS
+            if m[0] not in applied
+            and (target is None or m[0] <= target)
+            and (not m[3] or m[0] in optional)]
+
+# Apply the pending migrations up to the version target (default: all) in
+# the order of their versions. The callback progress(version, description)
+# is called before each migration. Returns the list of applied versions
+def migrate(dbc, target=None, optional=(), progress=None):
+    done = []
+    for version, description, function, is_optional in pending_migrations(
+            dbc, target, optional):
+        if progress is not None:
+            progress(version, description)
+        function(dbc)
+        applied = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+        dbc.execute("insert into schema_version (version, description, applied)"
+                + " values (%s, %s, %s)", (version, description, applied))
+        dbc.commit()
+        done.append(version)
+    return done
@@ -0,0 +1,142 @@
+import os
+import gzip
+import time
+import xml.etree.ElementTree as et
+
+# Fields read from the header of each omm element and made available through
+# OMMParser.header and OMMReader.header. Space-Track repeats the header for
+# every record, so the fields belong to the segments of the same omm element.
+# OMMOrbelem.from_omm() looks these up with root.find(".//<FIELD>"), so the
+# header is passed instead of the document root
+HEADER_FIELDS = ("COMMENT", "CREATION_DATE", "ORIGINATOR")
+
+# Return the tag of an element without namespace
+def _tag(elem):
+    return elem.tag.rsplit('}', 1)[-1]
+
+# Size of the blocks read from OMM files
+READ_SIZE = 1 << 16
+
+#------------------------------------------------------------------------------
+# Class to parse an OMM/XML document fed in pieces, e.g. as downloaded. The
+# segments (space objects) are returned as soon as they are complete and
+# discarded after processing, so the memory usage does not depend on the
+# document size.
+class OMMParser:
+    def __init__(self):
+        self._parser = et.XMLPullParser(events=("start", "end"))
+
+        # Element holding the HEADER_FIELDS of the current omm element. A new
+        # element is created for every omm element, so a header taken for a
+        # segment is not changed by the following records
+        self.header = et.Element("header")
+
+        # Number of segments read so far
+        self.n_segment = 0
+
+        # Stack of currently open elements. Used to detach processed
+        # elements from their parent
+        self._stack = []
+        self._found = set()
+
+    # Generator yielding the segment elements completed by the parsed data
+    def _segments(self):
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                self._stack.append(elem)
+                if _tag(elem) == "omm":
+                    self.header = et.Element("header")
+                    self._found = set()
+                continue
+
+            self._stack.pop()
+            tag = _tag(elem)
+
+            if tag in HEADER_FIELDS and tag not in self._found:
+                field = et.SubElement(self.header, tag)
+                field.text = elem.text
+                self._found.add(tag)
+            elif tag == "segment":
+                self.n_segment += 1
+                yield elem
+
+                # Free the memory of the processed segment
+                elem.clear()
+                if self._stack:
+                    self._stack[-1].remove(elem)
+            elif tag == "omm" and self._stack:
+                # All segments of this omm element are processed
+                self._stack[-1].remove(elem)
+
+    # Parse the next piece of the document (bytes or str). Returns a
+    # generator yielding the completed segments, which has to be exhausted
+    # before feeding the next piece
+    def feed(self, data):
+        self._parser.feed(data)
+        return self._segments()
+
+    # Finish the document. Returns a generator yielding the remaining
+    # segments
+    def close(self):
+        self._parser.close()
+        return self._segments()
+
+#------------------------------------------------------------------------------
+# Class to read the segments (space objects) of an OMM/XML file one after
+# another. The file is parsed incrementally with OMMParser. With a
+# StageTimer (see stats.py), the time to read and decompress the file and to
+# parse it is recorded in the stages read and parse.
+class OMMReader:
+    def __init__(self, filename, timer=None):
+        self.filename = filename
+        self.timer = timer
+        self.size = os.path.getsize(filename)
+        self._parser = OMMParser()
+
+        # Open the file for reading. Unzip first, if gzipped. The raw file
+        # handle is kept to determine the progress
+        self._raw = open(filename, 'rb')
+        if filename.endswith('.gz'):
+            self._fh = gzip.GzipFile(fileobj=self._raw)
+        else:
+            self._fh = self._raw
+
+    # Element holding the HEADER_FIELDS of the omm element of the segment
+    # yielded last (see OMMParser.header)
+    @property
+    def header(self):
+        return self._parser.header
+
+    # Number of segments read so far
+    @property
+    def n_segment(self):
+        return self._parser.n_segment
+
+    # Fraction of the (compressed) file read so far
+    def progress(self):
+        if self.size == 0:
+            return 1.
+        return min(self._raw.tell() / self.size, 1.)
+
+    # Generator yielding one segment element after another
+    def segments(self):
+        timer = self.timer
+        while True:
+            t_start = time.perf_counter()
+            data = self._fh.read(READ_SIZE)
+            if timer is not None:
+                t_read = time.perf_counter()
+                timer.add("read", t_read - t_start)
+            if not data:
+                break
+            segments = self._parser.feed(data)
+            if timer is not None:
+                timer.add("parse", time.perf_counter() - t_read)
+            for segment in segments:
+                yield segment
+        for segment in self._parser.close():
+            yield segment
+
+    def close(self):
+        self._fh.close()
+        self._raw.close()
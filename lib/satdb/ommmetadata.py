@@ -1,47 +1,51 @@
 from datetime import datetime, timedelta
+from operator import attrgetter
 import re
 from tletools import TLE
 from satdb import tools
+from satdb.record import DbRecord
 
 #NULL="NULL"
 
-# Class for object metadata
-class OMMMetadata:
-    def __init__(self):
-        self.norad = None
+#------------------------------------------------------------------------------
+# Class for object metadata. The attributes are the columns of the table
+# metadata (see DbRecord)
+class OMMMetadata(DbRecord):
+    COLUMNS = (
+        "norad",
 
         # We "borrow the epoch from the mean orbital elements also for the
         # metadata
-        self.epoch = None
+        "epoch",
 
         # OMM standard metadata (celestrak & spacetrack)
-        self.obj_id = None
-        self.id_short = None # derived from obj_id)
-        self.name = None
-        self.center_name = None
-        self.ref_frame = None
-        self.mean_element_theory = None
-        self.classification_type = None # from tle parameters
+        "obj_id",
+        "id_short", # derived from obj_id
+        "name",
+        "center_name",
+        "ref_frame",
+        "mean_element_theory",
+        "classification_type", # from tle parameters
 
         # OMM user defined metadata parameters (spacetrack only)
-        self.obj_type = None
-        self.rcs_size = None
-        self.country_code = None
-        self.launch_date = None
-        self.site = None
-        self.decay_date = None
-
-        # Creation date/time of entry in database
-        self.created = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
-
-    def set(self, **kwargs):
-        # Loop over the kwargs dictionary
-        for key, value in kwargs.items():
-            # If object/instance has attribute, change it to the given value
-            if hasattr(self, key):
-                setattr(self, key, value)
-        # Always update/overwrite the attribute created
-        self.created = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+        "obj_type",
+        "rcs_size",
+        "country_code",
+        "launch_date",
+        "site",
+        "decay_date",
+
+        # Creation date/time of entry in database. Set by the BatchWriter
+        # once per batch, if None
+        "created",
+        )
+    __slots__ = COLUMNS
+
+    # Columns compared to decide, if a metadata record adds new data to the
+    # database (see db_row_red())
+    COMPARE_COLUMNS = tuple(col for col in COLUMNS
+            if col != "epoch" and col != "created")
+    _compare_values = attrgetter(*COMPARE_COLUMNS)
 
     def from_omm(self, segment):
         self.norad = segment.find(".//tleParameters/NORAD_CAT_ID").text
@@ -91,8 +95,6 @@ class OMMMetadata:
             #self.decay_date = "0000-00-00T00:00:00"
             pass
 
-        self.created = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
-
     def from_tle(self, tle_lines=None):
 
         if tle_lines is not None:
@@ -116,56 +118,45 @@ class OMMMetadata:
 
                 self.classification_type = tle.classification
 
-                self.created = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
-
-    def to_db(self, dbc):
-        # Initialize lists for the db columns to write to and for the
-        # corresponding values
-        db_cols = []
-        db_vals = []
+    # Values of the COMPARE_COLUMNS as tuple
+    def compare_values(self):
+        return self._compare_values(self)
 
-        # All colums but epoch or created
+    # Same as db_row(), but without the columns epoch and created
+    def db_row_red(self):
         db_cols_red = []
         db_vals_red = []
 
-        # Loop over all attributes and put the attributes which are not None
-        # to the above lists
-        for attr in self.__dict__:
-            val = getattr(self, attr)
+        for col, val in zip(self.COMPARE_COLUMNS, self.compare_values()):
             if val is not None:
-                db_cols.append(attr)
-                db_vals.append(val)
-            if attr != "epoch" and attr != "created" and val is not None:
-                db_cols_red.append(attr)
+                db_cols_red.append(col)
                 db_vals_red.append(val)
 
+        return db_cols_red, db_vals_red
+
+    # Check, if the metadata is already in the database
+    def in_db(self, dbc):
         # We will insert the metadata ONLY to the database, if this will add
         # new data. Therefore, we first perform a select-count query on the
         # database for all columns but epoch and created with the values
         # given. If the count returns something greater zero, the data is
         # already in the database and we do not need to insert.
+        db_cols_red, db_vals_red = self.db_row_red()
 
         # Create the sql statement for the select-count query
         #ps = ["%s"] * len(db_cols_red)
         sql_sel = "select count(*) from metadata where "
         wheres = []
         for i in range(0, len(db_cols_red)):
-            wheres.append(db_cols_red[i] + " = \"" + db_vals_red[i] + "\"")
+            wheres.append(db_cols_red[i] + " = \"" + str(db_vals_red[i]) + "\"")
         wheres = " and ".join(wheres)
         sql_sel += wheres
 
-        # Execute the sql insert statement
+        # Execute the sql select statement
         n = dbc.fetchone(sql_sel)[0]
 
-        if n == 0:
-            # Create the sql statement to insert the data to the db
-            ps = ["%s"] * len(db_cols)
-            sql_ins = "insert ignore into metadata ("
-            sql_ins += ", ".join(db_cols)
-            sql_ins += ") values ("
-            sql_ins += ", ".join(ps)
-            sql_ins += ")"
-
-            # Execute the sql insert statement
-            res = dbc.write(sql_ins, tuple(db_vals))
+        return n > 0
 
+    def to_db(self, dbc):
+        if not self.in_db(dbc):
+            self._insert(dbc, "metadata")
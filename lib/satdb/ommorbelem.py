@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 from tletools import TLE
 from satdb import tools
+from satdb.record import DbRecord
 
 #NULL="NULL"
 
@@ -11,49 +12,62 @@ MRAD = 6378.137             # Earth's radius [km]
 PI = 3.14159265358979
 TPI86 = 2.0 * PI / 86400.0
 
-# Class for orbital elements
-class OMMOrbelem:
-    def __init__(self):
-        self.norad = None
+#------------------------------------------------------------------------------
+# Class for orbital elements. The attributes are the columns of the table
+# orbelem (see DbRecord)
+class OMMOrbelem(DbRecord):
+    COLUMNS = (
+        "norad",
 
         # Orbital mean elements (celestrak + space-track)
-        self.epoch = None
-        self.mean_motion = None
-        self.eccentricity = None
-        self.inclination = None
-        self.raan = None
-        self.arg_of_pericenter = None
-        self.mean_anomaly = None
+        "epoch",
+        "mean_motion",
+        "eccentricity",
+        "inclination",
+        "raan",
+        "arg_of_pericenter",
+        "mean_anomaly",
 
         # TLE parameters (celestrak + space-track)
-        self.ephemeris_type = None
-        classification_type = None
+        "ephemeris_type",
+        "classification_type",
         # norad --> see above
-        self.element_set_no = None
-        self.rev_at_epoch = None
-        self.bstar = None
-        self.mean_motion_dot = None
-        self.mean_motion_ddot = None
+        "element_set_no",
+        "rev_at_epoch",
+        "bstar",
+        "mean_motion_dot",
+        "mean_motion_ddot",
 
         # TLE/3LE (can be computed from the TLE parameters above)
-        self.tle_line0 = None
-        self.tle_line1 = None
-        self.tle_line2 = None
+        "tle_line0",
+        "tle_line1",
+        "tle_line2",
 
         # User defined parameters (space-track only)
         # Can be computed from orbital mean elements
-        self.semimajor_axis = None
-        self.period = None
-        self.apoapsis = None
-        self.periapsis = None
+        "semimajor_axis",
+        "period",
+        "apoapsis",
+        "periapsis",
 
         # Some additional info (space-track only)
-        self.originator = None
-        self.data_created = None
-        self.originator_comment = None
-
-        # Creation date/time of entry in database
-        self.created = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+        "originator",
+        "data_created",
+        "originator_comment",
+
+        # Creation date/time of entry in database. Set by the BatchWriter
+        # once per batch, if None
+        "created",
+        )
+    __slots__ = COLUMNS
+
+    # Compute the user defined parameters semimajor axis, period, apoapsis
+    # and periapsis from the mean motion and the eccentricity
+    def derive(self):
+        self.semimajor_axis = GM13 / ((TPI86 * float(self.mean_motion)) ** (2.0 / 3.0)) / 1000.0
+        self.period = 2.0 * PI * (((float(self.semimajor_axis) * 1000.0) ** 3.0) / GM) ** (0.5) / 60.0
+        self.apoapsis = float(self.semimajor_axis) * (1.0 + float(self.eccentricity)) - MRAD
+        self.periapsis = float(self.semimajor_axis) * (1.0 - float(self.eccentricity)) - MRAD
 
     def from_omm(self, segment, root):
         self.norad = segment.find(".//tleParameters/NORAD_CAT_ID").text or None
@@ -112,8 +126,6 @@ class OMMOrbelem:
         self.data_created = root.find(".//CREATION_DATE").text or None
         self.originator = root.find(".//ORIGINATOR").text or None
 
-        self.created = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
-
     def from_tle(self, tle_lines=None):
 
         if tle_lines is not None:
@@ -164,34 +176,7 @@ class OMMOrbelem:
 
         # User defined parameters (space-track only)
         # Can be computed from orbital mean elements
-        self.semimajor_axis = GM13 / ((TPI86 * float(self.mean_motion)) ** (2.0 / 3.0)) / 1000.0
-        self.period = 2.0 * PI * (((float(self.semimajor_axis) * 1000.0) ** 3.0) / GM) ** (0.5) / 60.0
-        self.apoapsis = float(self.semimajor_axis) * (1.0 + float(self.eccentricity)) - MRAD
-        self.periapsis = float(self.semimajor_axis) * (1.0 - float(self.eccentricity)) - MRAD
-
-        self.created = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+        self.derive()
 
     def to_db(self, dbc):
-        # Initialize lists for the db columns to write to and for the
-        # corresponding values
-        db_cols=[]
-        db_vals=[]
-
-        # Loop over all attributes and put the attributes which are not None
-        # to the above lists
-        for attr in self.__dict__:
-            val = getattr(self, attr)
-            if val is not None:
-                db_cols.append(attr)
-                db_vals.append(val)
-
-        # Create the sql statement to insert the data to the db
-        ps = ["%s"] * len(db_cols)
-        sql = "insert ignore into orbelem ("
-        sql += ", ".join(db_cols)
-        sql += ") values ("
-        sql += ", ".join(ps)
-        sql += ")"
-
-        # Execute the sql statement
-        res = dbc.write(sql, tuple(db_vals))
+        self._insert(dbc, "orbelem")
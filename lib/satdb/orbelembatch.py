@@ -0,0 +1,188 @@
+import numpy as np
+from satdb import OMMOrbelem
+from satdb.ommorbelem import GM, GM13, MRAD, PI, TPI86
+
+# Columns of the database table orbelem in the order of the OMMOrbelem
+# attributes
+OD_COLUMNS = OMMOrbelem.COLUMNS
+
+# Columns stored as float arrays. NaN marks missing values
+OD_FLOAT_COLUMNS = (
+    "mean_motion", "eccentricity", "inclination", "raan",
+    "arg_of_pericenter", "mean_anomaly", "rev_at_epoch", "bstar",
+    "mean_motion_dot", "mean_motion_ddot", "semimajor_axis", "period",
+    "apoapsis", "periapsis",
+    )
+
+# Columns stored as integer arrays. -1 marks missing values
+OD_INT_COLUMNS = ("norad", "ephemeris_type", "element_set_no")
+
+# Mapping of the OMM tags (and USER_DEFINED parameters) in a segment to the
+# orbelem columns
+OMM_TAGS = {
+    "NORAD_CAT_ID": "norad",
+    "EPOCH": "epoch",
+    "MEAN_MOTION": "mean_motion",
+    "ECCENTRICITY": "eccentricity",
+    "INCLINATION": "inclination",
+    "RA_OF_ASC_NODE": "raan",
+    "ARG_OF_PERICENTER": "arg_of_pericenter",
+    "MEAN_ANOMALY": "mean_anomaly",
+    "EPHEMERIS_TYPE": "ephemeris_type",
+    "CLASSIFICATION_TYPE": "classification_type",
+    "ELEMENT_SET_NO": "element_set_no",
+    "REV_AT_EPOCH": "rev_at_epoch",
+    "BSTAR": "bstar",
+    "MEAN_MOTION_DOT": "mean_motion_dot",
+    "MEAN_MOTION_DDOT": "mean_motion_ddot",
+    "SEMIMAJOR_AXIS": "semimajor_axis",
+    "PERIOD": "period",
+    "APOAPSIS": "apoapsis",
+    "PERIAPSIS": "periapsis",
+    }
+
+# Header fields, see OMMReader.header
+OMM_HEADER_TAGS = {
+    "COMMENT": "originator_comment",
+    "CREATION_DATE": "data_created",
+    "ORIGINATOR": "originator",
+    }
+
+#------------------------------------------------------------------------------
+# Class holding N orbital element sets as numpy columns. Used in the import
+# instead of one OMMOrbelem object per element set. The parameters
+# semimajor_axis, period, apoapsis and periapsis are computed for the whole
+# batch at once, if not given.
+class OrbelemBatch:
+    def __init__(self):
+        self.n = 0
+
+        # Column name -> list of values (while appending) or numpy array
+        self.columns = dict((col, []) for col in OD_COLUMNS)
+        self._arrays = False
+
+    # Append the orbital elements of an OMM segment. As for
+    # OMMOrbelem.from_omm(), the header is the document root or the header
+    # of the omm element of the segment (OMMReader.header)
+    def append_omm(self, segment, header):
+        values = {}
+        for elem in segment.iter():
+            tag = elem.tag.rsplit('}', 1)[-1]
+            if tag == "USER_DEFINED":
+                tag = elem.get("parameter")
+            if tag in OMM_TAGS:
+                values[OMM_TAGS[tag]] = elem.text or None
+        for tag, col in OMM_HEADER_TAGS.items():
+            elem = header.find(".//" + tag)
+            values[col] = elem.text if elem is not None else None
+
+        for col in OD_COLUMNS:
+            self.columns[col].append(values.get(col))
+        self.n += 1
+
+    # Take the orbital elements of a TLEBlock
+    def from_tleblock(self, block):
+        self.n = block.n
+        self.columns = dict((col, [None] * block.n) for col in OD_COLUMNS)
+        for col in OD_COLUMNS:
+            if hasattr(block, col) and col != "name":
+                self.columns[col] = getattr(block, col)
+        self.columns["epoch"] = block.epoch.astype('datetime64[us]').tolist()
+        self.columns["classification_type"] = block.classification_type.tolist()
+        self._arrays = False
+        self.to_arrays()
+        self.derive()
+
+    # Convert the appended values to numpy arrays
+    def to_arrays(self):
+        if self._arrays:
+            return
+
+        for col in OD_FLOAT_COLUMNS:
+            values = self.columns[col]
+            if not isinstance(values, np.ndarray):
+                values = [np.nan if v is None else v for v in values]
+            self.columns[col] = np.asarray(values, dtype=np.float64)
+        for col in OD_INT_COLUMNS:
+            values = self.columns[col]
+            if not isinstance(values, np.ndarray):
+                values = [-1 if v is None else v for v in values]
+            self.columns[col] = np.asarray(values, dtype=np.int64)
+        self._arrays = True
+
+    # Keep only the element sets where mask is True
+    def take(self, mask):
+        mask = np.asarray(mask, dtype=bool)
+        for col, values in self.columns.items():
+            if isinstance(values, np.ndarray):
+                self.columns[col] = values[mask]
+            else:
+                self.columns[col] = [v for v, m in zip(values, mask) if m]
+        self.n = int(mask.sum())
+
+    # Compute the missing parameters semimajor_axis, period, apoapsis and
+    # periapsis for the whole batch
+    def derive(self):
+        self.to_arrays()
+        c = self.columns
+
+        sma = GM13 / ((TPI86 * c["mean_motion"]) ** (2.0 / 3.0)) / 1000.0
+        miss = np.isnan(c["semimajor_axis"])
+        c["semimajor_axis"][miss] = sma[miss]
+
+        period = 2.0 * PI * (((c["semimajor_axis"] * 1000.0) ** 3.0) / GM) ** (0.5) / 60.0
+        miss = np.isnan(c["period"])
+        c["period"][miss] = period[miss]
+
+        apoapsis = c["semimajor_axis"] * (1.0 + c["eccentricity"]) - MRAD
+        miss = np.isnan(c["apoapsis"])
+        c["apoapsis"][miss] = apoapsis[miss]
+
+        periapsis = c["semimajor_axis"] * (1.0 - c["eccentricity"]) - MRAD
+        miss = np.isnan(c["periapsis"])
+        c["periapsis"][miss] = periapsis[miss]
+
+    # Generator yielding (db_cols, db_vals) per element set for the insert
+    # into the database. As for OMMOrbelem.db_row(), missing values are not
+    # part of the columns, so the column defaults of the database apply.
+    # Without created, the column is left to the BatchWriter, which sets one
+    # timestamp per batch
+    def rows(self, created=None):
+        self.derive()
+
+        cols = []
+        lists = []
+        for col in OD_COLUMNS:
+            values = self.columns[col]
+            if col == "created":
+                values = [created] * self.n if created is not None else []
+            elif col in OD_FLOAT_COLUMNS:
+                values = np.where(np.isnan(values), None, values).tolist()
+            elif col in OD_INT_COLUMNS:
+                values = np.where(values < 0, None, values).tolist()
+            else:
+                values = list(values)
+
+            # Skip columns without any value
+            if len(values) == 0 or all(v is None for v in values):
+                continue
+            cols.append(col)
+            lists.append(values)
+
+        # Rows with missing values share one column tuple per pattern of
+        # missing values
+        cols = tuple(cols)
+        column_sets = {}
+        for vals in zip(*lists):
+            if None in vals:
+                mask = tuple(v is not None for v in vals)
+                row_cols = column_sets.get(mask)
+                if row_cols is None:
+                    row_cols = tuple(c for c, m in zip(cols, mask) if m)
+                    column_sets[mask] = row_cols
+                yield row_cols, tuple(v for v in vals if v is not None)
+            else:
+                yield cols, vals
+
+    def __len__(self):
+        return self.n
@@ -0,0 +1,233 @@
+from collections import deque
+import multiprocessing
+import numpy as np
+from sgp4.api import Satrec, SatrecArray, WGS72
+from satdb.dbase import column_array
+from satdb.tle import TLE_ORBELEM_COLUMNS, fetch_elements
+
+# Propagation of the element sets of many objects over a time grid with the
+# array interface of sgp4 (SatrecArray). The element sets are dictionaries of
+# numpy columns named like the orbelem columns (see Dbase.fetchcolumns() and
+# LocalCache.fetchcolumns()), one element set per object. The work is split
+# into chunks of objects, which are propagated in parallel processes, so the
+# memory per chunk is bounded by the chunk size and the length of the grid.
+# sgp4 is an optional dependency (pip install -e ./lib[sgp4]).
+
+# Columns of an element set needed by SGP4
+SGP4_COLUMNS = (
+    "norad", "epoch", "bstar", "mean_motion_dot", "mean_motion_ddot",
+    "eccentricity", "arg_of_pericenter", "inclination", "mean_anomaly",
+    "mean_motion", "raan",
+    )
+
+# Epoch of the SGP4 epoch days
+SGP4_EPOCH0 = np.datetime64('1949-12-31T00:00:00', 'us')
+
+# Julian date of 1970-01-01T00:00:00
+JD_UNIX_EPOCH = 2440587.5
+
+# Earth rotation rate [rad/s]
+EARTH_ROTATION = 7.292115146706979e-5
+
+# Default number of objects per chunk
+CHUNK_SIZE = 1000
+
+# Element sets from the database for the given objects (default: all) at
+# epoch (default: latest element sets). See tle.fetch_elements() for the
+# modes. Returns a dictionary of numpy columns
+def elements_from_db(dbc, epoch=None, norads=None, mode="nearest"):
+    rows = fetch_elements(dbc, epoch, norads, mode)
+    if len(rows) == 0:
+        return dict((col, column_array([])) for col in TLE_ORBELEM_COLUMNS)
+    return dict((col, column_array(values))
+            for col, values in zip(TLE_ORBELEM_COLUMNS, zip(*rows)))
+
+# Element sets from a LocalCache for the given objects (default: all). As for
+# fetch_elements(), mode selects the element set per object "nearest" to or
+# the latest "before" epoch, or the "latest" one. Only the element sets
+# within window_days before (and after) epoch are considered. For "latest",
+# the window ends at the newest epoch in the cache. Returns a dictionary of
+# numpy columns
+def elements_from_cache(cache, epoch=None, norads=None, mode="nearest",
+        window_days=30):
+    if mode not in ("nearest", "before", "latest"):
+        raise ValueError("Unknown mode: " + str(mode))
+    window = np.timedelta64(int(window_days * 86400), 's')
+    if epoch is None:
+        mode = "latest"
+        years = cache.years()
+        if len(years) == 0:
+            return cache.fetchcolumns(norads, columns=SGP4_COLUMNS)
+        last = cache.fetcharray(norads, start=str(years[-1]) + "-01-01",
+                columns=("epoch",))
+        end = last["epoch"].max() if len(last) > 0 else np.datetime64(str(years[-1]) + "-01-01")
+        start = end - window
+        end = None
+    else:
+        epoch = np.datetime64(epoch, 'us')
+        start = epoch - window
+        end = epoch if mode == "before" else epoch + window
+
+    # The result is sorted by norad and epoch
+    el = cache.fetchcolumns(norads, start, end, columns=SGP4_COLUMNS)
+    norad = el["norad"]
+    if len(norad) == 0:
+        return el
+    if mode == "nearest":
+        dt = np.abs(el["epoch"] - epoch)
+        order = np.lexsort((dt, norad))
+        first = np.ones(len(norad), dtype=bool)
+        first[1:] = norad[order][1:] != norad[order][:-1]
+        idx = order[first]
+    else:
+        last = np.ones(len(norad), dtype=bool)
+        last[:-1] = norad[1:] != norad[:-1]
+        idx = np.flatnonzero(last)
+    return dict((col, values[idx]) for col, values in el.items())
+
+# Create the sgp4 Satrec objects of the element sets. Mean motions are in
+# rev/day and angles in degrees like in the database
+def satrecs(elements):
+    e = elements
+    epoch = (np.asarray(e["epoch"], dtype='datetime64[us]') - SGP4_EPOCH0) / np.timedelta64(86400, 's')
+    xpdotp = 1440. / (2. * np.pi)
+    deg = np.pi / 180.
+    columns = (
+        np.asarray(e["norad"], dtype=np.int64).tolist(),
+        epoch.tolist(),
+        np.nan_to_num(np.asarray(e["bstar"], dtype=np.float64)).tolist(),
+        (np.nan_to_num(np.asarray(e["mean_motion_dot"], dtype=np.float64)) / (xpdotp * 1440.)).tolist(),
+        (np.nan_to_num(np.asarray(e["mean_motion_ddot"], dtype=np.float64)) / (xpdotp * 1440. * 1440.)).tolist(),
+        np.asarray(e["eccentricity"], dtype=np.float64).tolist(),
+        (np.asarray(e["arg_of_pericenter"], dtype=np.float64) * deg).tolist(),
+        (np.asarray(e["inclination"], dtype=np.float64) * deg).tolist(),
+        (np.asarray(e["mean_anomaly"], dtype=np.float64) * deg).tolist(),
+        (np.asarray(e["mean_motion"], dtype=np.float64) / xpdotp).tolist(),
+        (np.asarray(e["raan"], dtype=np.float64) * deg).tolist(),
+        )
+
+    sats = []
+    for (norad, epoch, bstar, ndot, nddot, ecc, argp, incl, mo, no,
+            node) in zip(*columns):
+        sat = Satrec()
+        sat.sgp4init(WGS72, 'i', norad, epoch, bstar, ndot, nddot, ecc, argp,
+                incl, mo, no, node)
+        sats.append(sat)
+    return sats
+
+# Time grid from start to end (datetimes, ISO strings or datetime64,
+# including end) with step seconds between the times. Returns a datetime64
+# array
+def time_grid(start, end, step=60.):
+    start = np.datetime64(start, 'us')
+    end = np.datetime64(end, 'us')
+    step = np.timedelta64(int(round(step * 1e6)), 'us')
+    return np.arange(start, end + step // 2, step)
+
+# Julian dates of datetime64 times, split into whole and fractional days
+# for the precision of sgp4. Returns the arrays jd and fr
+def julian_dates(times):
+    us = (np.asarray(times, dtype='datetime64[us]')
+            - np.datetime64('1970-01-01T00:00:00', 'us')).astype(np.int64)
+    days = us // 86400000000
+    fr = (us - days * 86400000000) / 86400e6
+    return JD_UNIX_EPOCH + days.astype(np.float64), fr
+
+# Greenwich mean sidereal time (IAU-82, as used by SGP4) in radians for the
+# Julian dates jd + fr
+def gmst(jd, fr):
+    t = (np.asarray(jd) - 2451545.0 + np.asarray(fr)) / 36525.0
+    seconds = (((-6.2e-6 * t + 0.093104) * t + (876600.0 * 3600.0 + 8640184.812866)) * t
+            + 67310.54841)
+    return (seconds * np.pi / 180. / 240.) % (2. * np.pi)
+
+# Rotate TEME positions r [km] and velocities v [km/s] of shape
+# (objects, times, 3) to the Earth-fixed frame at the Julian dates jd + fr.
+# Polar motion is neglected (pseudo Earth-fixed frame), which changes the
+# positions by less than about 20 m. Returns the arrays r and v
+def teme_to_ecef(r, v, jd, fr):
+    theta = gmst(jd, fr)
+    c = np.cos(theta)
+    s = np.sin(theta)
+    x = c * r[..., 0] + s * r[..., 1]
+    y = -s * r[..., 0] + c * r[..., 1]
+    r_ecef = np.stack((x, y, r[..., 2]), axis=-1)
+    vx = c * v[..., 0] + s * v[..., 1] + EARTH_ROTATION * y
+    vy = -s * v[..., 0] + c * v[..., 1] - EARTH_ROTATION * x
+    v_ecef = np.stack((vx, vy, v[..., 2]), axis=-1)
+    return r_ecef, v_ecef
+
+# Propagate a chunk of element sets. Runs in the worker processes
+def _propagate_chunk(task):
+    elements, jd, fr, frame, dtype = task
+    error, r, v = SatrecArray(satrecs(elements)).sgp4(jd, fr)
+    if frame == "ecef":
+        r, v = teme_to_ecef(r, v, jd, fr)
+    elif frame != "teme":
+        raise ValueError("Unknown frame: " + str(frame))
+    return error, r.astype(dtype, copy=False), v.astype(dtype, copy=False)
+
+# Generator propagating the element sets to the times (datetime64 array,
+# see time_grid()) in chunks of chunk_size objects with workers processes
+# (default: number of CPUs). Yields (norads, error, r, v) per chunk in the
+# order of the element sets: the NORAD IDs of the chunk, the SGP4 error codes
+# of shape (objects, times) and the positions [km] and velocities [km/s] of
+# shape (objects, times, 3) in the frame "teme" or "ecef". Positions with an
+# error are NaN. At most two chunks per worker are in progress, so the
+# memory does not depend on the number of objects
+def iter_propagate(elements, times, chunk_size=CHUNK_SIZE, workers=None,
+        frame="teme", dtype=np.float64):
+    jd, fr = julian_dates(times)
+    n = len(elements["norad"])
+    columns = dict((col, np.asarray(elements[col])) for col in SGP4_COLUMNS)
+
+    def tasks():
+        for i in range(0, n, chunk_size):
+            chunk = dict((col, values[i:i + chunk_size])
+                    for col, values in columns.items())
+            yield chunk["norad"], (chunk, jd, fr, frame, dtype)
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers <= 1 or n <= chunk_size:
+        for norads, task in tasks():
+            yield (norads,) + _propagate_chunk(task)
+        return
+
+    with multiprocessing.Pool(workers) as pool:
+        pending = deque()
+        for norads, task in tasks():
+            pending.append((norads, pool.apply_async(_propagate_chunk, (task,))))
+            if len(pending) >= 2 * workers:
+                norads, result = pending.popleft()
+                yield (norads,) + result.get()
+        while pending:
+            norads, result = pending.popleft()
+            yield (norads,) + result.get()
+
+# Propagate the element sets to the times and collect the results of all
+# chunks (see iter_propagate()). Returns a dictionary with the NORAD IDs
+# (norad), the times, the error codes (error) and the positions (position)
+# and velocities (velocity) of shape (objects, times, 3). With
+# dtype=np.float32, the arrays of the whole catalog over a day with one
+# minute steps need about 1 GB
+def propagate(elements, times, chunk_size=CHUNK_SIZE, workers=None,
+        frame="teme", dtype=np.float64):
+    times = np.asarray(times, dtype='datetime64[us]')
+    n = len(elements["norad"])
+    result = {
+        "norad": np.asarray(elements["norad"], dtype=np.int64),
+        "times": times,
+        "error": np.zeros((n, len(times)), dtype=np.uint8),
+        "position": np.empty((n, len(times), 3), dtype=dtype),
+        "velocity": np.empty((n, len(times), 3), dtype=dtype),
+        }
+    i = 0
+    for norads, error, r, v in iter_propagate(elements, times, chunk_size,
+            workers, frame, dtype):
+        k = len(norads)
+        result["error"][i:i + k] = error
+        result["position"][i:i + k] = r
+        result["velocity"][i:i + k] = v
+        i += k
+    return result
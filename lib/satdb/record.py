@@ -0,0 +1,74 @@
+from datetime import datetime
+from functools import lru_cache
+from operator import attrgetter
+
+# Timestamp for the column created, e.g. once per batch written
+def created_now():
+    return datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+
+# Create the sql statement to insert rows with the given columns into table.
+# The statement is built once per table and column set
+@lru_cache(maxsize=None)
+def insert_sql(table, db_cols):
+    ps = ["%s"] * len(db_cols)
+    sql = "insert ignore into " + table + " ("
+    sql += ", ".join(db_cols)
+    sql += ") values ("
+    sql += ", ".join(ps)
+    sql += ")"
+    return sql
+
+#------------------------------------------------------------------------------
+# Base class of the records written to a database table. A subclass lists the
+# columns of the table in COLUMNS and sets __slots__ = COLUMNS, so the values
+# are kept in slots in the order of the columns instead of a __dict__ per
+# object. The column tuples of the rows with missing values are cached per
+# pattern of missing values, so all rows with the same columns share one
+# tuple (and one cached insert statement, see insert_sql()).
+class DbRecord:
+    __slots__ = ()
+    COLUMNS = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._values = attrgetter(*cls.COLUMNS)
+        cls._columns = frozenset(cls.COLUMNS)
+        cls._column_sets = {}
+
+    def __init__(self):
+        for col in self.COLUMNS:
+            setattr(self, col, None)
+
+    def set(self, **kwargs):
+        # Loop over the kwargs dictionary
+        for key, value in kwargs.items():
+            # If the record has a column, change it to the given value
+            if key in self._columns:
+                setattr(self, key, value)
+
+    # Values of all columns as tuple in the order of COLUMNS
+    def values(self):
+        return self._values(self)
+
+    # Return the columns and the corresponding values of all attributes
+    # which are not None. The column defaults of the database apply to the
+    # missing ones
+    def db_row(self):
+        vals = self._values(self)
+        if None not in vals:
+            return self.COLUMNS, vals
+
+        mask = tuple(v is not None for v in vals)
+        cols = self._column_sets.get(mask)
+        if cols is None:
+            cols = tuple(c for c, m in zip(self.COLUMNS, mask) if m)
+            self._column_sets[mask] = cols
+        return cols, tuple(v for v in vals if v is not None)
+
+    # Insert the record into table. Prefer ingest.BatchWriter to insert many
+    # records
+    def _insert(self, dbc, table):
+        if self.created is None:
+            self.created = created_now()
+        db_cols, db_vals = self.db_row()
+        dbc.write(insert_sql(table, db_cols), db_vals)
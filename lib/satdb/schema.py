@@ -0,0 +1,103 @@
+# Schema of the satdb tables for the embedded database backends (SQLite,
+# DuckDB). Same tables and columns as setup/*.sql for MySQL, with types both
+# engines understand: datetime columns are stored as "YYYY-MM-DD HH:MM:SS"
+# (see backend.py), unsigned integers as integer.
+
+_METADATA_COLUMNS = (
+    ("norad", "integer not null"),
+    ("epoch", "datetime not null"),
+    ("obj_id", "varchar(20)"),
+    ("id_short", "varchar(20)"),
+    ("name", "varchar(100)"),
+    ("center_name", "varchar(10)"),
+    ("ref_frame", "varchar(20)"),
+    ("mean_element_theory", "varchar(20)"),
+    ("classification_type", "char(1)"),
+    ("obj_type", "varchar(20)"),
+    ("rcs_size", "varchar(20)"),
+    ("country_code", "varchar(4)"),
+    ("launch_date", "datetime"),
+    ("site", "varchar(20)"),
+    ("decay_date", "datetime"),
+    ("created", "datetime"),
+    )
+
+_ORBELEM_COLUMNS = (
+    ("norad", "integer not null"),
+    ("epoch", "datetime not null"),
+    ("mean_motion", "double default 0"),
+    ("eccentricity", "double default 0"),
+    ("inclination", "double default 0"),
+    ("raan", "double default 0"),
+    ("arg_of_pericenter", "double default 0"),
+    ("mean_anomaly", "double default 0"),
+    ("ephemeris_type", "integer default 0"),
+    ("classification_type", "char(1)"),
+    ("element_set_no", "integer default 0"),
+    ("rev_at_epoch", "float default 0"),
+    ("bstar", "double default 0"),
+    ("mean_motion_dot", "double default 0"),
+    ("mean_motion_ddot", "double default 0"),
+    ("tle_line0", "char(30)"),
+    ("tle_line1", "char(71)"),
+    ("tle_line2", "char(71)"),
+    ("semimajor_axis", "double default 0"),
+    ("period", "double"),
+    ("apoapsis", "double default 0"),
+    ("periapsis", "double default 0"),
+    ("originator", "varchar(20)"),
+    ("data_created", "datetime"),
+    ("originator_comment", "varchar(50)"),
+    ("created", "datetime"),
+    )
+
+# Tables as (name, columns, primary key)
+TABLES = (
+    ("metadata", _METADATA_COLUMNS, ("norad", "epoch")),
+    ("orbelem", _ORBELEM_COLUMNS, ("norad", "epoch")),
+    ("metadata_latest", _METADATA_COLUMNS, ("norad",)),
+    ("orbelem_latest", _ORBELEM_COLUMNS, ("norad",)),
+    ("orbelem_clean", (
+        ("norad", "integer not null"),
+        ("epoch", "datetime not null"),
+        ("semimajor_axis", "double"),
+        ("mean_motion", "double"),
+        ("eccentricity", "double"),
+        ("inclination", "double"),
+        ("flags", "integer default 0"),
+        ("created", "datetime"),
+        ), ("norad", "epoch")),
+    ("jobstate", (
+        ("job", "varchar(50) not null"),
+        ("watermark", "datetime"),
+        ("updated", "datetime"),
+        ), ("job",)),
+    ("imported_files", (
+        ("digest", "char(64) not null"),
+        ("filename", "varchar(255)"),
+        ("n_records", "integer"),
+        ("imported", "datetime"),
+        ), ("digest",)),
+    ("conjunction", (
+        ("norad1", "integer not null"),
+        ("norad2", "integer not null"),
+        ("tca", "datetime not null"),
+        ("miss_distance", "double"),
+        ("rel_velocity", "double"),
+        ("epoch1", "datetime"),
+        ("epoch2", "datetime"),
+        ("created", "datetime"),
+        ), ("norad1", "norad2", "tca")),
+    )
+
+# Create the sql statement to create a table, if it does not exist
+def create_table_sql(table, columns, primary_key):
+    return ("create table if not exists " + table + " ("
+            + ", ".join(col + " " + definition for col, definition in columns)
+            + ", primary key (" + ", ".join(primary_key) + "))")
+
+# Create all tables missing in the database
+def create_schema(dbc):
+    for table, columns, primary_key in TABLES:
+        dbc.execute(create_table_sql(table, columns, primary_key))
+    dbc.commit()
@@ -0,0 +1,454 @@
+from datetime import datetime
+import multiprocessing
+import numpy as np
+from sgp4.api import SatrecArray
+from satdb.latest import has_latest_tables
+from satdb.ommorbelem import GM13, MRAD, TPI86
+from satdb.propagate import SGP4_COLUMNS, elements_from_db, julian_dates, satrecs
+from satdb.tle import NORAD_CHUNK
+
+# Screening of the catalog for close approaches (conjunctions). The element
+# sets pass an apogee/perigee prefilter, the remaining objects are propagated
+# over a time grid with SGP4 (see propagate.py). At each time step, the pairs
+# of objects near each other are found with a uniform grid of cells instead
+# of comparing all pairs. The time of closest approach (TCA) of the candidate
+# pairs is refined with SGP4 and the conjunctions closer than the threshold
+# are written to the table conjunction (see setup/screening.sql). The time
+# grid is split into blocks, which are screened in parallel processes.
+
+# Columns of the table conjunction. norad1 is the smaller NORAD ID of the
+# pair, miss_distance [km] and rel_velocity [km/s] are taken at the TCA and
+# epoch1/epoch2 are the epochs of the element sets used
+CONJUNCTION_COLUMNS = (
+    "norad1", "norad2", "tca", "miss_distance", "rel_velocity", "epoch1",
+    "epoch2", "created",
+    )
+
+# Default distance [km] below which an approach is reported
+SCREEN_THRESHOLD = 5.
+
+# Default seconds between the time steps of the coarse search
+SCREEN_STEP = 30.
+
+# Default number of time steps screened per task
+BLOCK_STEPS = 60
+
+# Difference [km] allowed between the radius of an object and its perigee or
+# apogee computed from the mean elements (short-periodic perturbations)
+SHELL_MARGIN = 30.
+
+# Upper bound of the gravitational acceleration of an orbiting object
+# [km/s^2]. Bounds the deviation from linear relative motion within a step
+MAX_ACCELERATION = 0.0099
+
+# Maximum number of iterations and the tolerance [s] of the TCA refinement
+REFINE_ITERATIONS = 20
+REFINE_TOLERANCE = 1e-3
+
+# Offset of the cell indices in the cell keys (21 bits per coordinate)
+_CELL_OFFSET = 1 << 20
+
+# Offsets of the neighbour cells in one half space plus the cell itself, so
+# that each pair of neighbour cells is visited once, as differences of the
+# cell keys (see _cell_keys())
+_HALF_NEIGHBOURS = [(dx << 42) + (dy << 21) + dz for dx in (-1, 0, 1)
+        for dy in (-1, 0, 1) for dz in (-1, 0, 1) if (dx, dy, dz) >= (0, 0, 0)]
+
+# Perigee and apogee altitudes [km] of the element sets. The stored columns
+# periapsis and apoapsis are used, if present. Missing values (NaN, or both 0
+# from the column defaults) are computed from the mean motion and the
+# eccentricity as in OrbelemBatch.derive()
+def orbit_shells(elements):
+    ecc = np.asarray(elements["eccentricity"], dtype=np.float64)
+    sma = GM13 / ((TPI86 * np.asarray(elements["mean_motion"], dtype=np.float64))
+            ** (2.0 / 3.0)) / 1000.0
+    perigee = sma * (1.0 - ecc) - MRAD
+    apogee = sma * (1.0 + ecc) - MRAD
+    if "periapsis" in elements and "apoapsis" in elements:
+        stored_perigee = np.asarray(elements["periapsis"], dtype=np.float64)
+        stored_apogee = np.asarray(elements["apoapsis"], dtype=np.float64)
+        ok = (np.isfinite(stored_perigee) & np.isfinite(stored_apogee)
+                & ((stored_perigee != 0.) | (stored_apogee != 0.)))
+        perigee = np.where(ok, stored_perigee, perigee)
+        apogee = np.where(ok, stored_apogee, apogee)
+    return perigee, apogee
+
+# Apogee/perigee prefilter. Two objects can only come closer than distance,
+# if their altitude ranges (perigee to apogee) overlap within distance.
+# Returns the mask of the objects overlapping at least one other object, or
+# with primaries (boolean mask), the primaries and the objects overlapping
+# at least one primary. Objects without valid shells are kept
+def shell_prefilter(perigee, apogee, distance, primaries=None):
+    lo = np.asarray(perigee, dtype=np.float64) - distance / 2.
+    hi = np.asarray(apogee, dtype=np.float64) + distance / 2.
+    valid = np.isfinite(lo) & np.isfinite(hi)
+    lo = np.where(valid, lo, -np.inf)
+    hi = np.where(valid, hi, np.inf)
+
+    # Number of intervals of the reference objects overlapping each interval:
+    # those starting before its end minus those ending before its start
+    ref = np.ones(len(lo), dtype=bool) if primaries is None else np.asarray(primaries)
+    ref_lo = np.sort(lo[ref])
+    ref_hi = np.sort(hi[ref])
+    count = (np.searchsorted(ref_lo, hi, side="right")
+            - np.searchsorted(ref_hi, lo, side="left"))
+    if primaries is None:
+        # Each interval overlaps itself
+        return count >= 2
+    return ref | (count >= 1)
+
+# Keys of integer cell indices of shape (n, 3). The key of a neighbour cell
+# is the key of the cell plus a constant (see _HALF_NEIGHBOURS)
+def _cell_keys(cells):
+    c = np.clip(cells, 1 - _CELL_OFFSET, _CELL_OFFSET - 2) + _CELL_OFFSET
+    return (c[:, 0] << 42) | (c[:, 1] << 21) | c[:, 2]
+
+# Pairs of positions r of shape (n, 3) closer than radius. The positions are
+# sorted into cubic cells of the size radius, so only the pairs in the same
+# or adjacent cells are compared. Returns the index arrays i < j of the pairs
+def grid_pairs(r, radius):
+    keys = _cell_keys(np.floor(r / radius).astype(np.int64))
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+
+    # The neighbour keys are sorted as well, which makes the binary searches
+    # fast
+    idx_i = []
+    idx_j = []
+    for offset in _HALF_NEIGHBOURS:
+        neighbour_keys = sorted_keys + offset
+        first = np.searchsorted(sorted_keys, neighbour_keys, side="left")
+        counts = np.searchsorted(sorted_keys, neighbour_keys, side="right") - first
+        total = counts.sum()
+        if total == 0:
+            continue
+        i = np.repeat(order, counts)
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[np.repeat(first, counts) + within]
+        if offset == 0:
+            keep = i < j
+            i = i[keep]
+            j = j[keep]
+        idx_i.append(i)
+        idx_j.append(j)
+    if len(idx_i) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    i = np.concatenate(idx_i)
+    j = np.concatenate(idx_j)
+    d = r[i] - r[j]
+    close = np.einsum("ij,ij->i", d, d) <= radius * radius
+    i, j = np.minimum(i[close], j[close]), np.maximum(i[close], j[close])
+    return i, j
+
+# Indices of the events (pairs a, b at the times t) with the smallest miss
+# distance per approach: the events of a pair separated by at most gap
+# seconds belong to the same approach
+def _closest_per_approach(a, b, t, miss, gap):
+    order = np.lexsort((t, b, a))
+    a, b, t = a[order], b[order], t[order]
+    new = np.ones(len(a), dtype=bool)
+    new[1:] = (a[1:] != a[:-1]) | (b[1:] != b[:-1]) | (t[1:] - t[:-1] > gap)
+    group = np.cumsum(new)
+    best = np.lexsort((miss[order], group))
+    first = np.ones(len(best), dtype=bool)
+    first[1:] = group[best][1:] != group[best][:-1]
+    return order[best[first]]
+
+# State of the screening in the worker processes, see _init_screen()
+_state = {}
+
+# Set up the state of a worker process: the Satrec objects of the element
+# sets are created once per process
+def _init_screen(elements, start, duration, step, threshold, lo, hi,
+        primaries):
+    sats = satrecs(elements)
+    _state.clear()
+    _state.update(sats=sats, array=SatrecArray(sats), start=start,
+            duration=duration, step=step, threshold=threshold, lo=lo, hi=hi,
+            primaries=primaries)
+    _state["jd"], _state["fr"] = julian_dates(np.array([start]))
+
+# Relative position and velocity of the objects b to a at t seconds after
+# the start. Returns dr, dv or None, if SGP4 fails for one of them
+def _relative_state(a, b, t):
+    jd = _state["jd"][0]
+    fr = _state["fr"][0] + t / 86400.
+    sats = _state["sats"]
+    error_a, r_a, v_a = sats[a].sgp4(jd, fr)
+    error_b, r_b, v_b = sats[b].sgp4(jd, fr)
+    if error_a != 0 or error_b != 0:
+        return None
+    return np.subtract(r_b, r_a), np.subtract(v_b, v_a)
+
+# Refine the TCA of the pair a, b starting at t seconds after the start.
+# Newton iteration for the zero of dr.dv, with the relative acceleration
+# neglected, stays within window seconds of the start value. Returns the
+# TCA, the miss distance and the relative velocity, or None
+def _refine(a, b, t, window):
+    t0 = t
+    for it in range(REFINE_ITERATIONS):
+        state = _relative_state(a, b, t)
+        if state is None:
+            return None
+        dr, dv = state
+        vv = np.dot(dv, dv)
+        if vv == 0.:
+            break
+        t_next = min(max(t - np.dot(dr, dv) / vv, t0 - window), t0 + window)
+        converged = abs(t_next - t) < REFINE_TOLERANCE
+        t = t_next
+        if converged:
+            break
+    state = _relative_state(a, b, t)
+    if state is None:
+        return None
+    dr, dv = state
+    return t, np.sqrt(np.dot(dr, dr)), np.sqrt(np.dot(dv, dv))
+
+# Screen the time steps first to first + n_steps - 1. Runs in the worker
+# processes. Returns the arrays of the conjunctions (a, b, t, miss
+# distance, relative velocity) with the object indices a < b and t in
+# seconds after the start, and the number of candidate pairs refined
+def _screen_block(task):
+    first, n_steps = task
+    step = _state["step"]
+    threshold = _state["threshold"]
+    lo, hi = _state["lo"], _state["hi"]
+    primaries = _state["primaries"]
+
+    offsets = (first + np.arange(n_steps)) * step
+    jd = np.full(n_steps, _state["jd"][0])
+    fr = _state["fr"][0] + offsets / 86400.
+    error, r, v = _state["array"].sgp4(jd, fr)
+
+    # Candidate pairs per time step: pairs within the distance the objects
+    # can move towards each other in half a step (with a margin of 10 % for
+    # the change of the speeds within the step), whose linear relative
+    # motion passes closer than the threshold plus the deviation from the
+    # linear motion
+    tolerance = 2. * MAX_ACCELERATION * step * step / 4.
+    cand_a, cand_b, cand_t, cand_miss = [], [], [], []
+    for k in range(n_steps):
+        valid = np.flatnonzero(np.isfinite(r[:, k, 0]))
+        if len(valid) < 2:
+            continue
+        rk = r[valid, k]
+        vk = v[valid, k]
+        vmax = np.sqrt(np.einsum("ij,ij->i", vk, vk).max())
+        i, j = grid_pairs(rk, threshold + 1.1 * vmax * step)
+        a, b = valid[i], valid[j]
+        keep = (lo[a] <= hi[b]) & (lo[b] <= hi[a])
+        if primaries is not None:
+            keep &= primaries[a] | primaries[b]
+        i, j, a, b = i[keep], j[keep], a[keep], b[keep]
+        if len(a) == 0:
+            continue
+
+        dr = rk[j] - rk[i]
+        dv = vk[j] - vk[i]
+        vv = np.einsum("ij,ij->i", dv, dv)
+        tau = -np.einsum("ij,ij->i", dr, dv) / np.where(vv > 0., vv, 1.)
+        tau = np.clip(tau, -step / 2., step / 2.)
+        miss = np.linalg.norm(dr + dv * tau[:, None], axis=1)
+        close = miss <= threshold + tolerance
+        cand_a.append(a[close])
+        cand_b.append(b[close])
+        cand_t.append(offsets[k] + tau[close])
+        cand_miss.append(miss[close])
+    r = v = error = None
+
+    events = ([], [], [], [], [])
+    if len(cand_a) == 0:
+        return tuple(np.array(col) for col in events), 0
+    a = np.concatenate(cand_a)
+    b = np.concatenate(cand_b)
+    t = np.concatenate(cand_t)
+    miss = np.concatenate(cand_miss)
+
+    # A pair close at consecutive steps is refined once, starting from the
+    # step with the smallest linear miss distance
+    best = _closest_per_approach(a, b, t, miss, 1.5 * step)
+
+    # Approaches with the TCA outside of the screened time span are left to
+    # the screening of the adjacent time span
+    duration = _state["duration"]
+    for k in best:
+        res = _refine(a[k], b[k], t[k], step)
+        if res is not None and res[1] <= threshold and 0. <= res[0] <= duration:
+            events[0].append(a[k])
+            events[1].append(b[k])
+            for col, value in zip(events[2:], res):
+                col.append(value)
+    return tuple(np.array(col) for col in events), len(best)
+
+# Screen the element sets (dictionary of columns as from elements_from_db()
+# or screening_elements(), with periapsis and apoapsis if available) for
+# approaches closer than threshold [km] between start and end (datetimes,
+# ISO strings or datetime64). step is the coarse time step in seconds. With
+# primaries (NORAD IDs), only the pairs with at least one primary object
+# are screened. The blocks of block_steps time steps are screened by
+# workers processes (default: number of CPUs); progress(blocks_done,
+# blocks) is called after each block. Returns a dictionary of the columns
+# of the conjunctions sorted by TCA (see CONJUNCTION_COLUMNS, without
+# created) and a dictionary of counters
+def screen(elements, start, end, threshold=SCREEN_THRESHOLD, step=SCREEN_STEP,
+        primaries=None, workers=None, block_steps=BLOCK_STEPS, progress=None):
+    start = np.datetime64(start, 'us')
+    end = np.datetime64(end, 'us')
+    duration = (end - start) / np.timedelta64(1, 'us') / 1e6
+    n_steps = int(np.ceil(duration / step)) + 1
+
+    columns = dict((col, np.asarray(elements[col])) for col in SGP4_COLUMNS)
+    norad = columns["norad"].astype(np.int64)
+    is_primary = None if primaries is None else np.isin(norad, np.asarray(primaries, dtype=np.int64))
+
+    # Apogee/perigee prefilter
+    perigee, apogee = orbit_shells(elements)
+    distance = threshold + 2. * SHELL_MARGIN
+    keep = shell_prefilter(perigee, apogee, distance, is_primary)
+    columns = dict((col, values[keep]) for col, values in columns.items())
+    norad = norad[keep]
+    lo = perigee[keep] - distance / 2.
+    hi = apogee[keep] + distance / 2.
+    valid = np.isfinite(lo) & np.isfinite(hi)
+    lo = np.where(valid, lo, -np.inf)
+    hi = np.where(valid, hi, np.inf)
+    if is_primary is not None:
+        is_primary = is_primary[keep]
+    counters = {"objects": len(keep), "objects_screened": int(keep.sum()),
+            "steps": n_steps, "candidates": 0}
+
+    tasks = [(first, min(block_steps, n_steps - first))
+            for first in range(0, n_steps, block_steps)]
+    init_args = (columns, start, duration, step, threshold, lo, hi, is_primary)
+    results = []
+    def collect(result):
+        results.append(result[0])
+        counters["candidates"] += result[1]
+        if progress is not None:
+            progress(len(results), len(tasks))
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if len(norad) < 2:
+        tasks = []
+    elif workers <= 1 or len(tasks) == 1:
+        _init_screen(*init_args)
+        for task in tasks:
+            collect(_screen_block(task))
+        _state.clear()
+    else:
+        with multiprocessing.Pool(workers, _init_screen, init_args) as pool:
+            for result in pool.imap_unordered(_screen_block, tasks):
+                collect(result)
+
+    if len(results) > 0:
+        a, b, t, miss, speed = (np.concatenate(col) for col in zip(*results))
+    else:
+        a = b = np.zeros(0, dtype=np.int64)
+        t = miss = speed = np.zeros(0)
+    a = a.astype(np.int64)
+    b = b.astype(np.int64)
+
+    # The same approach can be found from both sides of a block boundary:
+    # keep the closest of the events of a pair within a step
+    best = _closest_per_approach(a, b, t, miss, step)
+    best = best[np.argsort(t[best], kind="stable")]
+    a, b, t, miss, speed = a[best], b[best], t[best], miss[best], speed[best]
+
+    # NORAD IDs in ascending order per pair
+    swap = norad[a] > norad[b]
+    a, b = np.where(swap, b, a), np.where(swap, a, b)
+    epoch = np.asarray(columns["epoch"], dtype='datetime64[us]')
+    events = {
+        "norad1": norad[a],
+        "norad2": norad[b],
+        "tca": start + np.round(t * 1e6).astype(np.int64).astype('timedelta64[us]'),
+        "miss_distance": miss,
+        "rel_velocity": speed,
+        "epoch1": epoch[a],
+        "epoch2": epoch[b],
+        }
+    counters["conjunctions"] = len(a)
+    return events, counters
+
+# Element sets for the screening from the database: the latest element sets
+# of the objects not decayed from the latest-state tables, or with epoch (or
+# without latest-state tables) the element sets selected per object with
+# mode (see tle.fetch_elements()). norads selects objects (default: all).
+# Returns a dictionary of numpy columns
+def screening_elements(dbc, epoch=None, norads=None, mode="nearest"):
+    if epoch is not None or not has_latest_tables(dbc):
+        return elements_from_db(dbc, epoch, norads, mode)
+
+    sql = ("select " + ", ".join("o." + col for col in SGP4_COLUMNS)
+            + ", o.periapsis, o.apoapsis from orbelem_latest as o"
+            + " left join metadata_latest as m on o.norad = m.norad"
+            + " where m.decay_date is null")
+    if norads is None:
+        return dbc.fetchcolumns(sql + " order by o.norad")
+    parts = []
+    for i in range(0, len(norads), NORAD_CHUNK):
+        chunk = tuple(norads[i:i + NORAD_CHUNK])
+        parts.append(dbc.fetchcolumns(sql + " and o.norad in ("
+            + ", ".join(["%s"] * len(chunk)) + ") order by o.norad", chunk))
+    if len(parts) == 0:
+        return dbc.fetchcolumns(sql + " and 1=0")
+    return dict((col, np.concatenate([p[col] for p in parts]))
+            for col in parts[0])
+
+# Write the conjunctions (see screen()) to the table conjunction. The
+# conjunctions stored before between start and end are replaced, with
+# primaries only those of pairs with a primary object. Returns the number
+# of rows written
+def write_conjunctions(dbc, events, start, end, primaries=None):
+    start = np.datetime64(start, 's').tolist()
+    end = np.datetime64(end, 's').tolist()
+    created = datetime.utcnow().replace(microsecond=0)
+
+    sql = "delete from conjunction where tca >= %s and tca <= %s"
+    if primaries is None:
+        dbc.execute(sql, (start, end))
+    else:
+        primaries = [int(norad) for norad in primaries]
+        for i in range(0, len(primaries), NORAD_CHUNK):
+            chunk = tuple(primaries[i:i + NORAD_CHUNK])
+            marks = ", ".join(["%s"] * len(chunk))
+            dbc.execute(sql + " and (norad1 in (" + marks + ") or norad2 in ("
+                    + marks + "))", (start, end) + chunk + chunk)
+
+    rows = list(zip(
+        events["norad1"].tolist(),
+        events["norad2"].tolist(),
+        events["tca"].astype('datetime64[us]').tolist(),
+        events["miss_distance"].tolist(),
+        events["rel_velocity"].tolist(),
+        events["epoch1"].astype('datetime64[us]').tolist(),
+        events["epoch2"].astype('datetime64[us]').tolist(),
+        [created] * len(events["norad1"]),
+        ))
+    if len(rows) > 0:
+        dbc.writemany("insert ignore into conjunction ("
+                + ", ".join(CONJUNCTION_COLUMNS) + ") values ("
+                + ", ".join(["%s"] * len(CONJUNCTION_COLUMNS)) + ")", rows,
+                commit=False)
+    dbc.commit()
+    return len(rows)
+
+# Query the conjunctions between start and end (default: all) closer than
+# max_distance [km] (default: all), sorted by TCA. Returns a dictionary of
+# numpy columns
+def fetch_conjunctions(dbc, start=None, end=None, max_distance=None):
+    sql = "select " + ", ".join(CONJUNCTION_COLUMNS) + " from conjunction where 1=1"
+    args = ()
+    if start is not None:
+        sql += " and tca >= %s"
+        args += (start,)
+    if end is not None:
+        sql += " and tca <= %s"
+        args += (end,)
+    if max_distance is not None:
+        sql += " and miss_distance <= %s"
+        args += (max_distance,)
+    return dbc.fetchcolumns(sql + " order by tca, norad1, norad2", args)
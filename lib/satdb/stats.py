@@ -0,0 +1,182 @@
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import os
+import threading
+import time
+from satdb.tools import ttprint
+
+# Stages of an import, in the order they are reported:
+#   read:     read and decompress the input file
+#   parse:    parse the XML or decode the TLE lines
+#   build:    create the metadata objects and orbital element batches
+#   keyfilter: look up the element sets already stored (see KeyFilter)
+#   dedup:    compare the metadata with the metadata stored last
+#   insert:   insert the rows into orbelem and metadata
+#   latest:   update the latest-state tables
+#   commit:   commit the transactions
+#   wait:     wait for the parser processes (see ingest.import_files())
+STAGES = ("read", "parse", "build", "keyfilter", "dedup", "insert", "latest",
+        "commit", "wait")
+
+#------------------------------------------------------------------------------
+# Class to record the cumulative time and the number of items per stage of a
+# run. Time a block with
+#   with timer.stage("parse", n):
+#       ...
+# or add measured times with add(). The stages may be timed from several
+# threads.
+class StageTimer:
+    def __init__(self):
+        # Stage -> [seconds, items]
+        self.stages = {}
+        self.t_start = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def add(self, name, seconds, items=0):
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = [0., 0]
+            stage[0] += seconds
+            stage[1] += items
+
+    @contextmanager
+    def stage(self, name, items=0):
+        t_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t_start, items)
+
+    # Seconds since the timer was created
+    def elapsed(self):
+        return time.perf_counter() - self.t_start
+
+    # Stages in the order of STAGES, followed by the others
+    def names(self):
+        return ([name for name in STAGES if name in self.stages]
+                + sorted(name for name in self.stages if name not in STAGES))
+
+    # One line per stage with the time, its share of the run and the rate
+    def report(self):
+        total = self.elapsed()
+        lines = []
+        for name in self.names():
+            seconds, items = self.stages[name]
+            line = (name.ljust(10) + ("%.3f" % seconds).rjust(10) + " sec"
+                    + ("%.1f" % (100. * seconds / total if total > 0 else 0.)).rjust(7)
+                    + " %")
+            if items > 0 and seconds > 0:
+                line += ("%.1f" % (items / seconds)).rjust(12) + " items/sec"
+            lines.append(line)
+        return lines
+
+    # Summary of the run as dictionary. counters are additional numbers of
+    # the run, e.g. the numbers of rows queued and inserted
+    def summary(self, script, counters=None):
+        total = self.elapsed()
+        counters = dict(counters or {})
+        rows = counters.get("rows_queued", 0)
+        return {
+            "script": script,
+            "finished": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S"),
+            "duration_seconds": round(total, 3),
+            "rows_per_second": round(rows / total, 1) if total > 0 else 0.,
+            "counters": counters,
+            "stages": dict((name, {"seconds": round(self.stages[name][0], 4),
+                "items": self.stages[name][1]}) for name in self.names()),
+            }
+
+# Write a file atomically: readers (e.g. the textfile collector of the
+# Prometheus node exporter) never see a partially written file
+def _write_atomic(filename, text):
+    tmp = filename + ".tmp"
+    with open(tmp, "w") as fh:
+        fh.write(text)
+    os.replace(tmp, filename)
+
+# Write the summary of a run (see StageTimer.summary()) as JSON
+def write_json_summary(filename, summary):
+    _write_atomic(filename, json.dumps(summary, indent=2) + "\n")
+
+# Write the summary of a run in the Prometheus text format, e.g. for the
+# textfile collector of the node exporter
+def write_prometheus_summary(filename, summary):
+    script = summary["script"]
+    lines = [
+        "# HELP satdb_import_duration_seconds Duration of the last import run",
+        "# TYPE satdb_import_duration_seconds gauge",
+        'satdb_import_duration_seconds{script="%s"} %s' % (script, summary["duration_seconds"]),
+        "# HELP satdb_import_rows_per_second Rows queued per second in the last import run",
+        "# TYPE satdb_import_rows_per_second gauge",
+        'satdb_import_rows_per_second{script="%s"} %s' % (script, summary["rows_per_second"]),
+        "# HELP satdb_import_last_run_timestamp_seconds End of the last import run",
+        "# TYPE satdb_import_last_run_timestamp_seconds gauge",
+        'satdb_import_last_run_timestamp_seconds{script="%s"} %d' % (script, time.time()),
+        "# HELP satdb_import_count Counters of the last import run (rows, batches, files)",
+        "# TYPE satdb_import_count gauge",
+        ]
+    for name, value in summary["counters"].items():
+        lines.append('satdb_import_count{script="%s",kind="%s"} %s' % (script, name, value))
+    lines += [
+        "# HELP satdb_import_stage_seconds Time per stage of the last import run",
+        "# TYPE satdb_import_stage_seconds gauge",
+        ]
+    for name, stage in summary["stages"].items():
+        lines.append('satdb_import_stage_seconds{script="%s",stage="%s"} %s'
+                % (script, name, stage["seconds"]))
+    lines += [
+        "# HELP satdb_import_stage_items Items processed per stage of the last import run",
+        "# TYPE satdb_import_stage_items gauge",
+        ]
+    for name, stage in summary["stages"].items():
+        lines.append('satdb_import_stage_items{script="%s",stage="%s"} %s'
+                % (script, name, stage["items"]))
+    _write_atomic(filename, "\n".join(lines) + "\n")
+
+#------------------------------------------------------------------------------
+# Class for progress output limited to one line every interval seconds.
+# update() is cheap enough to be called for every record.
+class Progress:
+    def __init__(self, interval=10., total=None, unit="records"):
+        self.interval = interval
+        self.total = total
+        self.unit = unit
+        self.t_start = time.perf_counter()
+        self.t_next = self.t_start + interval
+
+    # Report n records done. fraction is the part of the work done, by default
+    # n / total. Returns True, if a line was printed
+    def update(self, n, fraction=None, message=None):
+        now = time.perf_counter()
+        if now < self.t_next:
+            return False
+        self.t_next = now + self.interval
+
+        dt = now - self.t_start
+        if fraction is None and self.total:
+            fraction = n / self.total
+        line = str(n) + " " + self.unit
+        if self.total:
+            line += " of " + str(self.total)
+        line += ", " + str(round(n / dt, 1) if dt > 0 else 0.) + " " + self.unit + "/sec"
+        if fraction is not None and fraction > 0:
+            line = "[" + str(round(100. * fraction, 1)) + "%] " + line
+            eta = dt * (1. - fraction) / fraction
+            if eta > 60:
+                line += ", ETA: " + str(round(eta / 60., 1)) + " min"
+            else:
+                line += ", ETA: " + str(int(eta)) + " sec"
+        if message is not None:
+            line += ", " + message
+        ttprint(line)
+        return True
+
+# Write the summary of a run to filename, in the Prometheus text format for
+# files ending with .prom, else as JSON
+def write_summary(filename, summary):
+    if filename.endswith(".prom"):
+        write_prometheus_summary(filename, summary)
+    else:
+        write_json_summary(filename, summary)
@@ -7,7 +7,10 @@ class STConfig(BaseConfig):
         self.node = 'spacetrack'
         self.configdic = {
                 'user': 'user',
-                'password': 'secret'
+                'password': 'secret',
+                # May be changed e.g. to https://for-testing-only.space-track.org/
+                # or a local test server
+                'base_url': 'https://www.space-track.org/'
                 }
         super().__init__(configfilename)
 
@@ -1,6 +1,224 @@
 from satdb import tools
 from datetime import datetime, timedelta
 
+# Orbital element columns needed to generate a TLE
+TLE_ORBELEM_COLUMNS = (
+    "norad", "epoch", "mean_motion_dot", "mean_motion_ddot", "bstar",
+    "element_set_no", "inclination", "raan", "eccentricity",
+    "arg_of_pericenter", "mean_anomaly", "mean_motion", "rev_at_epoch",
+    )
+
+# Maximum number of NORAD ids in one "norad in (...)" clause
+NORAD_CHUNK = 1000
+
+# Return the "and norad in (...)" clause and the arguments for a list of
+# NORAD ids, or an empty clause if norads is None
+def _norad_clause(norads, alias=""):
+    if norads is None:
+        return "", ()
+    return (" and " + alias + "norad in (" + ", ".join(["%s"] * len(norads))
+            + ")", tuple(norads))
+
+# Fetch the orbital elements needed to generate TLEs for the given NORAD ids
+# (or all objects, if norads is None) with one set-based query. The element
+# set is selected per object with mode:
+#   "nearest": element set with the epoch nearest to the given epoch
+#   "before":  latest element set with epoch less or equal the given epoch
+#   "latest":  latest element set (epoch is ignored)
+# Returns a list of tuples in the order of TLE_ORBELEM_COLUMNS.
+def fetch_elements(dbc, epoch=None, norads=None, mode="nearest"):
+    if norads is not None and len(norads) > NORAD_CHUNK:
+        rows = []
+        for i in range(0, len(norads), NORAD_CHUNK):
+            rows += fetch_elements(dbc, epoch, norads[i:i + NORAD_CHUNK], mode)
+        return rows
+    if norads is not None and len(norads) == 0:
+        return []
+
+    if epoch is None:
+        mode = "latest"
+    where, args = _norad_clause(norads)
+
+    # The grouped min/max subqueries can use the (norad, epoch) primary key
+    if mode == "latest":
+        sel = ("select norad, max(epoch) as epoch from orbelem where 1=1"
+                + where + " group by norad")
+        sel_args = args
+    elif mode == "before":
+        sel = ("select norad, max(epoch) as epoch from orbelem"
+                + " where epoch <= %s" + where + " group by norad")
+        sel_args = (epoch,) + args
+    elif mode == "nearest":
+        sel = ("select norad, max(epoch) as epoch from orbelem"
+                + " where epoch <= %s" + where + " group by norad"
+                + " union all"
+                + " select norad, min(epoch) as epoch from orbelem"
+                + " where epoch > %s" + where + " group by norad")
+        sel_args = (epoch,) + args + (epoch,) + args
+    else:
+        raise ValueError("Unknown mode: " + str(mode))
+
+    sql = ("select " + ", ".join("o." + col for col in TLE_ORBELEM_COLUMNS)
+            + " from orbelem as o inner join (" + sel + ") as s"
+            + " on o.norad = s.norad and o.epoch = s.epoch"
+            + " order by o.norad, o.epoch")
+    res = dbc.fetchall(sql, sel_args)
+
+    if mode != "nearest":
+        return res
+
+    # Select the element set nearest to epoch from the (up to) two
+    # candidates per object
+    if isinstance(epoch, str):
+        epoch = datetime.fromisoformat(epoch)
+    nearest = {}
+    for row in res:
+        best = nearest.get(row[0])
+        if best is None or abs(row[1] - epoch) < abs(best[1] - epoch):
+            nearest[row[0]] = row
+    return [nearest[norad] for norad in sorted(nearest)]
+
+# Fetch name, short international designator and classification from the
+# latest metadata of the given objects (or all objects, if norads is None).
+# Returns a dictionary norad -> (name, id_short, classification_type)
+def fetch_names(dbc, norads=None):
+    if norads is not None and len(norads) > NORAD_CHUNK:
+        names = {}
+        for i in range(0, len(norads), NORAD_CHUNK):
+            names.update(fetch_names(dbc, norads[i:i + NORAD_CHUNK]))
+        return names
+    if norads is not None and len(norads) == 0:
+        return {}
+
+    where, args = _norad_clause(norads)
+    sql = ("select m.norad, m.name, m.id_short, m.classification_type"
+            + " from metadata as m inner join"
+            + " (select norad, max(epoch) as epoch from metadata where 1=1"
+            + where + " group by norad) as l"
+            + " on m.norad = l.norad and m.epoch = l.epoch")
+
+    names = {}
+    for row in dbc.fetchall(sql, args):
+        names[row[0]] = row[1:]
+    return names
+
+# Length of TLE line 1 and 2 without the checksum
+TLE_LINE_LENGTH = 68
+
+# Create line 1 and 2 of a TLE without checksums. res is a tuple with name,
+# norad, id_short, classification_type and the elements from
+# TLE_ORBELEM_COLUMNS without norad (see TLE.fromdb()). Values not fitting
+# into their fields give lines longer than TLE_LINE_LENGTH
+def tle_lines(res):
+    # Calculate the decimal day of year
+    doy = tools.datetime2doy(res[4])
+#    epoch = res[4]
+#    boy = datetime(epoch.year, 1, 1, 0, 0, 0) # begin of year (YYYY-01-01T00:00:00)
+#    doy = (epoch - boy).days + (epoch - boy).seconds / 86400.
+
+    line1 = ''.join([
+        '1',                                            # line number
+        ' ',
+        '%05d' % res[1],                                # NORAD id
+        res[3],                                         # classification
+        ' ',
+        '%-8s' % res[2],                                # int. designator
+        ' ',
+        res[4].strftime('%y') + '%012.8f' % doy,        # epoch
+        ' ',
+        '%10s' % ('%8.8f' % res[5]).replace('0.', '.'), # mean motion dot
+        ' ',
+        tools.conv_exp_notation(res[6]),                # mean motion ddot
+        ' ',
+        tools.conv_exp_notation(res[7]),                # bstar
+        ' ',
+        '0',                                            # ephemeris type
+        ' ',
+        '%4d' % res[8],                                 # element set no
+        ])
+
+    line2 = ''.join([
+        '2',                                            # line number
+        ' ',
+        '%05d' % res[1],                                # NORAD id
+        ' ',
+        '%8.4f' % res[9],                               # inclination
+        ' ',
+        '%8.4f' % res[10],                              # RAAN
+        ' ',
+        ('%9.7f' % res[11]).replace('0.', ''),          # eccentricity
+        ' ',
+        '%8.4f' % res[12],                              # arg of pericenter
+        ' ',
+        '%8.4f' % res[13],                              # mean anomaly
+        ' ',
+        '%11.8f' % res[14],                             # mean motion
+        '%5d' % res[15],                                # rev @ epoch
+        ])
+
+    return line1, line2
+
+# Create TLEs for a list of result tuples (see tle_lines()). The checksums
+# are computed for all lines at once. Returns a list of (line0, line1, line2)
+# tuples. Element sets resulting in invalid lines (wrong length or
+# characters) are skipped.
+def format_tles(results):
+    lines0 = []
+    lines1 = []
+    lines2 = []
+    for res in results:
+        line1, line2 = tle_lines(res)
+        lines0.append(res[0])
+        lines1.append(line1)
+        lines2.append(line2)
+
+    if len(lines1) == 0:
+        return []
+
+    # Calculate the checksums for line1 and line2
+    cs_lines1 = tools.tle_checksums(lines1).tolist()
+    cs_lines2 = tools.tle_checksums(lines2).tolist()
+
+    tles = []
+    for line0, line1, line2, cs1, cs2 in zip(lines0, lines1, lines2,
+            cs_lines1, cs_lines2):
+        if (cs1 >= 0 and cs2 >= 0 and len(line1) == TLE_LINE_LENGTH
+                and len(line2) == TLE_LINE_LENGTH):
+            tles.append((line0, line1 + str(cs1), line2 + str(cs2)))
+    return tles
+
+# Generator yielding (line0, line1, line2) tuples for the given objects (or
+# the whole catalog, if norads is None) at the given epoch. See
+# fetch_elements() for the modes. Given NORAD ids are processed in chunks of
+# chunk_size.
+def iter_tles(dbc, epoch=None, norads=None, mode="nearest", chunk_size=10000):
+    if norads is None:
+        chunks = [None]
+    else:
+        chunks = [norads[i:i + chunk_size]
+                for i in range(0, len(norads), chunk_size)]
+
+    for chunk in chunks:
+        names = fetch_names(dbc, chunk)
+        results = []
+        for row in fetch_elements(dbc, epoch, chunk, mode):
+            name, id_short, classification = names.get(row[0],
+                    (str(row[0]), "", "U"))
+            results.append((name or str(row[0]), row[0], id_short or "",
+                classification or "U") + tuple(row[1:]))
+        for tle in format_tles(results):
+            yield tle
+
+# Write TLEs (see iter_tles()) to a 3LE file. Returns the number of TLEs
+# written
+def write_tles(filename, tles):
+    n = 0
+    with open(filename, 'w') as fh:
+        for line0, line1, line2 in tles:
+            fh.write(line0 + "\n" + line1 + "\n" + line2 + "\n")
+            n += 1
+    return n
+
 class TLE:
     def __init__(self):
         self.line0 = None
@@ -8,90 +226,37 @@ class TLE:
         self.line2 = None
         self.epoch = None
 
+    # Generate the TLE of the object norad (int or str) from the element set
+    # nearest to epoch. Without metadata, the name is the NORAD id as for
+    # iter_tles(). Raises ValueError, if there is no element set
     def fromdb(self, dbc, norad, epoch):
-        sql = """
-        select
-        m.name,
-        o.norad,
-        m.id_short,
-        m.classification_type,
-        o.epoch,
-        o.mean_motion_dot,
-        o.mean_motion_ddot,
-        o.bstar,
-        o.element_set_no,
-        o.inclination,
-        o.raan,
-        o.eccentricity,
-        o.arg_of_pericenter,
-        o.mean_anomaly,
-        o.mean_motion,
-        o.rev_at_epoch
-        from orbelem as o inner join metadata as m on
-        (o.norad = m.norad)
-        where (o.norad, abs(timestampdiff(second, o.epoch, %s))) in
-        (select norad, min(abs(timestampdiff(second, epoch, %s)))
-        from orbelem where norad=%s group by norad)
-        and o.norad=%s limit 1;
-        """
-        res = dbc.fetchone(sql, (epoch, epoch, norad, norad,))
+        norad = int(norad)
+        rows = fetch_elements(dbc, epoch, [norad], mode="nearest")
+        if len(rows) == 0:
+            raise ValueError("No element set of object " + str(norad))
+        name, id_short, classification = fetch_names(dbc, [norad]).get(norad,
+                (str(norad), "", "U"))
 
-        line0 = res[0]
+        # name, norad, id_short, classification, epoch, mean motion dot, ...
+        res = ((name or str(norad), rows[0][0], id_short or "",
+            classification or "U") + tuple(rows[0][1:]))
+        self.from_result(res)
 
-        # Calculate the decimal day of year
-        doy = tools.datetime2doy(res[4])
-#        epoch = res[4]
-#        boy = datetime(epoch.year, 1, 1, 0, 0, 0) # begin of year (YYYY-01-01T00:00:00)
-#        doy = (epoch - boy).days + (epoch - boy).seconds / 86400.
-
-        line1 = ''.join([
-            '1',                                            # line number
-            ' ',
-            str(res[1]),                                    # NORAD id
-            res[3],                                         # classification
-            ' ',
-            '%-8s' % res[2],                                # int. designator
-            ' ',
-            res[4].strftime('%y') + '%12.8f'% doy,          # epoch
-            ' ',
-            '%10s' % ('%8.8f' % res[5]).replace('0.', '.'), # mean motion dot
-            ' ',
-            tools.conv_exp_notation(res[6]),                # mean motion ddot
-            ' ',
-            tools.conv_exp_notation(res[7]),                # bstar
-            ' ',
-            '0',                                            # ephemeris type
-            ' ',
-            '%4d' % res[8],                                 # element set no
-            ])
-
-        line2 = ''.join([
-            '2',                                            # line number
-            ' ',
-            str(res[1]),                                    # NORAD id
-            ' ',
-            '%8.4f' % res[9],                               # inclination
-            ' ',
-            '%8.4f' % res[10],                              # RAAN
-            ' ',
-            ('%9.7f' % res[11]).replace('0.', ''),          # eccentricity
-            ' ',
-            '%8.4f' % res[12],                              # arg of pericenter
-            ' ',
-            '%8.4f' % res[13],                              # mean anomaly
-            ' ',
-            '%11.8f' % res[14],                             # mean motion
-            '%5d' % res[15],                                # rev @ epoch
-            ])
+    # Generate the TLE from a result tuple (see tle_lines())
+    def from_result(self, res):
+        line0 = res[0]
+        line1, line2 = tle_lines(res)
 
         # Calculate the checksum for line1 and line2
         cs_line1 = tools.tle_checksum(line1)
         cs_line2 = tools.tle_checksum(line2)
 
-        # If checksums are all okay, write lines to the object attributes
-        if cs_line1 is not None and cs_line2 is not None:
+        # If checksums and lengths are all okay, write lines to the object
+        # attributes
+        if (cs_line1 is not None and cs_line2 is not None
+                and len(line1) == TLE_LINE_LENGTH
+                and len(line2) == TLE_LINE_LENGTH):
             self.line0 = line0
             self.line1 = line1 + str(cs_line1)
             self.line2 = line2 + str(cs_line2)
             self.epoch = res[4]
-
@@ -0,0 +1,260 @@
+import numpy as np
+from satdb import tools
+
+# Width of TLE line 1 and 2 including the checksum
+TLE_WIDTH = 69
+
+# Fixed-width columns of TLE line 1 and 2, see:
+# https://celestrak.com/NORAD/documentation/tle-fmt.php
+L1_NORAD = (2, 7)
+L1_CLASSIFICATION = (7, 8)
+L1_INT_DESIG = (9, 17)
+L1_EPOCH_YEAR = (18, 20)
+L1_EPOCH_DAY = (20, 32)
+L1_MEAN_MOTION_DOT = (33, 43)
+L1_MEAN_MOTION_DDOT = (44, 52)
+L1_BSTAR = (53, 61)
+L1_EPHEMERIS_TYPE = (62, 63)
+L1_ELEMENT_SET_NO = (64, 68)
+L2_NORAD = (2, 7)
+L2_INCLINATION = (8, 16)
+L2_RAAN = (17, 25)
+L2_ECCENTRICITY = (26, 33)
+L2_ARG_OF_PERICENTER = (34, 42)
+L2_MEAN_ANOMALY = (43, 51)
+L2_MEAN_MOTION = (52, 63)
+L2_REV_AT_EPOCH = (63, 68)
+
+# Extract the fixed-width column cols=(start, stop) from an array of ASCII
+# codes as byte strings
+def _field(chars, cols):
+    start, stop = cols
+    return np.ascontiguousarray(chars[:, start:stop]).view(
+            'S' + str(stop - start)).ravel()
+
+# Convert an array of byte strings to numbers of the given dtype. Entries
+# which cannot be converted are marked in the array valid
+def _convert(field, dtype, valid):
+    try:
+        return field.astype(dtype)
+    except ValueError:
+        pass
+
+    # Slow path: convert one by one to find the bad entries
+    values = np.zeros(len(field), dtype=dtype)
+    for i in range(0, len(field)):
+        try:
+            values[i] = dtype(field[i])
+        except ValueError:
+            valid[i] = False
+    return values
+
+# Convert fields in the TLE exponent notation (e.g. ' 12345-3' or '-12345-3')
+# to floats
+def _exp_field(chars, cols, valid):
+    start, stop = cols
+    sign = np.where(chars[:, start] == ord('-'), -1., 1.)
+    mant = _convert(_field(chars, (start + 1, start + 6)), np.int64, valid)
+    exp = _convert(_field(chars, (start + 6, stop)), np.int64, valid)
+    return sign * mant / 10. ** (5 - exp)
+
+#------------------------------------------------------------------------------
+# Class holding a block of TLEs decoded to numpy column arrays. The lines
+# are decoded at once by slicing the fixed-width columns. Records which are
+# invalid (checksum, format) are not decoded but collected in the list
+# rejected as (lines, reason) tuples.
+class TLEBlock:
+    def __init__(self):
+        self.n = 0
+
+        # Object name (line 0), None for 2LE
+        self.name = []
+
+        # Line 1
+        self.norad = None
+        self.classification_type = None
+        self.int_desig = None
+        self.epoch = None
+        self.mean_motion_dot = None
+        self.mean_motion_ddot = None
+        self.bstar = None
+        self.ephemeris_type = None
+        self.element_set_no = None
+
+        # Line 2
+        self.inclination = None
+        self.raan = None
+        self.eccentricity = None
+        self.arg_of_pericenter = None
+        self.mean_anomaly = None
+        self.mean_motion = None
+        self.rev_at_epoch = None
+
+        # Rejected records: [(lines, reason), ...]
+        self.rejected = []
+
+    # Group the lines to 2LE/3LE records. Returns the lists of names, line 1
+    # and line 2
+    def _group(self, lines):
+        names = []
+        lines1 = []
+        lines2 = []
+
+        lines = [l.rstrip() for l in lines]
+        lines = [l for l in lines if l != '']
+
+        # Fast path for files with 3LE or 2LE records only
+        if (len(lines) % 3 == 0
+                and all(l.startswith('1 ') for l in lines[1::3])
+                and all(l.startswith('2 ') for l in lines[2::3])):
+            return [l.strip() for l in lines[0::3]], lines[1::3], lines[2::3]
+        if (len(lines) % 2 == 0
+                and all(l.startswith('1 ') for l in lines[0::2])
+                and all(l.startswith('2 ') for l in lines[1::2])):
+            return [None] * (len(lines) // 2), lines[0::2], lines[1::2]
+
+        i = 0
+        while i < len(lines):
+            if (lines[i].startswith('1 ') and i + 1 < len(lines)
+                    and lines[i + 1].startswith('2 ')):
+                # 2LE
+                names.append(None)
+                lines1.append(lines[i])
+                lines2.append(lines[i + 1])
+                i += 2
+            elif (i + 2 < len(lines) and lines[i + 1].startswith('1 ')
+                    and lines[i + 2].startswith('2 ')):
+                # 3LE
+                names.append(lines[i].strip())
+                lines1.append(lines[i + 1])
+                lines2.append(lines[i + 2])
+                i += 3
+            else:
+                self.rejected.append(((lines[i],), "no TLE record"))
+                i += 1
+
+        return names, lines1, lines2
+
+    def from_lines(self, lines):
+        names, lines1, lines2 = self._group(lines)
+        if len(lines1) == 0:
+            return
+
+        c1 = tools.char_matrix(lines1, TLE_WIDTH)
+        c2 = tools.char_matrix(lines2, TLE_WIDTH)
+
+        # Validate line lengths, checksums and NORAD ids
+        valid = np.array([len(l) == TLE_WIDTH for l in lines1])
+        valid &= np.array([len(l) == TLE_WIDTH for l in lines2])
+        valid &= tools.tle_checksums(c1) == c1[:, 68].astype(np.int64) - ord('0')
+        valid &= tools.tle_checksums(c2) == c2[:, 68].astype(np.int64) - ord('0')
+        valid &= _field(c1, L1_NORAD) == _field(c2, L2_NORAD)
+        reason = np.where(valid, "", "checksum or format error").astype(object)
+
+        norad = _convert(_field(c1, L1_NORAD), np.int64, valid)
+        epoch_year = _convert(_field(c1, L1_EPOCH_YEAR), np.int64, valid)
+        epoch_day = _convert(_field(c1, L1_EPOCH_DAY), np.float64, valid)
+        mean_motion_dot = _convert(_field(c1, L1_MEAN_MOTION_DOT), np.float64, valid)
+        mean_motion_ddot = _exp_field(c1, L1_MEAN_MOTION_DDOT, valid)
+        bstar = _exp_field(c1, L1_BSTAR, valid)
+        ephemeris_type = _convert(_field(c1, L1_EPHEMERIS_TYPE), np.int64, valid)
+        element_set_no = _convert(_field(c1, L1_ELEMENT_SET_NO), np.int64, valid)
+        inclination = _convert(_field(c2, L2_INCLINATION), np.float64, valid)
+        raan = _convert(_field(c2, L2_RAAN), np.float64, valid)
+        eccentricity = _convert(_field(c2, L2_ECCENTRICITY), np.int64, valid) * 1e-7
+        arg_of_pericenter = _convert(_field(c2, L2_ARG_OF_PERICENTER), np.float64, valid)
+        mean_anomaly = _convert(_field(c2, L2_MEAN_ANOMALY), np.float64, valid)
+        mean_motion = _convert(_field(c2, L2_MEAN_MOTION), np.float64, valid)
+        rev_at_epoch = _convert(_field(c2, L2_REV_AT_EPOCH), np.int64, valid)
+        reason[(reason == "") & ~valid] = "number format error"
+
+        # Quarantine the invalid records
+        for i in np.flatnonzero(~valid):
+            lines_i = (lines1[i], lines2[i])
+            if names[i] is not None:
+                lines_i = (names[i],) + lines_i
+            self.rejected.append((lines_i, reason[i]))
+
+        # Keep the valid records
+        self.n = int(valid.sum())
+        self.name = [names[i] for i in np.flatnonzero(valid)]
+        self.norad = norad[valid]
+        self.classification_type = _field(c1, L1_CLASSIFICATION)[valid].astype('U1')
+        self.int_desig = np.char.strip(_field(c1, L1_INT_DESIG)[valid].astype('U8'))
+        year = np.where(epoch_year[valid] < 57, 2000, 1900) + epoch_year[valid]
+        self.epoch = tools.doy2datetime64(year, epoch_day[valid])
+        self.mean_motion_dot = mean_motion_dot[valid]
+        self.mean_motion_ddot = mean_motion_ddot[valid]
+        self.bstar = bstar[valid]
+        self.ephemeris_type = ephemeris_type[valid]
+        self.element_set_no = element_set_no[valid]
+        self.inclination = inclination[valid]
+        self.raan = raan[valid]
+        self.eccentricity = eccentricity[valid]
+        self.arg_of_pericenter = arg_of_pericenter[valid]
+        self.mean_anomaly = mean_anomaly[valid]
+        self.mean_motion = mean_motion[valid]
+        self.rev_at_epoch = rev_at_epoch[valid]
+
+    # Keep only the records where mask is True
+    def take(self, mask):
+        mask = np.asarray(mask, dtype=bool)
+        for attr, values in self.__dict__.items():
+            if isinstance(values, np.ndarray):
+                setattr(self, attr, values[mask])
+        self.name = [n for n, m in zip(self.name, mask) if m]
+        self.n = int(mask.sum())
+
+    # Generator yielding one dictionary with python values per record. The
+    # keys are the attribute names of OMMMetadata and OMMOrbelem
+    def records(self):
+        cols = {
+            'norad': self.norad.tolist(),
+            'epoch': self.epoch.astype('datetime64[us]').tolist(),
+            'name': self.name,
+            'id_short': self.int_desig.tolist(),
+            'classification_type': self.classification_type.tolist(),
+            'mean_motion_dot': self.mean_motion_dot.tolist(),
+            'mean_motion_ddot': self.mean_motion_ddot.tolist(),
+            'bstar': self.bstar.tolist(),
+            'ephemeris_type': self.ephemeris_type.tolist(),
+            'element_set_no': self.element_set_no.tolist(),
+            'inclination': self.inclination.tolist(),
+            'raan': self.raan.tolist(),
+            'eccentricity': self.eccentricity.tolist(),
+            'arg_of_pericenter': self.arg_of_pericenter.tolist(),
+            'mean_anomaly': self.mean_anomaly.tolist(),
+            'mean_motion': self.mean_motion.tolist(),
+            'rev_at_epoch': self.rev_at_epoch.tolist(),
+            }
+        # International designator in the long form, e.g. 98067A -> 1998-067A
+        int_desig = cols['id_short']
+        cols['obj_id'] = [
+            (('20' if d[:2] < '57' else '19') + d[:2] + '-' + d[2:])
+            if d[:2].isdigit() else None
+            for d in int_desig
+            ]
+
+        keys = list(cols.keys())
+        for values in zip(*cols.values()):
+            yield dict(zip(keys, values))
+
+# Read TLE lines from a file handle and yield TLEBlock objects with up to
+# about block_size records each. Blocks always end after a line 2
+def iter_tle_blocks(fh, block_size=10000):
+    lines = []
+    n = 0
+    for line in fh:
+        lines.append(line)
+        if line.startswith('2 '):
+            n += 1
+            if n >= block_size:
+                block = TLEBlock()
+                block.from_lines(lines)
+                yield block
+                lines = []
+                n = 0
+    if lines:
+        block = TLEBlock()
+        block.from_lines(lines)
+        yield block
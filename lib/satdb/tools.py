@@ -10,19 +10,118 @@ import re
 # Earth radius in km
 #re = 6378.
 
-def movmedian(data, boxhw):
-    data_filtered = []
+# Windows wider than this are filtered with a running sorted list instead of
+# sorting all windows at once
+MOVMEDIAN_MAX_WINDOW = 512
+
+# Number of window elements sorted at once (memory limit of the vectorized
+# moving median)
+_MOVMEDIAN_CHUNK = 1 << 22
+
+# Moving median over the rows of windows (sliding windows of width
+# 2*boxhw+1 padded with +inf). counts is the number of real values per
+# window, the padding sorts behind them
+def _window_medians(windows, counts, boxhw):
+    width = 2 * boxhw + 1
+    medians = np.empty(len(windows))
+    step = max(1, _MOVMEDIAN_CHUNK // width)
+    for start in range(0, len(windows), step):
+        stop = min(start + step, len(windows))
+        sub = windows[start:stop]
+        c = counts[start:stop]
+
+        # Full windows: the median is the element in the middle
+        full = c == width
+        if full.any():
+            medians[start:stop][full] = np.partition(sub[full], boxhw,
+                    axis=1)[:, boxhw]
+
+        # Truncated windows at the edges
+        part = ~full
+        if part.any():
+            s = np.sort(sub[part], axis=1)
+            cp = c[part]
+            rows = np.arange(len(cp))
+            medians[start:stop][part] = 0.5 * (s[rows, (cp - 1) // 2]
+                    + s[rows, cp // 2])
+    return medians
+
+# Moving median of one series with a running sorted list, O(n*w) memory
+# moves but no (n, w) window matrix
+def _movmedian_sorted(values, boxhw):
+    from bisect import insort, bisect_left
+
+    n = len(values)
+    values = values.tolist()
+    window = sorted(values[0:min(boxhw, n)])
+    medians = np.empty(n)
+    for i in range(0, n):
+        if i + boxhw < n:
+            insort(window, values[i + boxhw])
+        if i - boxhw - 1 >= 0:
+            del window[bisect_left(window, values[i - boxhw - 1])]
+        c = len(window)
+        medians[i] = 0.5 * (window[(c - 1) // 2] + window[c // 2])
+    return medians
 
-    for i in range(0,len(data)):
-        # Lower boundary
-        lb = i - boxhw if i >= boxhw else 0
-        # Upper boundary
-        ub = i + boxhw if i + boxhw < len(data) else len(data)-1
-        # Calculate median from array slice (sliding window)
-        data_filtered.append(np.median(data[lb:ub+1]))
-        #print(i, lb, ub, data[lb:ub+1], np.median(data[lb:ub+1]))
+# Moving median of several series at once. series is a list of 1D arrays
+# (or lists), e.g. the altitude histories of all objects of a launch. The
+# window of sample i is [i-boxhw, i+boxhw], truncated at the start and end
+# of each series. Windows containing NaN give NaN, like np.median(). Returns
+# a list of float arrays
+def movmedian_batch(series, boxhw):
+    series = [np.asarray(s, dtype=np.float64).ravel() for s in series]
+    width = 2 * boxhw + 1
+    if len(series) == 0:
+        return []
 
-    return data_filtered
+    # Concatenate the series separated by boxhw +inf pads, so no window
+    # reaches into the next series. NaN are replaced by +inf as well and
+    # counted separately
+    pad = np.full(boxhw, np.inf)
+    parts = [pad]
+    for s in series:
+        parts.append(s)
+        parts.append(pad)
+    x = np.concatenate(parts)
+    real = np.concatenate([np.zeros(boxhw, dtype=bool)] + [
+        np.concatenate((np.ones(len(s), dtype=bool), np.zeros(boxhw, dtype=bool)))
+        for s in series])
+    nan = np.isnan(x)
+    x[nan] = np.inf
+
+    # Number of real and NaN values per window (window j is centered at
+    # x[j + boxhw])
+    def window_sum(mask):
+        csum = np.concatenate(([0], np.cumsum(mask)))
+        return csum[width:] - csum[:-width]
+    counts = window_sum(real)
+    n_nan = window_sum(nan)
+
+    if width > MOVMEDIAN_MAX_WINDOW:
+        medians = np.concatenate([np.full(len(pad), np.nan)] + [
+            np.concatenate((_movmedian_sorted(np.where(np.isnan(s), np.inf, s),
+                boxhw), np.full(len(pad), np.nan)))
+            for s in series])[boxhw:len(x) - boxhw]
+    else:
+        windows = np.lib.stride_tricks.sliding_window_view(x, width)
+        medians = _window_medians(windows, counts, boxhw)
+    medians[n_nan > 0] = np.nan
+
+    # Split the result to the series, dropping the pads
+    result = []
+    start = 0
+    for s in series:
+        result.append(medians[start:start + len(s)])
+        start += len(s) + boxhw
+    return result
+
+# Moving median with a window of 2*boxhw+1 samples, truncated at the start
+# and end of data. Returns a list
+def movmedian(data, boxhw):
+    if len(data) == 0:
+        return []
+    return movmedian_batch([data], boxhw)[0].tolist()
 
 # Open a file for reading. Unzip first, if gzipped
 def open_file(filename):
@@ -104,6 +203,39 @@ def tle_checksum(line=None):
 
     return checksum
 
+# Convert a list of strings to an array of ASCII codes with shape
+# (len(lines), width). Shorter lines are padded with spaces, longer lines are
+# truncated
+def char_matrix(lines, width):
+    try:
+        a = np.array(lines, dtype='S' + str(width))
+    except UnicodeEncodeError:
+        a = np.array([l.encode('ascii', 'replace') for l in lines],
+                dtype='S' + str(width))
+    chars = a.view(np.uint8).reshape(len(lines), width).copy()
+    chars[chars == 0] = ord(' ')
+    return chars
+
+# Vectorized version of tle_checksum(). Computes the checksums of the first
+# 68 characters of the given TLE lines (list of strings or array of ASCII
+# codes from char_matrix()). Lines containing bad/forbidden characters get
+# the checksum -1
+def tle_checksums(lines):
+    chars = lines if isinstance(lines, np.ndarray) else char_matrix(lines, 69)
+    chars = chars[:, :68]
+
+    digit = (chars >= ord('0')) & (chars <= ord('9'))
+    minus = chars == ord('-')
+    alpha = (((chars >= ord('a')) & (chars <= ord('z')))
+            | ((chars >= ord('A')) & (chars <= ord('Z'))))
+    other = (chars == ord(' ')) | (chars == ord('.')) | (chars == ord('+'))
+
+    values = np.where(digit, chars.astype(np.int64) - ord('0'), 0) + minus
+    checksums = values.sum(axis=1) % 10
+    checksums[~(digit | minus | alpha | other).all(axis=1)] = -1
+
+    return checksums
+
 # Calculate a datetime object from the year YYYY and the decimal day of
 # year (doy)
 def doy2datetime(year, doy):
@@ -113,6 +245,14 @@ def doy2datetime(year, doy):
     # Therefore, the doy must be greater-equal 1
     return datetime(year, 1, 1) + timedelta(days=(doy - 1))
 
+# Vectorized version of doy2datetime(). Calculates a numpy datetime64[us]
+# array from arrays of years and decimal days of year
+def doy2datetime64(year, doy):
+    year = np.asarray(year)
+    doy = np.asarray(doy, dtype=np.float64)
+    boy = (year - 1970).astype('datetime64[Y]').astype('datetime64[us]')
+    return boy + np.round((doy - 1.) * 86400e6).astype('timedelta64[us]')
+
 # Calculate the decimal day of year from a given datetime object
 def datetime2doy(epoch):
     # January, 1st 00:00:00 is already doy 1! Therefore, the below line
@@ -121,3 +261,42 @@ def datetime2doy(epoch):
 
     return 1. + (epoch - t0).days + (epoch - t0).seconds / 86400.
 
+
+# Group the rows of a columnar query result by the values of keys (e.g. the
+# column obj_type). columns is a dictionary of numpy arrays (see
+# Dbase.fetchcolumns()) or a numpy structured array (see Dbase.fetcharray())
+# with the same length as keys. Returns a dictionary key -> columns of the
+# rows with this key in the same form as columns. NULL keys are grouped
+# under "". If categories are given, only these keys get their own group and
+# all other rows are grouped under the key other, e.g.:
+#   groups = group_by(res["obj_type"], res,
+#       categories=("PAYLOAD", "ROCKET BODY", "DEBRIS"), other="OTHER")
+#   groups["DEBRIS"]["eccentricity"]
+def group_by(keys, columns, categories=None, other=None):
+    keys = np.asarray(keys)
+    if keys.dtype == object:
+        keys = np.where(keys == None, "", keys).astype(str)
+
+    if categories is not None:
+        labels = np.asarray(list(categories) + [other], dtype=object)
+        index = np.full(len(keys), len(categories))
+        for i, category in enumerate(categories):
+            index[keys == category] = i
+    else:
+        labels, index = np.unique(keys, return_inverse=True)
+        labels = labels.astype(object)
+    index = index.ravel()
+
+    # Sort the row indices by group, the rows of a group keep their order
+    order = np.argsort(index, kind='stable')
+    bounds = np.searchsorted(index[order], np.arange(len(labels) + 1))
+
+    groups = {}
+    for i, label in enumerate(labels.tolist()):
+        rows = order[bounds[i]:bounds[i + 1]]
+        if isinstance(columns, dict):
+            groups[label] = dict((name, col[rows])
+                    for name, col in columns.items())
+        else:
+            groups[label] = columns[rows]
+    return groups
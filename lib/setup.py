@@ -10,5 +10,9 @@ setup(name = 'satdb',
             'spacetrack',
             'numpy',
             'TLE-tools',
-            ]
+            ],
+        extras_require = {
+            'duckdb': ['duckdb'],
+            'sgp4': ['sgp4'],
+            }
         )
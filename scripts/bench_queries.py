@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+import argparse
+from datetime import datetime, timedelta
+import json
+import os
+import statistics
+import time
+
+from satdb import DBConfig, Dbase
+from satdb.migrations import PARTITION_MIGRATION, migrate, schema_version
+from satdb.tools import ttprint
+
+# Queries of the common access patterns as (name, sql, arguments). The
+# arguments may refer to the reference times "epoch" (newest epoch in
+# orbelem_latest) and "created" (newest created in orbelem)
+QUERIES = (
+    ("geo_band_latest",
+        "select norad, semimajor_axis, inclination from orbelem_latest"
+        + " where semimajor_axis between %s and %s and inclination between %s and %s",
+        (42000.0, 42330.0, 0.0, 20.0)),
+    ("leo_band_history",
+        "select norad, epoch from orbelem"
+        + " where semimajor_axis between %s and %s and inclination between %s and %s",
+        (6700.0, 6900.0, 50.0, 55.0)),
+    ("epoch_window",
+        "select norad, epoch, semimajor_axis from orbelem where epoch between %s and %s",
+        ("epoch-30d", "epoch")),
+    ("created_since",
+        "select count(*) from orbelem where created >= %s",
+        ("created-1d",)),
+    ("obj_id_prefix",
+        "select distinct norad from metadata where obj_id like %s",
+        ("2019-029%",)),
+    ("name_prefix",
+        "select distinct norad from metadata where name like %s",
+        ("STARLINK%",)),
+    ("launch_window",
+        "select distinct norad from metadata where launch_date between %s and %s",
+        ("2019-01-01", "2020-01-01")),
+    )
+
+# Replace the references to the reference times in the arguments
+def resolve_arguments(arguments, ref):
+    resolved = []
+    for arg in arguments:
+        if isinstance(arg, str) and arg.split("-")[0] in ref:
+            name, _, delta = arg.partition("-")
+            value = ref[name]
+            if delta:
+                value -= timedelta(days=int(delta.rstrip("d")))
+            arg = value.strftime("%Y-%m-%d %H:%M:%S")
+        resolved.append(arg)
+    return tuple(resolved)
+
+# Reference times of the database. Fall back to now for empty tables
+def reference_times(dbc):
+    now = datetime.utcnow().replace(microsecond=0)
+    epoch = dbc.fetchone("select max(epoch) from orbelem_latest")[0]
+    created = dbc.fetchone("select max(created) from orbelem")[0]
+    return {"epoch": epoch or now, "created": created or now}
+
+# Query plan as list of lines
+def explain(dbc, sql, arguments):
+    if dbc.dialect == "sqlite":
+        return [row[-1] for row in dbc.fetchall("explain query plan " + sql, arguments)]
+    rows = dbc.fetchall("explain " + sql, arguments)
+    if dbc.dialect == "duckdb":
+        return [line for row in rows for line in str(row[-1]).splitlines()
+                if line.strip()]
+
+    # MySQL: id, select_type, table, partitions, type, possible_keys, key,
+    # key_len, ref, rows, filtered, Extra
+    return ["table=" + str(r[2]) + " partitions=" + str(r[3]) + " type=" + str(r[4])
+            + " key=" + str(r[6]) + " rows=" + str(r[9]) + " extra=" + str(r[11])
+            for r in rows]
+
+# Run the queries, return the results as dict by query name
+def run_queries(dbc, runs, show_plans=True):
+    ref = reference_times(dbc)
+    results = {}
+    for name, sql, arguments in QUERIES:
+        arguments = resolve_arguments(arguments, ref)
+        plan = explain(dbc, sql, arguments)
+        if show_plans:
+            ttprint("Plan of " + name + ":")
+            for line in plan:
+                print("    " + line)
+
+        times = []
+        n_rows = 0
+        for i in range(runs):
+            t_start = time.perf_counter()
+            n_rows = len(dbc.fetchall(sql, arguments))
+            times.append(time.perf_counter() - t_start)
+
+        results[name] = {"median_ms": round(statistics.median(times) * 1000, 3),
+                "min_ms": round(min(times) * 1000, 3),
+                "rows": n_rows,
+                "plan": plan}
+    return results
+
+# Print the timings, with the speedup compared to the results before
+def print_results(results, before=None):
+    for name, res in results.items():
+        line = (name.ljust(20) + str(res["median_ms"]).rjust(12) + " ms"
+                + str(res["rows"]).rjust(10) + " rows")
+        if before is not None and name in before and res["median_ms"] > 0:
+            line += ("   before " + str(before[name]["median_ms"]) + " ms, speedup "
+                    + str(round(before[name]["median_ms"] / res["median_ms"], 1)))
+        ttprint(line)
+
+#------------------------------------------------------------------------------
+# Main routine
+def main(args):
+
+    ttprint("Executing " + os.path.basename(__file__))
+
+    # Read the config file
+    ttprint("Reading config file " + args.config)
+    config = DBConfig(args.config)
+
+    # Connect to the database
+    ttprint("Connecting to database")
+    dbc = Dbase(config)
+    dbc.connect()
+
+    before = None
+    if args.compare:
+        with open(args.compare) as fh:
+            before = json.load(fh)["queries"]
+
+    ttprint("Schema version " + str(schema_version(dbc)) + ", backend " + dbc.dialect)
+    results = run_queries(dbc, args.runs)
+
+    # Apply the migrations and run the queries again
+    if args.migrate:
+        optional = [PARTITION_MIGRATION] if args.partition else []
+        ttprint("Applying migrations")
+        migrate(dbc, optional=optional,
+            progress=lambda v, d: ttprint("Applying migration " + str(v) + " (" + d + ")"))
+        before = results
+        ttprint("Schema version " + str(schema_version(dbc)))
+        results = run_queries(dbc, args.runs)
+
+    print_results(results, before)
+
+    if args.json:
+        ttprint("Writing results to " + args.json)
+        with open(args.json, "w") as fh:
+            json.dump({"backend": dbc.dialect, "schema_version": schema_version(dbc),
+                "runs": args.runs, "queries": results}, fh, indent=2)
+
+    # Disconnect database
+    ttprint("Disconnecting from database")
+    dbc.disconnect()
+
+    ttprint("Finished")
+
+###############################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("config", help="Config file")
+    parser.add_argument("--runs", help="runs per query (default: 5)",
+            type=int, default=5)
+    parser.add_argument("--json", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare with the results of this JSON file")
+    parser.add_argument("--migrate",
+            help="apply the pending migrations and run the queries again",
+            action="store_true")
+    parser.add_argument("--partition",
+            help="with --migrate: also partition orbelem (MySQL only)",
+            action="store_true")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+import argparse
+from datetime import datetime
+import os
+
+from satdb import DBConfig, Dbase, clean_orbelem, get_watermark
+from satdb.cleaning import CLEAN_JOB
+from satdb.tools import ttprint
+
+#------------------------------------------------------------------------------
+# Main routine
+def main(args):
+
+    ttprint("Executing " + os.path.basename(__file__))
+
+    # Read the config file
+    ttprint("Reading config file " + args.config)
+    config = DBConfig(args.config)
+
+    # Connect to the database
+    ttprint("Connecting to database")
+    dbc = Dbase(config)
+    dbc.connect()
+
+    watermark = get_watermark(dbc, CLEAN_JOB)
+    if args.full or watermark is None:
+        ttprint("Cleaning all element sets")
+    else:
+        ttprint("Cleaning element sets created since " + str(watermark))
+
+    t_start = datetime.now()
+    n_objects, n_rows, n_outliers = clean_orbelem(dbc, full=args.full,
+            boxhw=args.window, nsigma=args.nsigma, batch_size=args.batch_size)
+    dt = (datetime.now() - t_start).total_seconds()
+    ttprint(str(n_objects) + " objects, " + str(n_rows) + " rows written, "
+            + str(n_outliers) + " with outliers in " + str(round(dt, 1))
+            + " sec")
+
+    # Disconnect database
+    ttprint("Disconnecting from database")
+    dbc.disconnect()
+
+    ttprint("Finished")
+
+###############################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("config", help="Config file")
+    parser.add_argument("--full", help="reprocess all element sets",
+            action="store_true")
+    parser.add_argument("--window", "-w",
+            help="half width of the filter window in samples (default: 5)",
+            type=int, default=5)
+    parser.add_argument("--nsigma",
+            help="outlier threshold in standard deviations (default: 3.0)",
+            type=float, default=3.0)
+    parser.add_argument("--batch-size", dest="batch_size",
+            help="number of objects processed per transaction (default: 200)",
+            type=int, default=200)
+    args = parser.parse_args()
+    main(args)
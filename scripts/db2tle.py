@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import argparse
+from datetime import datetime
+import os
+
+from satdb import DBConfig, Dbase, iter_tles, write_tles
+from satdb.tools import ttprint
+
+#------------------------------------------------------------------------------
+# Main routine
+def main(args):
+
+    ttprint("Executing " + os.path.basename(__file__))
+
+    # Convert the epoch to a datetime object
+    epoch = None
+    if args.epoch is not None:
+        try:
+            epoch = datetime.fromisoformat(args.epoch)
+        except ValueError:
+            ttprint("Cannot convert \"" + args.epoch + "\" to datetime object. Exiting")
+            exit()
+
+    # Collect the NORAD ids from the command line and the NORAD file
+    norads = None
+    if args.norad or args.noradfile:
+        norads = list(args.norad or [])
+        if args.noradfile:
+            with open(args.noradfile, 'r') as fh:
+                for line in fh:
+                    line = line.split('#')[0].strip()
+                    if line != '':
+                        norads.append(int(line))
+        norads = sorted(set(norads))
+
+    # Read the config file
+    ttprint("Reading config file " + args.config)
+    config = DBConfig(args.config)
+
+    # Connect to the database
+    ttprint("Connecting to database")
+    dbc = Dbase(config)
+    dbc.connect()
+
+    ttprint("Writing TLEs to " + args.outfile)
+    t_start = datetime.now()
+    n = write_tles(args.outfile, iter_tles(dbc, epoch, norads, mode=args.mode))
+    dt = (datetime.now() - t_start).total_seconds()
+    ttprint(str(n) + " TLEs written in " + str(round(dt, 1)) + " sec")
+
+    # Disconnect database
+    ttprint("Disconnecting from database")
+    dbc.disconnect()
+
+    ttprint("Finished")
+
+###############################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("config", help="Config file")
+    parser.add_argument("outfile", help="Output 3LE file")
+    parser.add_argument("--epoch", "-e",
+            help="Epoch (YYYY-MM-DD[THH:MM:SS]), default: latest element sets",
+            type=str)
+    parser.add_argument("--mode", "-m", choices=["nearest", "before"],
+            help="Select the element set with the epoch nearest to or the "
+            + "latest before the given epoch (default: nearest)",
+            default="nearest")
+    parser.add_argument("--norad", "-n", nargs="+", type=int,
+            help="NORAD Catalogue IDs of objects (default: all objects)")
+    parser.add_argument("--norad-file", dest="noradfile", type=str,
+            help="File with one NORAD Catalogue ID per line")
+    args = parser.parse_args()
+    main(args)
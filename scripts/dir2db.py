@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import shutil
+
+from satdb import DBConfig, Dbase, BatchWriter, KeyFilter, import_files
+from satdb.ingest import OMM_SUFFIXES, TLE_SUFFIXES, write_quarantine
+from satdb.stats import Progress, StageTimer, write_summary
+from satdb.tools import ttprint
+
+#------------------------------------------------------------------------------
+# Main routine
+def main(args):
+
+    ttprint("Executing " + os.path.basename(__file__))
+
+    # Check if the input and output folders exist
+    for d in (args.indir, args.outdir):
+        if not os.path.isdir(d):
+            ttprint("Directory " + d + " doesn't exist. Exiting.")
+            exit()
+
+    # Collect the OMM and TLE files to import
+    filenames = sorted(
+        os.path.join(args.indir, f) for f in os.listdir(args.indir)
+        if f.endswith(OMM_SUFFIXES + TLE_SUFFIXES)
+        )
+    if len(filenames) == 0:
+        ttprint("No files to import in " + args.indir)
+        ttprint("Finished")
+        return
+    ttprint("Found " + str(len(filenames)) + " files to import")
+
+    # Read the config file
+    ttprint("Reading config file " + args.config)
+    config = DBConfig(args.config)
+
+    # Connect to the database
+    ttprint("Connecting to database")
+    dbc = Dbase(config)
+    dbc.connect()
+
+    # Records are written to the database in batches. Element sets already
+    # stored are skipped, unless forced
+    keyfilter = None if args.force else KeyFilter(dbc)
+    timer = StageTimer()
+    writer = BatchWriter(dbc, batch_size=args.batch_size, keyfilter=keyfilter,
+            timer=timer)
+
+    # Progress output at most every args.progress seconds
+    progress = Progress(args.progress, total=len(filenames), unit="files") if args.verbose else None
+
+    # Move every file to the output folder as soon as all its records are
+    # committed to the database. Files which cannot be parsed are kept
+    n_done = [0, 0]
+    def done(filename, error):
+        if error is None:
+            shutil.move(filename, os.path.join(args.outdir,
+                os.path.basename(filename)))
+            n_done[0] += 1
+            if progress is not None:
+                progress.update(n_done[0] + n_done[1], message="imported "
+                        + filename + ", " + str(round(writer.rate(), 1)) + " rows/sec")
+        else:
+            n_done[1] += 1
+            ttprint("Error importing " + filename + ": " + error)
+
+    # Invalid TLE records are skipped and written to the quarantine file, if
+    # given
+    n_rejected = [0]
+    def rejects(filename, rejected):
+        n_rejected[0] += len(rejected)
+        ttprint(str(len(rejected)) + " invalid TLE records skipped in " + filename)
+        if args.quarantine is not None:
+            write_quarantine(args.quarantine, rejected, filename)
+
+    ttprint("Importing with " + str(args.workers) + " worker processes")
+    # Files in the manifest are moved without importing them again
+    n_known = import_files(writer, filenames, workers=args.workers, done=done,
+            manifest=False if args.force else None, rejects=rejects)
+    ttprint(writer.summary())
+    if n_rejected[0] > 0:
+        ttprint(str(n_rejected[0]) + " invalid TLE records skipped")
+        if args.quarantine is not None:
+            ttprint("Invalid TLE records written to " + args.quarantine)
+    ttprint(str(n_done[0]) + " files imported (" + str(n_known)
+            + " imported before), " + str(n_done[1]) + " failed")
+    for line in timer.report():
+        ttprint(line)
+
+    # Machine-readable summary for monitoring
+    if args.stats is not None:
+        counters = writer.counters()
+        counters["files_imported"] = n_done[0]
+        counters["files_skipped"] = n_known
+        counters["files_failed"] = n_done[1]
+        counters["tles_rejected"] = n_rejected[0]
+        ttprint("Writing summary to " + args.stats)
+        write_summary(args.stats, timer.summary(os.path.basename(__file__),
+            counters))
+
+    # Disconnect database
+    ttprint("Disconnecting from database")
+    dbc.disconnect()
+
+    ttprint("Finished")
+
+###############################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("config", help="Config file")
+    parser.add_argument("indir",
+            help="Directory with OMM/TLE files to import (e.g. data/unprocessed)")
+    parser.add_argument("outdir",
+            help="Directory to move imported files to (e.g. data/processed)")
+    parser.add_argument("--workers", "-j",
+            help="number of parallel parser processes (default: number of CPUs)",
+            type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", dest="batch_size",
+            help="number of rows written per transaction (default: 1000)",
+            type=int, default=1000)
+    parser.add_argument("--force",
+            help="import all files and element sets, even if already imported",
+            action="store_true")
+    parser.add_argument("--quarantine",
+            help="file to append invalid TLE records to", type=str)
+    parser.add_argument("--stats",
+            help="write a summary of the run to this file (Prometheus text format for *.prom, else JSON)",
+            type=str)
+    parser.add_argument("--progress",
+            help="seconds between the progress lines with --verbose (default: 10)",
+            type=float, default=10.)
+    parser.add_argument("--verbose", help="show the progress of the import",
+            action="store_true")
+    args = parser.parse_args()
+    main(args)
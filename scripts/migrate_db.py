@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import argparse
+from datetime import datetime
+import os
+
+from satdb import DBConfig, Dbase
+from satdb.migrations import MIGRATIONS, PARTITION_MIGRATION, applied_versions, migrate, pending_migrations
+from satdb.tools import ttprint
+
+#------------------------------------------------------------------------------
+# Main routine
+def main(args):
+
+    ttprint("Executing " + os.path.basename(__file__))
+
+    # Read the config file
+    ttprint("Reading config file " + args.config)
+    config = DBConfig(args.config)
+
+    # Connect to the database
+    ttprint("Connecting to database")
+    dbc = Dbase(config)
+    dbc.connect()
+
+    # Optional migrations are only applied on request
+    optional = []
+    if args.partition:
+        optional.append(PARTITION_MIGRATION)
+
+    applied = applied_versions(dbc)
+    for version, description, function, is_optional in MIGRATIONS:
+        if version in applied:
+            state = "applied"
+        elif is_optional:
+            state = "optional"
+        else:
+            state = "pending"
+        ttprint("Migration " + str(version) + " (" + description + "): " + state)
+
+    pending = pending_migrations(dbc, args.to, optional)
+    if args.status or len(pending) == 0:
+        if len(pending) == 0:
+            ttprint("Database schema is up to date")
+        dbc.disconnect()
+        ttprint("Finished")
+        return
+
+    def progress(version, description):
+        ttprint("Applying migration " + str(version) + " (" + description + ")")
+
+    t_start = datetime.now()
+    done = migrate(dbc, args.to, optional, progress)
+    dt = (datetime.now() - t_start).total_seconds()
+    ttprint(str(len(done)) + " migrations applied in " + str(round(dt, 1)) + " sec")
+
+    # Disconnect database
+    ttprint("Disconnecting from database")
+    dbc.disconnect()
+
+    ttprint("Finished")
+
+###############################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("config", help="Config file")
+    parser.add_argument("--to", help="migrate up to this version (default: latest)",
+            type=int)
+    parser.add_argument("--partition",
+            help="partition orbelem by epoch year (MySQL only, copies the table)",
+            action="store_true")
+    parser.add_argument("--status", help="only show the applied and pending migrations",
+            action="store_true")
+    args = parser.parse_args()
+    main(args)
@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 
 import argparse
-import xml.etree.ElementTree as et
-from datetime import datetime
 import os
+import time
 
-from satdb import DBConfig, Dbase, OMMMetadata, OMMOrbelem, tools
+from satdb import DBConfig, Dbase, OMMMetadata, OrbelemBatch, OMMReader, BatchWriter
+from satdb.jobstate import GP_WATERMARK_JOB, advance_watermark
+from satdb.keyfilter import KeyFilter, scan_omm_keys
+from satdb.manifest import add_to_manifest, file_digest, has_manifest, in_manifest
+from satdb.stats import Progress, StageTimer, write_summary
 from satdb.tools import ttprint
 
 #------------------------------------------------------------------------------
@@ -23,43 +26,111 @@ def main(args):
     dbc = Dbase(config)
     dbc.connect()
 
-    # Open the OMM file
+    # Time and number of items per stage of the import
+    timer = StageTimer()
+
+    # Files in the manifest were imported before
+    manifest = has_manifest(dbc) and not args.force
+    if manifest:
+        digest = file_digest(args.ommfile)
+        if in_manifest(dbc, digest):
+            ttprint("File " + args.ommfile + " was imported before. Exiting")
+            if args.stats is not None:
+                write_summary(args.stats, timer.summary(
+                    os.path.basename(__file__), {"files_skipped": 1}))
+            dbc.disconnect()
+            return
+
+    # Find the element sets already stored in the database by scanning the
+    # file for the epochs and NORAD IDs. The segments of these element sets
+    # are skipped before any objects are created. If the scan fails, the
+    # element sets are checked by the writer after parsing
+    keyfilter = None
+    skip = None
+    if not args.force:
+        keyfilter = KeyFilter(dbc)
+        with timer.stage("keyfilter"):
+            keys = scan_omm_keys(args.ommfile)
+            if keys is not None:
+                skip = keyfilter.known_keys(keys)
+        if keys is not None:
+            ttprint(str(int(skip.sum())) + " of " + str(len(keys))
+                    + " element sets already in database")
+            keyfilter = None
+
+    # Records are written to the database in batches
+    writer = BatchWriter(dbc, batch_size=args.batch_size, keyfilter=keyfilter,
+            timer=timer)
+
+    # Open the OMM file. The segments, which are the space objects in the
+    # OMM file, are read one after another
     ttprint("Reading OMM file " + args.ommfile)
-    fh = tools.open_file(args.ommfile)
-    root = et.fromstring(fh.read())
+    reader = OMMReader(args.ommfile, timer=timer)
 
-    # Now, loop over all segments, which are the space objects in the OMM file
-    n_segment = len(root.findall(".//segment"))
+    # Orbital elements are collected column-wise in batches
+    mds = []
+    batch = OrbelemBatch()
+
+    # Progress output at most every args.progress seconds
+    progress = Progress(args.progress, unit="segments") if args.verbose else None
+
+    # Now, loop over all segments
     i = 1
-    t_start = datetime.now()
-    for segment in root.findall(".//segment"):
+    for segment in reader.segments():
+
+        if skip is not None and skip[i - 1]:
+            writer.n_skipped += 1
+            i += 1
+            continue
+
+        t_start = time.perf_counter()
 
         # Extract all data needed for the database table "metadata"
         md = OMMMetadata()
         md.from_omm(segment)
 
         # Extract all data needed for the database table "orbelem"
-        od = OMMOrbelem()
-        od.from_omm(segment, root)
-
-        if args.verbose:
-            eta = (datetime.now() - t_start).seconds * (n_segment - i)/i
-            if eta > 60:
-                eta = round(eta/60., 1)
-                eta_units = " min"
-            else:
-                eta = int(eta)
-                eta_units = " sec"
-            ttprint("[" + str(i) + "/" + str(n_segment) + "] Processing "
-                    + md.obj_id + " (" + md.name + "), ETA: " + str(eta)
-                    + eta_units)
-
-        # Write metadata and orbital elements to database
-        md.to_db(dbc)
-        od.to_db(dbc)
+        batch.append_omm(segment, reader.header)
+        timer.add("build", time.perf_counter() - t_start, 1)
+
+        if progress is not None:
+            # The ETA is estimated from the fraction of the file read so far
+            progress.update(i, reader.progress(), "processing " + str(md.obj_id)
+                    + " (" + str(md.name) + ")")
+
+        # Queue metadata and orbital elements for writing to database
+        mds.append(md)
+        if batch.n >= args.batch_size:
+            writer.add_chunk(mds, batch)
+            mds = []
+            batch = OrbelemBatch()
 
         i += 1
 
+    reader.close()
+
+    # Write remaining records to database
+    writer.add_chunk(mds, batch)
+    writer.flush()
+    ttprint(writer.summary())
+    for line in timer.report():
+        ttprint(line)
+
+    if manifest:
+        add_to_manifest(dbc, digest, args.ommfile, i - 1)
+
+    # Record the newest creation date of the imported element sets for the
+    # next st_dl_latest.py --delta download
+    if args.watermark:
+        advance_watermark(dbc, GP_WATERMARK_JOB, writer.watermark())
+        ttprint("Watermark: " + str(writer.watermark()))
+
+    # Machine-readable summary for monitoring
+    if args.stats is not None:
+        ttprint("Writing summary to " + args.stats)
+        write_summary(args.stats, timer.summary(os.path.basename(__file__),
+            writer.counters()))
+
     # Disconnect database
     ttprint("Disconnecting from database")
     dbc.disconnect()
@@ -71,7 +142,22 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("config", help="Config file")
     parser.add_argument("ommfile", help="OMM file")
-    parser.add_argument("--verbose", help="increase output verbosity",
+    parser.add_argument("--batch-size", dest="batch_size",
+            help="number of rows written per transaction (default: 1000)",
+            type=int, default=1000)
+    parser.add_argument("--force",
+            help="import the file even if it is in the manifest and do not skip known element sets",
+            action="store_true")
+    parser.add_argument("--watermark",
+            help="record the watermark for st_dl_latest.py --delta (use for files of st_dl_latest.py)",
+            action="store_true")
+    parser.add_argument("--stats",
+            help="write a summary of the run to this file (Prometheus text format for *.prom, else JSON)",
+            type=str)
+    parser.add_argument("--progress",
+            help="seconds between the progress lines with --verbose (default: 10)",
+            type=float, default=10.)
+    parser.add_argument("--verbose", help="show the progress of the import",
             action="store_true")
     args = parser.parse_args()
     main(args)
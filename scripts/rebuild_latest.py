@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+import argparse
+from datetime import datetime
+import os
+
+from satdb import DBConfig, Dbase, rebuild_latest
+from satdb.tools import ttprint
+
+#------------------------------------------------------------------------------
+# Main routine
+def main(args):
+
+    ttprint("Executing " + os.path.basename(__file__))
+
+    # Read the config file
+    ttprint("Reading config file " + args.config)
+    config = DBConfig(args.config)
+
+    # Connect to the database
+    ttprint("Connecting to database")
+    dbc = Dbase(config)
+    dbc.connect()
+
+    ttprint("Rebuilding tables orbelem_latest and metadata_latest")
+    t_start = datetime.now()
+    rebuild_latest(dbc)
+    n = dbc.fetchone("select count(*) from orbelem_latest")[0]
+    dt = (datetime.now() - t_start).total_seconds()
+    ttprint(str(n) + " objects in " + str(round(dt, 1)) + " sec")
+
+    # Disconnect database
+    ttprint("Disconnecting from database")
+    dbc.disconnect()
+
+    ttprint("Finished")
+
+###############################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("config", help="Config file")
+    args = parser.parse_args()
+    main(args)
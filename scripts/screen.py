@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+from datetime import datetime, timedelta
+import multiprocessing
+import os
+
+import numpy as np
+from satdb import DBConfig, Dbase, Progress, fetch_names
+from satdb.screening import (BLOCK_STEPS, CONJUNCTION_COLUMNS, SCREEN_STEP,
+        SCREEN_THRESHOLD, screen, screening_elements, write_conjunctions)
+from satdb.tools import ttprint
+
+# Write the conjunctions to a CSV file
+def write_csv(filename, events):
+    columns = CONJUNCTION_COLUMNS[:-1]
+    with open(filename, "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(columns)
+        for row in zip(*(events[col].tolist() for col in columns)):
+            writer.writerow(row)
+
+#------------------------------------------------------------------------------
+# Main routine
+def main(args):
+
+    ttprint("Executing " + os.path.basename(__file__))
+
+    # Start of the screening, default: now
+    if args.start is not None:
+        try:
+            start = datetime.fromisoformat(args.start)
+        except ValueError:
+            ttprint("Cannot convert \"" + args.start + "\" to datetime object. Exiting")
+            exit()
+    else:
+        start = datetime.utcnow().replace(second=0, microsecond=0)
+    end = start + timedelta(hours=args.hours)
+
+    epoch = None
+    if args.epoch is not None:
+        try:
+            epoch = datetime.fromisoformat(args.epoch)
+        except ValueError:
+            ttprint("Cannot convert \"" + args.epoch + "\" to datetime object. Exiting")
+            exit()
+
+    # Read the config file
+    ttprint("Reading config file " + args.config)
+    config = DBConfig(args.config)
+
+    # Connect to the database
+    ttprint("Connecting to database")
+    dbc = Dbase(config)
+    dbc.connect()
+
+    if epoch is None:
+        ttprint("Fetching the latest element sets")
+    else:
+        ttprint("Fetching the element sets nearest to " + str(epoch))
+    elements = screening_elements(dbc, epoch)
+    ttprint(str(len(elements["norad"])) + " element sets")
+
+    ttprint("Screening " + str(start) + " to " + str(end) + " for approaches"
+            + " closer than " + str(args.threshold) + " km with "
+            + str(args.workers) + " worker processes")
+    progress = None
+    if args.verbose:
+        reporter = Progress(args.progress, unit="blocks")
+        progress = lambda done, total: reporter.update(done, done / total)
+    t_start = datetime.now()
+    events, counters = screen(elements, start, end, threshold=args.threshold,
+            step=args.step, primaries=args.norad, workers=args.workers,
+            block_steps=args.block_steps, progress=progress)
+    dt = (datetime.now() - t_start).total_seconds()
+    ttprint(str(counters["objects_screened"]) + " of " + str(counters["objects"])
+            + " objects passed the apogee/perigee filter, "
+            + str(counters["candidates"]) + " candidate pairs refined")
+    ttprint(str(counters["conjunctions"]) + " conjunctions found in "
+            + str(round(dt, 1)) + " sec")
+
+    # Closest approaches
+    order = np.argsort(events["miss_distance"], kind="stable")[:args.top]
+    if len(order) > 0:
+        names = fetch_names(dbc, sorted(set(events["norad1"][order].tolist()
+            + events["norad2"][order].tolist())))
+        for k in order:
+            pair = []
+            for col in ("norad1", "norad2"):
+                norad = int(events[col][k])
+                pair.append(str(norad) + " " + str(names.get(norad, ("",))[0]).strip())
+            ttprint(str(events["tca"][k].astype('datetime64[ms]')) + "  "
+                    + ("%.3f km" % events["miss_distance"][k]).rjust(10) + "  "
+                    + ("%.2f km/s" % events["rel_velocity"][k]).rjust(11) + "  "
+                    + pair[0] + " / " + pair[1])
+
+    if args.csv:
+        ttprint("Writing conjunctions to " + args.csv)
+        write_csv(args.csv, events)
+
+    if args.dry_run:
+        ttprint("Dry run, database not updated")
+    else:
+        n = write_conjunctions(dbc, events, start, end, primaries=args.norad)
+        ttprint(str(n) + " conjunctions written to table conjunction")
+
+    # Disconnect database
+    ttprint("Disconnecting from database")
+    dbc.disconnect()
+
+    ttprint("Finished")
+
+###############################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("config", help="Config file")
+    parser.add_argument("--start", "-s",
+            help="Start of the screening (YYYY-MM-DD[THH:MM:SS] UTC), default: now",
+            type=str)
+    parser.add_argument("--hours", help="hours screened (default: 24)",
+            type=float, default=24.)
+    parser.add_argument("--threshold", "-t",
+            help="report approaches closer than this distance in km (default: "
+            + str(SCREEN_THRESHOLD) + ")", type=float, default=SCREEN_THRESHOLD)
+    parser.add_argument("--step",
+            help="seconds between the time steps of the coarse search (default: "
+            + str(SCREEN_STEP) + ")", type=float, default=SCREEN_STEP)
+    parser.add_argument("--epoch", "-e",
+            help="use the element sets nearest to this epoch (default: latest element sets)",
+            type=str)
+    parser.add_argument("--norad", "-n", nargs="+", type=int,
+            help="screen only these objects against the catalog (default: all vs. all)")
+    parser.add_argument("--workers", "-w", type=int,
+            default=multiprocessing.cpu_count(),
+            help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--block-steps", dest="block_steps", type=int,
+            default=BLOCK_STEPS,
+            help="time steps screened per task (default: " + str(BLOCK_STEPS) + ")")
+    parser.add_argument("--top", type=int, default=20,
+            help="number of closest approaches listed (default: 20)")
+    parser.add_argument("--csv", help="write the conjunctions to this CSV file")
+    parser.add_argument("--dry-run", dest="dry_run", action="store_true",
+            help="do not write the conjunctions to the database")
+    parser.add_argument("--progress", type=float, default=10.,
+            help="seconds between the progress lines with --verbose (default: 10)")
+    parser.add_argument("--verbose", help="show the progress of the screening",
+            action="store_true")
+    args = parser.parse_args()
+    main(args)
@@ -2,9 +2,12 @@
 
 import argparse
 from spacetrack import SpaceTrackClient
-from satdb import STConfig
+import spacetrack.operators as op
+from satdb import STConfig, DBConfig, Dbase, BatchWriter, OMMStreamImporter
+from satdb.jobstate import GP_WATERMARK_JOB, advance_watermark, get_watermark
 from satdb.tools import ttprint
 from datetime import datetime
+import os
 import os.path
 import gzip
 
@@ -28,28 +31,90 @@ def main(args):
     else:
         ttprint("Output directory " + args.outdir + " exists")
 
+    # The database is needed for the watermark of the delta mode and for
+    # the import while downloading
+    dbc = None
+    if args.delta or args.db:
+        ttprint("Connecting to database")
+        dbc = Dbase(DBConfig(args.config))
+        dbc.connect()
+
+    # In delta mode only element sets created after the newest imported
+    # element set are requested
+    predicates = {}
+    if args.delta:
+        watermark = get_watermark(dbc, GP_WATERMARK_JOB)
+        if watermark is None:
+            ttprint("No watermark in database, downloading full catalog")
+        else:
+            ttprint("Downloading element sets created after " + str(watermark))
+            predicates["creation_date"] = op.greater_than(watermark)
+
+    writer = None
+    importer = None
+    if args.db:
+        writer = BatchWriter(dbc, batch_size=args.batch_size)
+        importer = OMMStreamImporter(writer, chunk_size=args.batch_size)
+
     # Login to space-track and download data
     try:
-        st = SpaceTrackClient(config.user, config.password)
+        st = SpaceTrackClient(config.user, config.password,
+                base_url=config.base_url)
     except:
         ttprint("Error connecting to Space-Track. Exiting.")
         exit()
     else:
         ttprint("Downloading OMM from space-track.org")
-        xml = st.gp(decay_date=None,
+        data = st.gp(decay_date=None,
             orderby=['norad_cat_id', 'epoch desc'],
-            format='xml')
+            format='xml',
+            iter_content=True,
+            **predicates)
         outfilename = args.outdir + nowstr + ".xml.gz"
+        nbytes = 0
         with gzip.open(outfilename, 'wt') as outfile:
-            outfile.write(xml)
-        outfile.close()
-        ttprint("Downloaded file: " + outfilename)
-        ttprint("Finished")
+            for chunk in data:
+                outfile.write(chunk)
+                nbytes += len(chunk.strip())
+                if importer is not None:
+                    importer.feed(chunk)
+
+        if nbytes == 0:
+            # Nothing new since the last download
+            os.remove(outfilename)
+            ttprint("No new element sets")
+        else:
+            ttprint("Downloaded file: " + outfilename)
+
+        # All records are committed, now the watermark can be moved
+        if importer is not None and nbytes > 0:
+            n = importer.close()
+            ttprint(str(n) + " segments imported")
+            if n == 0:
+                os.remove(outfilename)
+            ttprint(writer.summary())
+            advance_watermark(dbc, GP_WATERMARK_JOB, writer.watermark())
+            ttprint("Watermark: " + str(get_watermark(dbc, GP_WATERMARK_JOB)))
+
+    if dbc is not None:
+        ttprint("Disconnecting from database")
+        dbc.disconnect()
+
+    ttprint("Finished")
 
 ###############################################################################
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("config", help="Config file")
     parser.add_argument("outdir", help="Output directory for OMM file")
+    parser.add_argument("--delta",
+            help="only download element sets created after the last import",
+            action="store_true")
+    parser.add_argument("--db",
+            help="import into the database while downloading, OUTDIR keeps the archive (e.g. data/processed)",
+            action="store_true")
+    parser.add_argument("--batch-size", dest="batch_size",
+            help="number of rows written per transaction with --db (default: 1000)",
+            type=int, default=1000)
     args = parser.parse_args()
     main(args)
@@ -2,82 +2,52 @@
 
 import argparse
 
-#from spacetrack import SpaceTrackClient
-import spacetrack.operators as op
-from spacetrack.aio import AsyncSpaceTrackClient
 import asyncio
 
-from satdb import STConfig
+from satdb import BatchWriter, DBConfig, Dbase, STConfig
+from satdb.download import DownloadJournal, RateLimiter, download_history, history_tasks
 from satdb.tools import ttprint
 
 from datetime import date, datetime
 import os.path
-import gzip
-
-VERBOSE = False
-
-async def st_download(config, filename, norad, epoch_from, epoch_to):
-    # Login to space-track and download data
-    try:
-        st = AsyncSpaceTrackClient(
-            config.user,
-            config.password
-            )
-    except:
-        ttprint("Error connecting to Space-Track. Exiting.")
-        exit()
-    else:
-        # Read chunks of 100kB, see:
-        # https://spacetrack.readthedocs.io/en/latest/usage.html#streaming-downloads
-        ttprint("Downloading OMM from space-track.org")
-        async with st:
-            data = await st.gp_history(
-                iter_content=True,
-                norad_cat_id=norad,
-                epoch=op.inclusive_range(epoch_from, epoch_to),
-                #epoch='2017-07-14--2020-12-31',
-                format='xml',
-                )
-
-            with gzip.open(filename, 'wt') as fp:
-                nlines=1
-                async for line in data:
-                    fp.write(line)
-                    if VERBOSE:
-                        ttprint("  Write chunk " + str(nlines) + " ...")
-                    nlines += 1
-        ttprint("Downloaded file: " + filename)
 
 def main(args):
 
     ttprint("Executing " + os.path.basename(__file__))
 
-    # Current UTC date/time as string for the output filename
+    # Current UTC date/time as string for the output filenames
     nowstr = datetime.utcnow().strftime("%Y%m%d%H%M%S")
 
-    # Update global variable VERBOSE, if necessary
-    if args.verbose:
-        global VERBOSE
-        VERBOSE = True
-
     # Read the config file
     ttprint("Reading config file " + args.config)
     config = STConfig(args.config)
 
     # Check if output folder exists
-    if not args.outdir.endswith('/'):
-        args.outdir = args.outdir + '/'
     if not os.path.isdir(args.outdir):
         ttprint("Output directory doesn't exist. Exiting.")
         exit()
     else:
         ttprint("Output directory " + args.outdir + " exists")
 
+    # Collect the NORAD IDs from the command line and the NORAD file (one ID
+    # per line, lines starting with # are ignored)
+    norads = list(args.norad)
+    if args.norad_file is not None:
+        with open(args.norad_file, "r") as fh:
+            for line in fh:
+                line = line.strip()
+                if line != "" and not line.startswith("#"):
+                    norads.append(int(line))
+    norads = sorted(set(norads))
+    if len(norads) == 0:
+        ttprint("No NORAD IDs given. Exiting")
+        exit()
+
     # Try to convert the command line arguments from and to to valid dates
     try:
         epoch_from = date.fromisoformat(args.epoch_from)
     except:
-        ttprint("Cannot convert \"" + args.epoch_from + "\" to date object. Exiting")
+        ttprint("Cannot convert \"" + str(args.epoch_from) + "\" to date object. Exiting")
         exit()
     else:
         pass
@@ -85,7 +55,7 @@ def main(args):
     try:
         epoch_to = date.fromisoformat(args.epoch_to)
     except:
-        ttprint("Cannot convert \"" + args.epoch_to + "\" to date object. Exiting")
+        ttprint("Cannot convert \"" + str(args.epoch_to) + "\" to date object. Exiting")
         exit()
     else:
         pass
@@ -95,21 +65,45 @@ def main(args):
         ttprint("Empty or negative epoch range. Exiting")
         exit()
 
-    filename = (
-        args.outdir +
-        nowstr +
-        "_" +
-        str(args.norad) +
-        ".xml.gz"
-        )
+    # Split the objects and the epoch range into download tasks
+    tasks = history_tasks(norads, epoch_from, epoch_to,
+            chunk_days=args.chunk_days, group_size=args.group_size)
+    ttprint(str(len(norads)) + " objects, " + str(len(tasks)) + " download tasks")
+
+    # Finished tasks are recorded in the journal. Running the script again
+    # with the same arguments continues an interrupted download
+    journal_file = args.journal
+    if journal_file is None:
+        journal_file = os.path.join(args.outdir, ".st_dl_objhist.journal")
+    journal = DownloadJournal(journal_file)
+    ttprint("Using journal " + journal_file)
+
+    limiter = RateLimiter((args.rate, 60), (args.rate_hour, 3600))
+
+    # In pipeline mode the downloaded data is imported into the database
+    # right away and the files in the output directory are the archive
+    writer = None
+    if args.db:
+        ttprint("Connecting to database")
+        dbc = Dbase(DBConfig(args.config))
+        dbc.connect()
+        writer = BatchWriter(dbc, batch_size=args.batch_size)
 
     loop = asyncio.get_event_loop()
-    loop.run_until_complete(st_download(config,
-        filename,
-        args.norad,
-        epoch_from,
-        epoch_to,
-        ))
+    n_downloaded, n_skipped, n_failed = loop.run_until_complete(
+        download_history(config, tasks, args.outdir, nowstr, journal,
+            concurrency=args.concurrency, limiter=limiter,
+            verbose=args.verbose, writer=writer))
+
+    ttprint(str(n_downloaded) + " downloaded, " + str(n_skipped)
+            + " already in journal, " + str(n_failed) + " failed")
+    if n_failed > 0:
+        ttprint("Run again with the same arguments to retry the failed downloads")
+
+    if writer is not None:
+        ttprint(writer.summary())
+        ttprint("Disconnecting from database")
+        dbc.disconnect()
 
     ttprint("Finished")
 
@@ -117,14 +111,42 @@ def main(args):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("config", help="Config file")
-    parser.add_argument("outdir", help="Output directory for OMM file")
-    parser.add_argument("norad", help="NORAD Catalogue ID of object", type=int)
+    parser.add_argument("outdir", help="Output directory for OMM files")
+    parser.add_argument("norad", help="NORAD Catalogue IDs of objects",
+        type=int, nargs="*")
+    parser.add_argument("--norad-file", dest="norad_file",
+        help="File with NORAD Catalogue IDs, one per line",
+        type=str)
     parser.add_argument("--from", "-f", dest="epoch_from",
         help="Lower boundary for epoch range (YYYY-MM-DD)",
         type=str)
     parser.add_argument("--to", "-to", dest="epoch_to",
         help="Upper boundary for epoch range (YYYY-MM-DD",
         type=str)
+    parser.add_argument("--chunk-days", dest="chunk_days",
+        help="split the epoch range into chunks of days (default: 365)",
+        type=int, default=365)
+    parser.add_argument("--group-size", dest="group_size",
+        help="number of objects per request (default: 1)",
+        type=int, default=1)
+    parser.add_argument("--concurrency", "-j",
+        help="number of concurrent downloads (default: 4)",
+        type=int, default=4)
+    parser.add_argument("--rate",
+        help="max. number of requests per minute (default: 20)",
+        type=int, default=20)
+    parser.add_argument("--rate-hour", dest="rate_hour",
+        help="max. number of requests per hour (default: 250)",
+        type=int, default=250)
+    parser.add_argument("--journal",
+        help="journal file of finished downloads (default: OUTDIR/.st_dl_objhist.journal)",
+        type=str)
+    parser.add_argument("--db",
+        help="import into the database while downloading, OUTDIR keeps the archive (e.g. data/processed)",
+        action="store_true")
+    parser.add_argument("--batch-size", dest="batch_size",
+        help="number of rows written per transaction with --db (default: 1000)",
+        type=int, default=1000)
     parser.add_argument("--verbose", help="increase output verbosity",
             action="store_true")
     args = parser.parse_args()
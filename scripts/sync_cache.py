@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+import argparse
+from datetime import datetime
+import os
+
+from satdb import DBConfig, Dbase, LocalCache
+from satdb.tools import ttprint
+
+#------------------------------------------------------------------------------
+# Main routine
+def main(args):
+
+    ttprint("Executing " + os.path.basename(__file__))
+
+    # Read the config file
+    ttprint("Reading config file " + args.config)
+    config = DBConfig(args.config)
+
+    # Connect to the database
+    ttprint("Connecting to database")
+    dbc = Dbase(config)
+    dbc.connect()
+
+    cache = LocalCache(args.cachedir)
+    state = cache.state()
+    if state["orbelem"] is None:
+        ttprint("Initial sync of local cache " + args.cachedir)
+    else:
+        ttprint("Syncing rows created since " + state["orbelem"])
+
+    t_start = datetime.now()
+    n = cache.sync(dbc, chunk_size=args.chunk_size)
+    dt = (datetime.now() - t_start).total_seconds()
+    ttprint(str(n) + " element sets synced in " + str(round(dt, 1)) + " sec")
+
+    # Disconnect database
+    ttprint("Disconnecting from database")
+    dbc.disconnect()
+
+    ttprint("Finished")
+
+###############################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("config", help="Config file")
+    parser.add_argument("cachedir", help="Directory of the local cache")
+    parser.add_argument("--chunk-size", dest="chunk_size",
+            help="number of rows fetched per round trip (default: 10000)",
+            type=int, default=10000)
+    args = parser.parse_args()
+    main(args)
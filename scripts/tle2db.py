@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 
 import argparse
-from tletools import TLE
-from datetime import datetime, timedelta
 import os
 
-from satdb import DBConfig, Dbase, OMMMetadata, OMMOrbelem, tools
+from satdb import DBConfig, Dbase, OMMMetadata, OrbelemBatch, BatchWriter, tools
+from satdb.ingest import write_quarantine
+from satdb.keyfilter import KeyFilter
+from satdb.manifest import add_to_manifest, file_digest, has_manifest, in_manifest
+from satdb.stats import Progress, StageTimer, write_summary
+from satdb.tlecodec import iter_tle_blocks
 from satdb.tools import ttprint
 
 def main(args):
@@ -21,49 +24,92 @@ def main(args):
     dbc = Dbase(config)
     dbc.connect()
 
-    # Open the TLE file
+    # Time and number of items per stage of the import
+    timer = StageTimer()
+
+    # Files in the manifest were imported before
+    manifest = has_manifest(dbc) and not args.force
+    if manifest:
+        digest = file_digest(args.tlefile)
+        if in_manifest(dbc, digest):
+            ttprint("File " + args.tlefile + " was imported before. Exiting")
+            if args.stats is not None:
+                write_summary(args.stats, timer.summary(
+                    os.path.basename(__file__), {"files_skipped": 1}))
+            dbc.disconnect()
+            return
+
+    # Records are written to the database in batches. Element sets already
+    # stored are skipped, unless forced
+    keyfilter = None if args.force else KeyFilter(dbc)
+    writer = BatchWriter(dbc, batch_size=args.batch_size, keyfilter=keyfilter,
+            timer=timer)
+
+    # Progress output at most every args.progress seconds
+    progress = Progress(args.progress, unit="TLEs") if args.verbose else None
+
+    # Read and decode the TLE file in blocks of batch size records
     ttprint("Reading TLE file " + args.tlefile)
     fh = tools.open_file(args.tlefile)
-    all_lines = fh.readlines()
-    fh.close
-
-    # Total number of TLEs in file
-    n_tle = int(len(all_lines)/3)
-
-    # Read three consecutive lines and process as TLE
-    i = 1
-    t_start = datetime.now()
-    tle_lines = []
-    for line in all_lines:
-        tle_lines.append(line.rstrip())
-
-        if len(tle_lines) == 3:
-            # Metadata
-            md = OMMMetadata()
-            md.from_tle(tle_lines)
-            md.to_db(dbc)
-
-            if args.verbose:
-                eta = (datetime.now() - t_start).seconds * (n_tle - i)/i
-                if eta > 60:
-                    eta = round(eta/60., 1)
-                    eta_units = " min"
-                else:
-                    eta = int(eta)
-                    eta_units = " sec"
-                ttprint("[" + str(i) + "/" + str(n_tle) + "] Processing "
-                        + md.obj_id + " (" + md.name + "), ETA: " + str(eta)
-                        + eta_units)
-
-            # Mean orbital elements
-            od = OMMOrbelem()
-            od.from_tle(tle_lines)
-            od.to_db(dbc)
-
-            # Empty tle_lines
-            tle_lines = []
-
-            i += 1
+    blocks = iter_tle_blocks(fh, args.batch_size)
+    n_read = 0
+    n_rejected = 0
+    while True:
+        with timer.stage("parse"):
+            block = next(blocks, None)
+        if block is None:
+            break
+        timer.add("parse", 0., block.n + len(block.rejected))
+        n_read += block.n
+
+        # Invalid TLEs are written to the quarantine file, if given
+        if len(block.rejected) > 0:
+            n_rejected += len(block.rejected)
+            if args.quarantine is not None:
+                write_quarantine(args.quarantine, block.rejected, args.tlefile)
+        if block.n == 0:
+            continue
+
+        # Metadata and mean orbital elements of the decoded TLEs
+        with timer.stage("build", block.n):
+            mds = []
+            for rec in block.records():
+                md = OMMMetadata()
+                md.set(**rec)
+                mds.append(md)
+            batch = OrbelemBatch()
+            batch.from_tleblock(block)
+        writer.add_chunk(mds, batch)
+
+        if progress is not None and len(mds) > 0:
+            progress.update(n_read, message="processing " + str(mds[-1].obj_id)
+                    + " (" + str(mds[-1].name) + ")")
+    fh.close()
+
+    if n_rejected > 0:
+        ttprint(str(n_rejected) + " invalid TLE records skipped")
+        if args.quarantine is not None:
+            ttprint("Invalid TLE records written to " + args.quarantine)
+    if keyfilter is not None:
+        ttprint(str(writer.n_skipped) + " of " + str(n_read)
+                + " TLEs already in database")
+
+    # Write remaining records to database
+    writer.flush()
+    ttprint(writer.summary())
+    for line in timer.report():
+        ttprint(line)
+
+    if manifest:
+        add_to_manifest(dbc, digest, args.tlefile, n_read)
+
+    # Machine-readable summary for monitoring
+    if args.stats is not None:
+        counters = writer.counters()
+        counters["tles_rejected"] = n_rejected
+        ttprint("Writing summary to " + args.stats)
+        write_summary(args.stats, timer.summary(os.path.basename(__file__),
+            counters))
 
     # Disconnect database
     ttprint("Disconnecting from database")
@@ -76,7 +122,21 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("config", help="Config file")
     parser.add_argument("tlefile", help="TLE file")
-    parser.add_argument("--verbose", help="increase output verbosity",
+    parser.add_argument("--batch-size", dest="batch_size",
+            help="number of rows written per transaction (default: 1000)",
+            type=int, default=1000)
+    parser.add_argument("--force",
+            help="import the file even if it is in the manifest and do not skip known TLEs",
+            action="store_true")
+    parser.add_argument("--quarantine",
+            help="file to append invalid TLE records to", type=str)
+    parser.add_argument("--stats",
+            help="write a summary of the run to this file (Prometheus text format for *.prom, else JSON)",
+            type=str)
+    parser.add_argument("--progress",
+            help="seconds between the progress lines with --verbose (default: 10)",
+            type=float, default=10.)
+    parser.add_argument("--verbose", help="show the progress of the import",
             action="store_true")
     args = parser.parse_args()
     main(args)
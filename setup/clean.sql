@@ -0,0 +1,22 @@
+-- Tables for the cleaned orbital element series (see clean_orbelem.py) and
+-- the state of incremental jobs. Run this file once to add the tables to an
+-- existing database
+
+CREATE TABLE `orbelem_clean` (
+  `norad` int(10) unsigned NOT NULL,
+  `epoch` datetime NOT NULL,
+  `semimajor_axis` double DEFAULT NULL,
+  `mean_motion` double DEFAULT NULL,
+  `eccentricity` double DEFAULT NULL,
+  `inclination` double DEFAULT NULL,
+  `flags` tinyint(3) unsigned DEFAULT '0',
+  `created` datetime DEFAULT NULL,
+  PRIMARY KEY (`norad`,`epoch`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE `jobstate` (
+  `job` varchar(50) NOT NULL,
+  `watermark` datetime DEFAULT NULL,
+  `updated` datetime DEFAULT NULL,
+  PRIMARY KEY (`job`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
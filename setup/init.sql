@@ -47,3 +47,93 @@ CREATE TABLE `orbelem` (
   `created` datetime DEFAULT NULL,
   PRIMARY KEY (`norad`,`epoch`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE `metadata_latest` (
+  `norad` int(10) unsigned NOT NULL,
+  `epoch` datetime NOT NULL,
+  `obj_id` varchar(20) DEFAULT NULL,
+  `id_short` varchar(20) DEFAULT NULL,
+  `name` varchar(100) DEFAULT NULL,
+  `center_name` varchar(10) DEFAULT NULL,
+  `ref_frame` varchar(20) DEFAULT NULL,
+  `mean_element_theory` varchar(20) DEFAULT NULL,
+  `classification_type` char(1) DEFAULT NULL,
+  `obj_type` varchar(20) DEFAULT NULL,
+  `rcs_size` varchar(20) DEFAULT NULL,
+  `country_code` varchar(4) DEFAULT NULL,
+  `launch_date` datetime DEFAULT NULL,
+  `site` varchar(20) DEFAULT NULL,
+  `decay_date` datetime DEFAULT NULL,
+  `created` datetime DEFAULT NULL,
+  PRIMARY KEY (`norad`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE `orbelem_latest` (
+  `norad` int(10) unsigned NOT NULL,
+  `epoch` datetime NOT NULL,
+  `mean_motion` double DEFAULT '0',
+  `eccentricity` double DEFAULT '0',
+  `inclination` double DEFAULT '0',
+  `raan` double DEFAULT '0',
+  `arg_of_pericenter` double DEFAULT '0',
+  `mean_anomaly` double DEFAULT '0',
+  `ephemeris_type` tinyint(3) unsigned DEFAULT '0',
+  `classification_type` char(1) DEFAULT NULL,
+  `element_set_no` smallint(5) unsigned DEFAULT '0',
+  `rev_at_epoch` float DEFAULT '0',
+  `bstar` double DEFAULT '0',
+  `mean_motion_dot` double DEFAULT '0',
+  `mean_motion_ddot` double DEFAULT '0',
+  `tle_line0` char(30) DEFAULT NULL,
+  `tle_line1` char(71) DEFAULT NULL,
+  `tle_line2` char(71) DEFAULT NULL,
+  `semimajor_axis` double(20,3) DEFAULT '0.000',
+  `period` double(20,3) DEFAULT NULL,
+  `apoapsis` double(20,3) DEFAULT '0.000',
+  `periapsis` double(20,3) DEFAULT '0.000',
+  `originator` varchar(20) DEFAULT NULL,
+  `data_created` datetime DEFAULT NULL,
+  `originator_comment` varchar(50) DEFAULT NULL,
+  `created` datetime DEFAULT NULL,
+  PRIMARY KEY (`norad`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE `orbelem_clean` (
+  `norad` int(10) unsigned NOT NULL,
+  `epoch` datetime NOT NULL,
+  `semimajor_axis` double DEFAULT NULL,
+  `mean_motion` double DEFAULT NULL,
+  `eccentricity` double DEFAULT NULL,
+  `inclination` double DEFAULT NULL,
+  `flags` tinyint(3) unsigned DEFAULT '0',
+  `created` datetime DEFAULT NULL,
+  PRIMARY KEY (`norad`,`epoch`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE `jobstate` (
+  `job` varchar(50) NOT NULL,
+  `watermark` datetime DEFAULT NULL,
+  `updated` datetime DEFAULT NULL,
+  PRIMARY KEY (`job`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE `imported_files` (
+  `digest` char(64) NOT NULL,
+  `filename` varchar(255) DEFAULT NULL,
+  `n_records` int(10) unsigned DEFAULT NULL,
+  `imported` datetime DEFAULT NULL,
+  PRIMARY KEY (`digest`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE `conjunction` (
+  `norad1` int(10) unsigned NOT NULL,
+  `norad2` int(10) unsigned NOT NULL,
+  `tca` datetime NOT NULL,
+  `miss_distance` double DEFAULT NULL,
+  `rel_velocity` double DEFAULT NULL,
+  `epoch1` datetime DEFAULT NULL,
+  `epoch2` datetime DEFAULT NULL,
+  `created` datetime DEFAULT NULL,
+  PRIMARY KEY (`norad1`,`norad2`,`tca`),
+  KEY `idx_conjunction_tca` (`tca`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,10 @@
+-- Table of the imported files (content hash). Run this file once to add the
+-- table to an existing database
+
+CREATE TABLE `imported_files` (
+  `digest` char(64) NOT NULL,
+  `filename` varchar(255) DEFAULT NULL,
+  `n_records` int(10) unsigned DEFAULT NULL,
+  `imported` datetime DEFAULT NULL,
+  PRIMARY KEY (`digest`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,15 @@
+-- Table of the close approaches found by the screening (see screen.py). Run
+-- this file once to add the table to an existing database
+
+CREATE TABLE `conjunction` (
+  `norad1` int(10) unsigned NOT NULL,
+  `norad2` int(10) unsigned NOT NULL,
+  `tca` datetime NOT NULL,
+  `miss_distance` double DEFAULT NULL,
+  `rel_velocity` double DEFAULT NULL,
+  `epoch1` datetime DEFAULT NULL,
+  `epoch2` datetime DEFAULT NULL,
+  `created` datetime DEFAULT NULL,
+  PRIMARY KEY (`norad1`,`norad2`,`tca`),
+  KEY `idx_conjunction_tca` (`tca`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The tests use the satdb library, the scripts and the generators of
+# synthetic catalogs of the benchmarks
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lib"))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+sys.path.insert(0, os.path.join(ROOT, "bench"))
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+import pytest
+from satdb import DBConfig, Dbase, BatchWriter, cleaning, ingest
+from synthetic import SyntheticCatalog, epoch_grid, write_3le
+
+@pytest.fixture
+def dbc(tmp_path):
+    config = tmp_path / "satdb.yaml"
+    config.write_text("satdb:\n    backend: \"sqlite\"\n"
+            + "    path: \"" + str(tmp_path / "satdb.sqlite") + "\"\n")
+    dbc = Dbase(DBConfig(str(config)))
+    dbc.connect()
+    yield dbc
+    dbc.disconnect()
+
+def _fail(dbc, series, boxhw, nsigma):
+    raise RuntimeError("batch failed")
+
+def test_failed_full_run_keeps_table(dbc, tmp_path, monkeypatch):
+    filename = str(tmp_path / "catalog.tle")
+    write_3le(filename, SyntheticCatalog(20, seed=1),
+            epoch_grid(datetime(2021, 1, 1), 30))
+    writer = BatchWriter(dbc)
+    for mds, batch in ingest.parse_file(filename):
+        writer.add_chunk(mds, batch)
+    writer.flush()
+
+    cleaning.clean_orbelem(dbc, full=True, batch_size=5)
+    n_clean = dbc.fetchone("select count(*) from orbelem_clean")[0]
+    assert n_clean == dbc.fetchone("select count(*) from orbelem")[0]
+
+    # The delete of the full run is rolled back with the failed first batch
+    monkeypatch.setattr(cleaning, "_clean_series", _fail)
+    with pytest.raises(RuntimeError):
+        cleaning.clean_orbelem(dbc, full=True, batch_size=5)
+    assert dbc.fetchone("select count(*) from orbelem_clean")[0] == n_clean
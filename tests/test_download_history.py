@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime
+import os
+import threading
+
+import pytest
+from satdb import DBConfig, Dbase, BatchWriter
+from satdb.download import HistoryTask, _download_task
+from synthetic import SyntheticCatalog, epoch_grid, write_omm
+
+@pytest.fixture
+def dbc(tmp_path):
+    config = tmp_path / "satdb.yaml"
+    config.write_text("satdb:\n    backend: \"sqlite\"\n"
+            + "    path: \"" + str(tmp_path / "satdb.sqlite") + "\"\n")
+    dbc = Dbase(DBConfig(str(config)))
+    dbc.connect()
+    yield dbc
+    dbc.disconnect()
+
+#------------------------------------------------------------------------------
+# Stand-in for the AsyncSpaceTrackClient: gp_history() returns the documents
+# of the objects in pieces. The download of the objects in fail breaks off
+# near the end of the document. Before each piece, the number of rows in
+# orbelem is recorded in counts
+class _Client:
+    def __init__(self, dbc, lock, documents, fail=()):
+        self.dbc = dbc
+        self.lock = lock
+        self.documents = documents
+        self.fail = fail
+        self.counts = []
+
+    async def gp_history(self, norad_cat_id, **kwargs):
+        text = self.documents[norad_cat_id]
+        fail = norad_cat_id in self.fail
+
+        async def pieces():
+            size = 20000
+            for i in range(0, len(text), size):
+                if fail and i >= len(text) * 9 // 10:
+                    raise IOError("connection reset")
+                with self.lock:
+                    self.counts.append(
+                            self.dbc.fetchone("select count(*) from orbelem")[0])
+                yield text[i:i + size]
+                await asyncio.sleep(0)
+        return pieces()
+
+def _run(st, tasks, tmp_path, writer, lock):
+    async def run():
+        return await asyncio.gather(*(_download_task(st, task,
+            task.filename(str(tmp_path), "test"), writer=writer, lock=lock)
+            for task in tasks), return_exceptions=True)
+    return asyncio.get_event_loop().run_until_complete(run())
+
+def test_pipeline(dbc, tmp_path):
+    # More element sets per object than the batch size of the writer
+    epochs = epoch_grid(datetime(2021, 1, 1), 1500)
+    documents = {}
+    for norad in (10000, 20000):
+        filename = str(tmp_path / (str(norad) + ".xml"))
+        write_omm(filename, SyntheticCatalog(1, seed=norad, first_norad=norad),
+                epochs)
+        with open(filename) as fh:
+            documents[norad] = fh.read()
+
+    writer = BatchWriter(dbc)
+    lock = threading.Lock()
+    tasks = [HistoryTask([norad], epochs[0], epochs[-1]) for norad in documents]
+    st = _Client(dbc, lock, documents, fail=(20000,))
+    results = _run(st, tasks, tmp_path, writer, lock)
+
+    # The records are committed while the documents are downloaded
+    assert results[0] == len(epochs)
+    assert isinstance(results[1], IOError)
+    assert max(st.counts) > 0
+    assert os.path.exists(tasks[0].filename(str(tmp_path), "test"))
+    assert not os.path.exists(tasks[1].filename(str(tmp_path), "test"))
+
+    # The failed task is repeated, the records inserted before are ignored
+    st = _Client(dbc, lock, documents)
+    assert _run(st, tasks[1:], tmp_path, writer, lock) == [len(epochs)]
+    assert dbc.fetchone("select count(*) from orbelem")[0] == 2 * len(epochs)
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+import pytest
+from satdb import DBConfig, Dbase, BatchWriter, EpochCache, TLE, ingest
+from synthetic import SyntheticCatalog, epoch_grid, write_3le
+
+@pytest.fixture
+def dbc(tmp_path):
+    config = tmp_path / "satdb.yaml"
+    config.write_text("satdb:\n    backend: \"sqlite\"\n"
+            + "    path: \"" + str(tmp_path / "satdb.sqlite") + "\"\n")
+    dbc = Dbase(DBConfig(str(config)))
+    dbc.connect()
+    yield dbc
+    dbc.disconnect()
+
+def test_tle_like_fromdb(dbc, tmp_path):
+    filename = str(tmp_path / "catalog.tle")
+    write_3le(filename, SyntheticCatalog(3, seed=1, first_norad=20000),
+            epoch_grid(datetime(2021, 1, 1), 5))
+    writer = BatchWriter(dbc)
+    for mds, batch in ingest.parse_file(filename):
+        writer.add_chunk(mds, batch)
+    writer.flush()
+    dbc.write("delete from metadata where norad = %s", (20001,))
+
+    cache = EpochCache(dbc)
+    epoch = datetime(2021, 1, 3)
+    for norad in (20000, "20001"):
+        tle = cache.tle(norad, epoch)
+        expected = TLE()
+        expected.fromdb(dbc, norad, epoch)
+        assert tle.line1 is not None
+        assert (tle.line0, tle.line1, tle.line2) == (expected.line0,
+                expected.line1, expected.line2)
+    assert cache.tle(20001, epoch).line0 == "20001"
+
+    with pytest.raises(ValueError):
+        cache.tle(30000, epoch)
+    with pytest.raises(ValueError):
+        TLE().fromdb(dbc, 30000, epoch)
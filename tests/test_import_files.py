@@ -0,0 +1,121 @@
+from datetime import datetime
+import gzip
+import os
+
+import pytest
+from satdb import DBConfig, Dbase, BatchWriter, ingest
+from synthetic import SyntheticCatalog, epoch_grid, write_3le, write_omm
+
+@pytest.fixture
+def dbc(tmp_path):
+    config = tmp_path / "satdb.yaml"
+    config.write_text("satdb:\n    backend: \"sqlite\"\n"
+            + "    path: \"" + str(tmp_path / "satdb.sqlite") + "\"\n")
+    dbc = Dbase(DBConfig(str(config)))
+    dbc.connect()
+    yield dbc
+    dbc.disconnect()
+
+# parse_file() of the worker processes: files named "kill*" end the worker
+# process without a message, as if it was killed
+_parse_file = ingest.parse_file
+def _parse_or_die(filename, chunk_size=1000, rejected=None):
+    if os.path.basename(filename).startswith("kill"):
+        os._exit(9)
+    return _parse_file(filename, chunk_size, rejected)
+
+def test_failed_files(dbc, tmp_path, monkeypatch):
+    if ingest.multiprocessing.get_start_method() != "fork":
+        pytest.skip("the patched parser needs forked worker processes")
+    monkeypatch.setattr(ingest, "parse_file", _parse_or_die)
+    monkeypatch.setattr(ingest, "WORKER_POLL", 0.2)
+
+    epochs = epoch_grid(datetime(2021, 1, 1), 2)
+    good = str(tmp_path / "good.tle")
+    write_3le(good, SyntheticCatalog(50, seed=1), epochs)
+    kill = str(tmp_path / "kill.tle")
+    write_3le(kill, SyntheticCatalog(50, seed=2, first_norad=20000), epochs)
+
+    # OMM file cut off after more than one chunk of records
+    full = str(tmp_path / "full.xml")
+    write_omm(full, SyntheticCatalog(50, seed=3, first_norad=30000), epochs)
+    truncated = str(tmp_path / "truncated.xml")
+    with open(full) as fh:
+        text = fh.read()
+    with open(truncated, "w") as fh:
+        fh.write(text[:len(text) * 3 // 4])
+
+    results = {}
+    writer = BatchWriter(dbc, batch_size=10)
+    ingest.import_files(writer, [good, kill, truncated], workers=2,
+            chunk_size=10, done=lambda f, e: results.__setitem__(f, e),
+            manifest=False)
+
+    assert results[good] is None
+    assert results[kill] is not None
+    assert results[truncated] is not None
+    norads = [row[0] for row in dbc.fetchall("select distinct norad from orbelem")]
+    assert len(norads) == 50
+    assert all(norad < 20000 for norad in norads)
+
+def test_no_worker_left(dbc, tmp_path, monkeypatch):
+    if ingest.multiprocessing.get_start_method() != "fork":
+        pytest.skip("the patched parser needs forked worker processes")
+    monkeypatch.setattr(ingest, "parse_file", _parse_or_die)
+    monkeypatch.setattr(ingest, "WORKER_POLL", 0.2)
+
+    epochs = epoch_grid(datetime(2021, 1, 1), 1)
+    filenames = []
+    for i in range(3):
+        filenames.append(str(tmp_path / ("kill" + str(i) + ".tle")))
+        write_3le(filenames[-1], SyntheticCatalog(5, seed=i), epochs)
+
+    results = {}
+    writer = BatchWriter(dbc)
+    ingest.import_files(writer, filenames, workers=1,
+            done=lambda f, e: results.__setitem__(f, e), manifest=False)
+    assert sorted(results) == sorted(filenames)
+    assert all(error is not None for error in results.values())
+
+def _broken_3le(filename, tmp_path):
+    # Second record with a wrong checksum, followed by a stray line
+    good = str(tmp_path / "good.tle")
+    write_3le(good, SyntheticCatalog(3, seed=1), epoch_grid(datetime(2021, 1, 1), 1))
+    with open(good) as fh:
+        lines = fh.read().splitlines()
+    lines[5] = lines[5][:-1] + str((int(lines[5][-1]) + 1) % 10)
+    with open(filename, "w") as fh:
+        fh.write("\n".join(lines + ["stray line"]) + "\n")
+    return lines
+
+def test_rejects(dbc, tmp_path):
+    filename = str(tmp_path / "broken.tle")
+    lines = _broken_3le(filename, tmp_path)
+
+    results = {}
+    rejected = {}
+    writer = BatchWriter(dbc)
+    ingest.import_files(writer, [filename], workers=1,
+            done=lambda f, e: results.__setitem__(f, e),
+            rejects=lambda f, r: rejected.__setitem__(f, r), manifest=False)
+    assert results == {filename: None}
+    assert sorted(r[0] for r in rejected[filename]) == sorted(
+            [tuple(lines[3:6]), ("stray line",)])
+    assert dbc.fetchone("select count(*) from orbelem")[0] == 2
+
+def test_tle2db_quarantine(dbc, tmp_path):
+    import argparse
+    import tle2db
+    filename = str(tmp_path / "broken.tle")
+    lines = _broken_3le(filename, tmp_path)
+    quarantine = str(tmp_path / "quarantine.tle")
+    args = argparse.Namespace(config=str(tmp_path / "satdb.yaml"),
+            tlefile=filename, batch_size=1, force=False, quarantine=quarantine,
+            stats=None, progress=10., verbose=False)
+    tle2db.main(args)
+
+    with open(quarantine) as fh:
+        text = fh.read().splitlines()
+    assert text == ["# checksum or format error (" + filename + ")"] + lines[3:6] + [
+            "# no TLE record (" + filename + ")", "stray line"]
+    assert dbc.fetchone("select count(*) from orbelem")[0] == 2
@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import pytest
+from satdb import DBConfig, Dbase, BatchWriter, ingest
+from synthetic import SyntheticCatalog, epoch_grid, write_3le, write_omm
+
+@pytest.fixture
+def dbc(tmp_path):
+    config = tmp_path / "satdb.yaml"
+    config.write_text("satdb:\n    backend: \"sqlite\"\n"
+            + "    path: \"" + str(tmp_path / "satdb.sqlite") + "\"\n")
+    dbc = Dbase(DBConfig(str(config)))
+    dbc.connect()
+    yield dbc
+    dbc.disconnect()
+
+def _import(dbc, filename):
+    writer = BatchWriter(dbc)
+    for mds, batch in ingest.parse_file(filename):
+        writer.add_chunk(mds, batch)
+    writer.flush()
+
+def test_newer_tle_clears_omm_columns(dbc, tmp_path):
+    catalog = SyntheticCatalog(5, seed=1)
+    # The epochs of the objects scatter by up to half a day around the grid
+    epochs = epoch_grid(datetime(2021, 1, 1), 3)
+    omm = str(tmp_path / "old.xml")
+    write_omm(omm, catalog, epochs[:1])
+    tle = str(tmp_path / "new.tle")
+    write_3le(tle, catalog, epochs[2:])
+
+    _import(dbc, omm)
+    rows = dbc.fetchall("select originator, data_created from orbelem_latest")
+    assert len(rows) == 5
+    assert all(row[0] is not None and row[1] is not None for row in rows)
+
+    # The TLE rows are newer, no OMM values of the old rows remain
+    _import(dbc, tle)
+    rows = dbc.fetchall("select epoch, originator, data_created, originator_comment"
+            + " from orbelem_latest")
+    assert len(rows) == 5
+    assert all(row[0] >= epochs[1] for row in rows)
+    assert all(row[1:] == (None, None, None) for row in rows)
+
+    # An older OMM row changes nothing
+    _import(dbc, omm)
+    rows = dbc.fetchall("select epoch, originator from orbelem_latest")
+    assert all(row[0] >= epochs[1] and row[1] is None for row in rows)
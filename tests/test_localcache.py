@@ -0,0 +1,44 @@
+from datetime import datetime
+import os
+
+import numpy as np
+import pytest
+from satdb import DBConfig, Dbase, BatchWriter, LocalCache, ingest
+from synthetic import SyntheticCatalog, epoch_grid, write_3le
+
+@pytest.fixture
+def dbc(tmp_path):
+    config = tmp_path / "satdb.yaml"
+    config.write_text("satdb:\n    backend: \"sqlite\"\n"
+            + "    path: \"" + str(tmp_path / "satdb.sqlite") + "\"\n")
+    dbc = Dbase(DBConfig(str(config)))
+    dbc.connect()
+    yield dbc
+    dbc.disconnect()
+
+def test_sync_spill(dbc, tmp_path):
+    # Element sets of three years
+    filename = str(tmp_path / "catalog.tle")
+    write_3le(filename, SyntheticCatalog(10, seed=1),
+            epoch_grid(datetime(2020, 12, 1), 400, step=4.))
+    writer = BatchWriter(dbc)
+    for mds, batch in ingest.parse_file(filename):
+        writer.add_chunk(mds, batch)
+    writer.flush()
+    n_rows = dbc.fetchone("select count(*) from orbelem")[0]
+
+    # Spilled every few rows and in one go give the same partitions
+    spill = LocalCache(str(tmp_path / "spill"))
+    assert spill.sync(dbc, chunk_size=7, flush_rows=20) == n_rows
+    whole = LocalCache(str(tmp_path / "whole"))
+    assert whole.sync(dbc) == n_rows
+
+    assert spill.years() == whole.years() == [2020, 2021, 2022]
+    assert not any(f.endswith(".spill")
+            for f in os.listdir(str(tmp_path / "spill" / "orbelem")))
+    a = spill.fetcharray()
+    b = whole.fetcharray()
+    assert len(a) == n_rows
+    assert np.array_equal(a["norad"], b["norad"])
+    assert np.array_equal(a["epoch"], b["epoch"])
+    assert np.array_equal(a["mean_motion"], b["mean_motion"])
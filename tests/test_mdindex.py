@@ -0,0 +1,45 @@
+from datetime import datetime
+
+import pytest
+from satdb import DBConfig, Dbase, BatchWriter, ingest
+from synthetic import SyntheticCatalog, epoch_grid, write_3le
+
+@pytest.fixture
+def dbc(tmp_path):
+    config = tmp_path / "satdb.yaml"
+    config.write_text("satdb:\n    backend: \"sqlite\"\n"
+            + "    path: \"" + str(tmp_path / "satdb.sqlite") + "\"\n")
+    dbc = Dbase(DBConfig(str(config)))
+    dbc.connect()
+    yield dbc
+    dbc.disconnect()
+
+def test_index_updated_after_commit(dbc, tmp_path, monkeypatch):
+    filename = str(tmp_path / "catalog.tle")
+    write_3le(filename, SyntheticCatalog(5, seed=1), epoch_grid(datetime(2021, 1, 1), 1))
+    chunks = list(ingest.parse_file(filename))
+    writer = BatchWriter(dbc)
+
+    # A failed flush leaves the metadata out of the index
+    for mds, batch in chunks:
+        writer.add_chunk(mds, batch)
+    def fail(*args, **kwargs):
+        raise IOError("connection lost")
+    with monkeypatch.context() as m:
+        m.setattr(dbc, "writemany", fail)
+        with pytest.raises(IOError):
+            writer.flush()
+    writer.discard()
+    assert len(writer.md_index) == 0
+
+    # The same records are written again
+    for mds, batch in ingest.parse_file(filename):
+        writer.add_chunk(mds, batch)
+    writer.flush()
+    assert len(writer.md_index) == 5
+    assert dbc.fetchone("select count(*) from metadata")[0] == 5
+
+    # and are unchanged afterwards
+    for mds, batch in ingest.parse_file(filename):
+        writer.add_chunk(mds, batch)
+    assert not any(table == "metadata" for table, cols in writer.pending)
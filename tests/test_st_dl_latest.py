@@ -0,0 +1,133 @@
+import argparse
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import threading
+from urllib.parse import unquote
+
+import pytest
+from satdb import DBConfig, Dbase
+from satdb.jobstate import GP_WATERMARK_JOB, get_watermark
+import st_dl_latest
+
+# Records of the stand-in server as (NORAD ID, epoch, CREATION_DATE). As
+# Space-Track, the server repeats the header for every record, the newest
+# record is not the first one
+RECORDS = (
+    (25544, "2021-01-01T10:00:00", "2021-01-01T12:00:00"),
+    (25545, "2021-03-05T10:00:00", "2021-03-05T12:00:00"),
+    (25546, "2021-02-01T10:00:00", "2021-02-01T12:00:00"),
+    )
+
+OMM = ('<omm id="CCSDS_OMM_VERS" version="2.0"><header>'
+    + '<CREATION_DATE>{created}</CREATION_DATE><ORIGINATOR>18 SPCS</ORIGINATOR>'
+    + '</header><body><segment><metadata><OBJECT_NAME>OBJECT {norad}</OBJECT_NAME>'
+    + '<OBJECT_ID>1998-067A</OBJECT_ID><CENTER_NAME>EARTH</CENTER_NAME>'
+    + '<REF_FRAME>TEME</REF_FRAME><TIME_SYSTEM>UTC</TIME_SYSTEM>'
+    + '<MEAN_ELEMENT_THEORY>SGP4</MEAN_ELEMENT_THEORY></metadata><data>'
+    + '<meanElements><EPOCH>{epoch}</EPOCH><MEAN_MOTION>15.49</MEAN_MOTION>'
+    + '<ECCENTRICITY>0.0004885</ECCENTRICITY><INCLINATION>51.6443</INCLINATION>'
+    + '<RA_OF_ASC_NODE>242.0161</RA_OF_ASC_NODE>'
+    + '<ARG_OF_PERICENTER>264.6060</ARG_OF_PERICENTER>'
+    + '<MEAN_ANOMALY>207.3845</MEAN_ANOMALY></meanElements>'
+    + '<tleParameters><EPHEMERIS_TYPE>0</EPHEMERIS_TYPE>'
+    + '<CLASSIFICATION_TYPE>U</CLASSIFICATION_TYPE>'
+    + '<NORAD_CAT_ID>{norad}</NORAD_CAT_ID><ELEMENT_SET_NO>999</ELEMENT_SET_NO>'
+    + '<REV_AT_EPOCH>21279</REV_AT_EPOCH><BSTAR>0.000025302</BSTAR>'
+    + '<MEAN_MOTION_DOT>0.0000095</MEAN_MOTION_DOT>'
+    + '<MEAN_MOTION_DDOT>0</MEAN_MOTION_DDOT></tleParameters>'
+    + '</data></segment></body></omm>')
+
+# Fields of the class gp for the predicate check of the Space-Track client
+MODELDEF = {"data": [
+    {"Field": field, "Type": typ, "Null": "YES", "Default": "", "Key": ""}
+    for field, typ in (("NORAD_CAT_ID", "int(10) unsigned"),
+        ("EPOCH", "datetime"), ("CREATION_DATE", "datetime"),
+        ("DECAY_DATE", "datetime"))
+    ]}
+
+#------------------------------------------------------------------------------
+# Stand-in for the Space-Track API: login, model definition and the query of
+# the class gp with the predicate creation_date/>{watermark}
+class _Handler(BaseHTTPRequestHandler):
+    queries = []
+
+    def _send(self, body, content_type):
+        body = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._send("\"\"", "application/json")
+
+    def do_GET(self):
+        if "/modeldef/" in self.path:
+            self._send(json.dumps(MODELDEF), "application/json")
+            return
+
+        parts = [unquote(p) for p in self.path.split("?")[0].strip("/").split("/")]
+        predicates = dict(zip(parts[4::2], parts[5::2]))
+        self.queries.append(predicates)
+        after = predicates.get("creation_date")
+        records = [rec for rec in RECORDS if after is None
+                or datetime.fromisoformat(rec[2]) > datetime.fromisoformat(after[1:])]
+        self._send('<?xml version="1.0" encoding="UTF-8"?><ndm>'
+                + "".join(OMM.format(norad=n, epoch=e, created=c) for n, e, c in records)
+                + "</ndm>", "application/xml")
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    _Handler.queries = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def test_delta_download(server, tmp_path):
+    config = tmp_path / "satdb.yaml"
+    config.write_text("satdb:\n    backend: \"sqlite\"\n"
+            + "    path: \"" + str(tmp_path / "satdb.sqlite") + "\"\n"
+            + "spacetrack:\n    user: \"user\"\n    password: \"secret\"\n"
+            + "    base_url: \"http://127.0.0.1:" + str(server.server_port) + "/\"\n")
+    outdir = tmp_path / "out"
+    outdir.mkdir()
+    args = argparse.Namespace(config=str(config), outdir=str(outdir),
+            delta=True, db=True, batch_size=1000)
+
+    # First run: full catalog, the watermark is the newest CREATION_DATE
+    st_dl_latest.main(args)
+    dbc = Dbase(DBConfig(str(config)))
+    dbc.connect()
+    assert get_watermark(dbc, GP_WATERMARK_JOB) == datetime(2021, 3, 5, 12)
+    rows = dbc.fetchall("select norad, data_created from orbelem order by norad")
+    assert [(norad, str(created)[:19].replace(" ", "T")) for norad, created in rows] \
+            == [(n, c) for n, e, c in RECORDS]
+    dbc.disconnect()
+    assert "creation_date" not in _Handler.queries[0]
+
+    # The archive file is named by the time of the run in seconds
+    archive = tmp_path / "archive"
+    outdir.rename(archive)
+    outdir.mkdir()
+    assert len(os.listdir(archive)) == 1
+
+    # Second run: only element sets created after the watermark are
+    # requested, there are none
+    st_dl_latest.main(args)
+    assert _Handler.queries[1]["creation_date"].startswith(">2021-03-05")
+    dbc = Dbase(DBConfig(str(config)))
+    dbc.connect()
+    assert dbc.fetchone("select count(*) from orbelem")[0] == len(RECORDS)
+    assert get_watermark(dbc, GP_WATERMARK_JOB) == datetime(2021, 3, 5, 12)
+    dbc.disconnect()
+    assert len(os.listdir(outdir)) == 0
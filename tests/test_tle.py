@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from satdb.tle import format_tles
+
+# name, norad, id_short, classification, epoch, mean motion dot, mean motion
+# ddot, bstar, element set no, inclination, RAAN, eccentricity, arg of
+# pericenter, mean anomaly, mean motion, rev at epoch
+def _result(norad, epoch):
+    return ("OBJECT", norad, "58002B", "U", epoch, 1e-6, 0., 1e-4, 999,
+            34.2, 120., 0.18, 200., 100., 10.8, 12345)
+
+def test_short_norad_and_day_of_year():
+    line0, line1, line2 = format_tles([_result(5, datetime(2021, 3, 4, 5, 6, 7))])[0]
+    assert len(line1) == 69 and len(line2) == 69
+    assert line1.startswith("1 00005U 58002B   21063.21258102 ")
+    assert line2.startswith("2 00005 ")
+
+def test_invalid_lines_skipped():
+    tles = format_tles([_result(123456, datetime(2021, 3, 4)),
+        _result(25544, datetime(2021, 3, 4))])
+    assert [tle[1][2:7] for tle in tles] == ["25544"]